@@ -0,0 +1,48 @@
+"""Micro-benchmark of CandidateIndex against the previous domain superset scan used to match Affinity organizations
+
+Run with `poetry run python benchmarks/bench_candidate_matching.py`
+"""
+import random
+from timeit import repeat
+
+from mosaic_os.matching import CandidateIndex
+
+
+def superset_scan(candidates: list[dict], known_domains: list[str]) -> int | None:
+    return next(
+        (int(company["id"]) for company in candidates if set(known_domains).issubset(set(company["domains"]))),
+        None,
+    )
+
+
+def candidate_index(candidates: list[dict], known_domains: list[str], name: str) -> int | None:
+    match = CandidateIndex(candidates).best_match(known_domains, name=name)
+    return int(match.candidate["id"]) if match else None
+
+
+def organization(organization_id: int) -> dict:
+    return {
+        "id": organization_id,
+        "name": f"Company {organization_id} Inc.",
+        "domain": f"company{organization_id}.com",
+        "domains": [f"company{organization_id}.com", f"company{organization_id}.io"],
+        "global": bool(organization_id % 2),
+    }
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    # name searches return up to hundreds of organizations, the match is usually near the end or missing
+    for count in (10, 100, 500):
+        candidates = [organization(i) for i in range(count)]
+        random.shuffle(candidates)
+        target = count - 1
+        known_domains = [f"company{target}.com", f"company{target}.io"]
+        name = f"Company {target}"
+        number = max(1, 20_000 // count)
+        for label, implementation in (
+            ("superset scan", lambda: superset_scan(candidates, known_domains)),
+            ("candidate index", lambda: candidate_index(candidates, known_domains, name)),
+        ):
+            best = min(repeat(implementation, number=number, repeat=5)) / number
+            print(f"{count:>5} candidates  {label:<16} {best * 1e6:>10.1f} us")
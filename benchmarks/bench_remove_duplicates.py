@@ -0,0 +1,57 @@
+"""Micro-benchmark of AffinityApi._remove_duplicates against the previous JSON round-trip implementation
+
+Run with `poetry run python benchmarks/bench_remove_duplicates.py`
+"""
+import json
+import random
+from timeit import repeat
+
+from mosaic_os.crm import AffinityApi
+
+
+def json_round_trip_remove_duplicates(list_to_dedupe: list[dict]) -> list[dict]:
+    list_to_dedupe_json_set = {json.dumps(dictionary, sort_keys=True) for dictionary in list_to_dedupe}
+    return [json.loads(t) for t in list_to_dedupe_json_set]
+
+
+def organization(organization_id: int) -> dict:
+    return {
+        "id": organization_id,
+        "name": f"Company {organization_id}",
+        "domain": f"company{organization_id}.com",
+        "domains": [f"company{organization_id}.com", f"company{organization_id}.io"],
+        "crunchbase_uuid": None,
+        "global": bool(organization_id % 2),
+        "person_ids": list(range(organization_id, organization_id + 20)),
+        "list_entries": [
+            {
+                "id": organization_id * 10 + i,
+                "list_id": 13926,
+                "creator_id": 38603,
+                "entity_id": organization_id,
+                "created_at": "2015-12-11T02:26:56.537-08:00",
+            }
+            for i in range(3)
+        ],
+    }
+
+
+def search_results(unique: int, duplicate_ratio: float) -> list[dict]:
+    results = [organization(i) for i in range(unique)]
+    results += [organization(random.randrange(unique)) for _ in range(int(unique * duplicate_ratio))]
+    random.shuffle(results)
+    return results
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    # typical searches return tens of organizations per term and a company is searched by name and 1-5 domains
+    for unique, duplicate_ratio in ((10, 1.0), (50, 2.0), (250, 3.0)):
+        results = search_results(unique, duplicate_ratio)
+        number = max(1, 20_000 // len(results))
+        for name, implementation in (
+            ("json round trip", json_round_trip_remove_duplicates),
+            ("identity", AffinityApi._remove_duplicates),
+        ):
+            best = min(repeat(lambda: implementation(results), number=number, repeat=5)) / number
+            print(f"{len(results):>5} results  {name:<16} {best * 1e6:>10.1f} us")
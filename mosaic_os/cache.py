@@ -0,0 +1,186 @@
+import asyncio
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+_MISSING = object()
+
+
+class TTLCache:
+    """In-memory cache with per-entry expiry and least recently used eviction
+
+    `get_or_fetch` coalesces concurrent requests for the same key into a single call (single-flight). Cached
+    values are shared between callers and must not be modified.
+
+    Args:
+        ttl (float, optional): Seconds entries are kept for. Defaults to 60.
+        max_size (int, optional): Maximum number of entries kept. Defaults to 1024.
+    """
+
+    def __init__(self, ttl: float = 60, max_size: int = 1024):
+        if max_size < 1:
+            raise ValueError("Max size must be at least 1")
+
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._in_flight: dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get a value if it is cached and has not expired
+
+        Args:
+            key (Hashable): Cache key
+            default (Any, optional): Value returned when the key is not cached. Defaults to None.
+
+        Returns:
+            Any: Cached value or default
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float = None):
+        """Cache a value, evicting the least recently used entry when full
+
+        Args:
+            key (Hashable): Cache key
+            value (Any): Value to cache
+            ttl (float, optional): Seconds to keep this entry for. Defaults to the cache TTL.
+        """
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        """Remove a key, including any request for it which is in flight"""
+        self._entries.pop(key, None)
+        self._in_flight.pop(key, None)
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]):
+        """Remove every key matching a predicate
+
+        Args:
+            predicate (Callable[[Hashable], bool]): Returns True for keys to remove
+        """
+        for key in [key for key in (*self._entries, *self._in_flight) if predicate(key)]:
+            self.delete(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._in_flight.clear()
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Get a cached value or fetch it once for all concurrent callers
+
+        Args:
+            key (Hashable): Cache key
+            fetch (Callable[[], Awaitable[Any]]): Callable fetching the value on a miss
+
+        Returns:
+            Any: Cached or fetched value. Errors are raised to every waiting caller and are not cached
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.hits += 1
+            return await asyncio.shield(in_flight)
+
+        self.misses += 1
+        in_flight = asyncio.ensure_future(fetch())
+        self._in_flight[key] = in_flight
+        in_flight.add_done_callback(lambda future: self._store_fetched(key, future))
+        return await asyncio.shield(in_flight)
+
+    def _store_fetched(self, key: Hashable, future: asyncio.Future):
+        # only cache the result if the key was not invalidated while the request was in flight
+        if self._in_flight.get(key) is not future:
+            return
+        del self._in_flight[key]
+        if not future.cancelled() and future.exception() is None:
+            self.set(key, future.result())
+
+
+class SqliteCache:
+    """Persistent cache stored in a local SQLite database so entries survive process restarts
+
+    Has the same `get`, `set` and `delete` interface as `TTLCache` so either can be used as a cache backend.
+    Keys must be strings and values must be JSON serialisable.
+
+    Args:
+        path (str): Path of the SQLite database
+        ttl (float, optional): Seconds entries are kept for. Defaults to 60.
+        max_size (int, optional): Maximum number of entries kept, least recently used entries are evicted
+            first. Defaults to 100000.
+    """
+
+    def __init__(self, path: str, ttl: float = 60, max_size: int = 100_000):
+        if max_size < 1:
+            raise ValueError("Max size must be at least 1")
+
+        self.ttl = ttl
+        self.max_size = max_size
+        self.db = sqlite3.connect(path)
+        with self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM cache WHERE expires_at > ?", (time.time(),)).fetchone()[0]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        row = self.db.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return default
+        value, expires_at = row
+        with self.db:
+            if expires_at <= now:
+                self.db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return default
+            self.db.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: float = None):
+        now = time.time()
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + (self.ttl if ttl is None else ttl), now),
+            )
+            self.db.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,),
+            )
+
+    def delete(self, key: str):
+        with self.db:
+            self.db.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self.db:
+            self.db.execute("DELETE FROM cache")
+
+    def close(self):
+        self.db.close()
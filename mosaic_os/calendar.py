@@ -1,42 +1,92 @@
 import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from functools import lru_cache
 from os import environ
+from typing import Iterable
 from uuid import uuid4
 
 from google.cloud.datastore import Client, Entity
 from google.oauth2 import service_account
-from googleapiclient.discovery import build, google_auth_httplib2
+from googleapiclient.discovery import build_from_document, google_auth_httplib2
+from googleapiclient.discovery_cache import get_static_doc
 from httplib2 import Http
 
-from mosaic_os.constants import CALENDAR_SCOPES
+from mosaic_os.cache import TTLCache
+from mosaic_os.constants import (
+    CALENDAR_CREDENTIALS_CACHE_SIZE,
+    CALENDAR_CREDENTIALS_TTL,
+    CALENDAR_SCOPES,
+    DATASTORE_MAX_BATCH_SIZE,
+)
 
 logger = logging.getLogger(__name__)
 
 db = Client()
 
 
+@lru_cache(maxsize=1)
+def _get_source_credentials() -> service_account.Credentials:
+    # parsed once, delegated credentials for each user are derived from these
+    return service_account.Credentials.from_service_account_info(
+        json.loads(environ["CALENDAR_SERVICE_ACCOUNT"]), scopes=CALENDAR_SCOPES
+    )
+
+
+@lru_cache(maxsize=1)
+def _get_calendar_discovery_document() -> dict:
+    # discovery document bundled with google-api-python-client, so no request is made to fetch it
+    return json.loads(get_static_doc("calendar", "v3"))
+
+
+# delegated credentials by user email, dropped before their access token expires
+_calendar_credentials = TTLCache(
+    ttl=CALENDAR_CREDENTIALS_TTL, max_size=CALENDAR_CREDENTIALS_CACHE_SIZE
+)
+_calendar_credentials_lock = threading.Lock()
+
+
 def get_calendar_service(user_email: str):
     """Get a calendar service for a specific user
 
     Note: This requires a service account with domain-wide delegation enabled and service account JSON
     credentials stored in the environment variable `CALENDAR_SERVICE_ACCOUNT`.
 
+    Delegated credentials are cached per user so their access token is reused until it expires. Every call
+    builds a new service with its own HTTP connection from the cached discovery document, so a service must
+    not be shared between threads but each thread can get its own.
+
     Args:
         user_email (str): Email address of user
 
     Returns:
         A Resource object with methods for interacting with the service.
     """
-    source_credentials = service_account.Credentials.from_service_account_info(
-        json.loads(environ["CALENDAR_SERVICE_ACCOUNT"]), scopes=CALENDAR_SCOPES
-    )
-    updated_credentials = source_credentials.with_subject(user_email)
     http = Http(timeout=int(environ.get("HTTP_TIMEOUT", 60)))
     authed_http = google_auth_httplib2.AuthorizedHttp(
-        credentials=updated_credentials, http=http
+        credentials=_get_delegated_credentials(user_email), http=http
+    )
+    return build_from_document(
+        _get_calendar_discovery_document(), http=authed_http
     )
-    return build("calendar", "v3", http=authed_http)
+
+
+def _get_delegated_credentials(user_email: str) -> service_account.Credentials:
+    with _calendar_credentials_lock:
+        credentials = _calendar_credentials.get(user_email)
+        if credentials is None or credentials.expired:
+            credentials = _get_source_credentials().with_subject(user_email)
+            _calendar_credentials.set(user_email, credentials)
+        return credentials
+
+
+def clear_calendar_service_cache():
+    """Drop cached credentials, e.g. after `CALENDAR_SERVICE_ACCOUNT` changes"""
+    _get_source_credentials.cache_clear()
+    with _calendar_credentials_lock:
+        _calendar_credentials.clear()
 
 
 def subscribe_channel(calendar_id: str):
@@ -48,6 +98,89 @@ def subscribe_channel(calendar_id: str):
         calendar_id (str): Calendar ID to subscribe to which is the email address of the calendar
     """
     logger.info(f"Subscribing to calendar {calendar_id}")
+    webhook_id, data = _watch_calendar(
+        calendar_id, environ["WEBHOOK_TOKEN"], environ["WEBHOOK_URL"]
+    )
+    set_webhook_calendar(webhook_id, calendar_id, data)
+
+
+def subscribe_channels(
+    calendar_ids: Iterable[str], max_workers: int = 16
+) -> dict[str, Entity | Exception]:
+    """Subscribe to many calendars at once
+
+    Watch requests are made in parallel on a thread pool, then all webhooks are read and written with
+    `get_multi` and `put_multi` in batches.
+
+    Note: Environment variables `WEBHOOK_TOKEN` and `WEBHOOK_URL` must be set.
+
+    Args:
+        calendar_ids (Iterable[str]): Calendar IDs to subscribe to which are the email addresses of the calendars
+        max_workers (int, optional): Maximum number of watch requests in flight. Defaults to 16.
+
+    Returns:
+        dict[str, Entity | Exception]: Webhook entity stored for each calendar, or the error raised while
+            subscribing to it
+    """
+    calendar_ids = list(dict.fromkeys(calendar_ids))
+    token, address = environ["WEBHOOK_TOKEN"], environ["WEBHOOK_URL"]
+    logger.info(f"Subscribing to {len(calendar_ids)} calendars")
+
+    results: dict[str, Entity | Exception] = {}
+    watched: dict[str, tuple[str, dict]] = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_watch_calendar, calendar_id, token, address): (
+                calendar_id
+            )
+            for calendar_id in calendar_ids
+        }
+        for future in as_completed(futures):
+            calendar_id = futures[future]
+            try:
+                watched[calendar_id] = future.result()
+            except Exception as e:
+                logger.exception(
+                    f"Failed to subscribe to calendar {calendar_id}"
+                )
+                results[calendar_id] = e
+
+    # stored in the order passed rather than the order watch requests finished
+    watched_ids = [
+        calendar_id for calendar_id in calendar_ids if calendar_id in watched
+    ]
+    for start in range(0, len(watched_ids), DATASTORE_MAX_BATCH_SIZE):
+        chunk = watched_ids[start : start + DATASTORE_MAX_BATCH_SIZE]
+        try:
+            keys = [
+                db.key("CalendarWebhook", calendar_id) for calendar_id in chunk
+            ]
+            existing = {
+                entity.key.name: entity for entity in db.get_multi(keys)
+            }
+            entities = [
+                _update_webhook_entity(
+                    existing.get(calendar_id) or Entity(key=key),
+                    *watched[calendar_id],
+                    calendar_id=calendar_id,
+                )
+                for calendar_id, key in zip(chunk, keys)
+            ]
+            db.put_multi(entities)
+        except Exception as e:
+            logger.exception(
+                f"Failed to store webhooks of {len(chunk)} calendars"
+            )
+            results.update({calendar_id: e for calendar_id in chunk})
+            continue
+        results.update(zip(chunk, entities))
+
+    return {calendar_id: results[calendar_id] for calendar_id in calendar_ids}
+
+
+def _watch_calendar(
+    calendar_id: str, token: str, address: str
+) -> tuple[str, dict]:
     calendar_service = get_calendar_service(calendar_id)
 
     # generate a unique ID for this subscription
@@ -55,8 +188,8 @@ def subscribe_channel(calendar_id: str):
     body = {
         "id": webhook_id,
         "type": "web_hook",
-        "token": environ["WEBHOOK_TOKEN"],
-        "address": environ["WEBHOOK_URL"],  # the URL of your webhook
+        "token": token,
+        "address": address,  # the URL of your webhook
     }
 
     # Make the watch request
@@ -65,12 +198,24 @@ def subscribe_channel(calendar_id: str):
         .watch(calendarId=calendar_id, body=body)
         .execute()
     )
-    set_webhook_calendar(webhook_id, calendar_id, data)
+    return webhook_id, data
 
 
 def set_webhook_calendar(webhook_id: str, calendar_id: str, data) -> Entity:
     key = db.key("CalendarWebhook", calendar_id)
-    entity = db.get(key) or Entity(key=key)
+    entity = _update_webhook_entity(
+        db.get(key) or Entity(key=key),
+        webhook_id,
+        data,
+        calendar_id=calendar_id,
+    )
+    db.put(entity)
+    return entity
+
+
+def _update_webhook_entity(
+    entity: Entity, webhook_id: str, data: dict, calendar_id: str
+) -> Entity:
     if "created" not in entity:
         entity["created"] = datetime.utcnow().isoformat()
     entity["calendar_id"] = calendar_id
@@ -79,5 +224,4 @@ def set_webhook_calendar(webhook_id: str, calendar_id: str, data) -> Entity:
         entity[f"_{key}"] = value
     # set expiry to int
     entity["_expiration"] = int(entity["_expiration"])
-    db.put(entity)
     return entity
@@ -1,136 +1,346 @@
-from typing import Any
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack
+from copy import deepcopy
+from enum import Enum
+from typing import Any, AsyncIterator, Iterable
 
-from google.cloud.datastore import Client
+from google.api_core.exceptions import GoogleAPIError
+from google.cloud.datastore import Client, Entity
 from google.cloud.datastore.query import And, PropertyFilter
 from gql.transport.exceptions import TransportQueryError
-from tldextract import extract
+from pydantic import BaseModel
 
-from mosaic_os.crm import AffinityApi
+from mosaic_os.cache import SqliteCache, TTLCache
+from mosaic_os.company_index import CompanyDomainIndex
+from mosaic_os.constants import DATASTORE_MAX_BATCH_SIZE
+from mosaic_os.crm import AffinityApi, FieldValueIndex
+from mosaic_os.datastore import AsyncDatastore
+from mosaic_os.domains import normalize_domain, normalize_domains
+from mosaic_os.matching import CandidateIndex
 from mosaic_os.models import Company
+from mosaic_os.resilience import CircuitOpenError
 from mosaic_os.sourcing_platform import HarmonicGql
 
+logger = logging.getLogger(__name__)
+
+HARMONIC_ENRICH_COMPANY_SELECTION = """{
+        companyFound
+        company {
+            name
+            id
+            website {
+                domain
+            }
+            socials {
+                pitchbook {
+                    url
+                }
+                crunchbase {
+                    url
+                }
+                linkedin {
+                    url
+                }
+                twitter {
+                    url
+                }
+                stackoverflow {
+                    url
+                }
+                angellist {
+                    url
+                }
+            }
+        }
+    }"""
+
+HARMONIC_ENRICH_COMPANY_QUERY = (
+    """
+mutation ($identifiers: CompanyEnrichmentIdentifiersInput!) {
+    enrichCompanyByIdentifiers(identifiers: $identifiers) """
+    + HARMONIC_ENRICH_COMPANY_SELECTION
+    + """
+}"""
+)
+
+
+class CompanyCreateStatus(Enum):
+    """Enum for the outcome of a bulk company master id creation"""
+
+    PENDING = "pending"
+    CREATED = "created"
+    EXISTING = "existing"
+    FAILED = "failed"
+
+
+class CompanyCreateResult(BaseModel):
+    company: Company
+    status: CompanyCreateStatus = CompanyCreateStatus.PENDING
+    duplicate_of: Company | None = None
+    error: str | None = None
+
+
+class HarmonicEnrichmentCache:
+    """Cache of Harmonic company enrichments keyed by registered domain
+
+    Companies Harmonic does not know about are cached as well (negative caching), together with the
+    `enrichment_urn` of the enrichment Harmonic scheduled, and are kept for a shorter time so they are retried
+    once the enrichment may have finished.
+
+    Args:
+        backend (TTLCache | SqliteCache, optional): Where entries are stored. Use `SqliteCache` to keep entries
+            across process restarts. Defaults to an in-memory `TTLCache` of 10000 entries.
+        hit_ttl (float, optional): Seconds found companies are kept for. Defaults to 7 days.
+        miss_ttl (float, optional): Seconds companies which were not found are kept for. Defaults to 6 hours.
+    """
+
+    def __init__(
+        self,
+        backend: TTLCache | SqliteCache = None,
+        hit_ttl: float = 7 * 24 * 60 * 60,
+        miss_ttl: float = 6 * 60 * 60,
+    ):
+        self.backend = (
+            backend if backend is not None else TTLCache(max_size=10_000)
+        )
+        self.hit_ttl = hit_ttl
+        self.miss_ttl = miss_ttl
+
+    def get(self, domain: str) -> dict | None:
+        """Get a cached enrichment
+
+        Args:
+            domain (str): Registered domain of company
+
+        Returns:
+            dict | None: Copy of the cached Harmonic company details or None if not cached
+        """
+        harmonic_company = self.backend.get(domain)
+        return deepcopy(harmonic_company)
+
+    def set(self, domain: str, harmonic_company: dict, found: bool):
+        """Cache an enrichment
+
+        Args:
+            domain (str): Registered domain of company
+            harmonic_company (dict): Harmonic company details
+            found (bool): Whether Harmonic found the company
+        """
+        self.backend.set(
+            domain,
+            deepcopy(harmonic_company),
+            ttl=self.hit_ttl if found else self.miss_ttl,
+        )
+
 
 async def get_all_company_details(
-    domain: str, affinity_config: dict[str, Any]
+    domain: str,
+    affinity_config: dict[str, Any],
+    affinity_client: AffinityApi = None,
+    harmonic_client: HarmonicGql = None,
+    harmonic_cache: HarmonicEnrichmentCache = None,
 ) -> dict:
     """Get company details from CRM and Sourcing Platform
 
     Args:
         domain (str): Domain name of company
+        affinity_config (dict[str, Any]): Affinity list and field IDs
+        affinity_client (AffinityApi, optional): Affinity client to reuse. If not passed a client is
+            created and closed for this call. Defaults to None.
+        harmonic_client (HarmonicGql, optional): Harmonic client to reuse. If not passed a client is
+            connected and disconnected for this call. Defaults to None.
+        harmonic_cache (HarmonicEnrichmentCache, optional): Cache of Harmonic enrichments. Defaults to None.
 
     Returns:
-        dict: Dictionary with keys `crm` and `sourcing_platform` containing company details
+        dict: Dictionary with keys `crm` and `sourcing_platform` containing company details. `crm` includes
+            `match_confidence`, the score of the matched CRM organization as described in `CandidateIndex`
     """
-    harmonic_client = HarmonicGql()
-    affinity_client = AffinityApi()
+    async with AsyncExitStack() as stack:
+        if affinity_client is None:
+            affinity_client = await stack.enter_async_context(AffinityApi())
+        if harmonic_client is None:
+            harmonic_client = await stack.enter_async_context(HarmonicGql())
+        return await _get_all_company_details(
+            domain,
+            affinity_config,
+            affinity_client,
+            harmonic_client,
+            harmonic_cache,
+        )
 
-    live_pipeline_fields = [
-        affinity_config["lp_status_field_id"],
-        affinity_config["lp_priority_field_id"],
-        affinity_config["lp_owner_field_id"],
-    ]
 
-    domain_clean = extract(domain).registered_domain
-
-    # get harmonic company information
-    query = """
-    mutation ($identifiers: CompanyEnrichmentIdentifiersInput!) {
-        enrichCompanyByIdentifiers(identifiers: $identifiers) {
-            companyFound
-            company {
-                name
-                id
-                website {
-                    domain
-                }
-                socials {
-                    pitchbook {
-                        url
-                    }
-                    crunchbase {
-                        url
-                    }
-                    linkedin {
-                        url
-                    }
-                    twitter {
-                        url
-                    }
-                    stackoverflow {
-                        url
-                    }
-                    angellist {
-                        url
-                    }
-                }
-            }
-        }
-    }"""
+async def get_all_company_details_batch(
+    domains: Iterable[str],
+    affinity_config: dict[str, Any],
+    concurrency: int = 10,
+    affinity_client: AffinityApi = None,
+    harmonic_client: HarmonicGql = None,
+    harmonic_cache: HarmonicEnrichmentCache = None,
+    harmonic_batch_size: int = None,
+) -> AsyncIterator[dict]:
+    """Get company details from CRM and Sourcing Platform for many domains
 
-    try:
-        harmonic_company_details = await harmonic_client.query(
-            query=query, variables={"identifiers": {"websiteUrl": domain_clean}}
+    Domains are normalised to their registered domain and each registered domain is only looked up once.
+    Clients are shared between lookups and results are yielded as soon as each lookup finishes.
+
+    Args:
+        domains (Iterable[str]): Domain names of companies
+        affinity_config (dict[str, Any]): Affinity list and field IDs
+        concurrency (int, optional): Maximum number of lookups in flight. Defaults to 10.
+        affinity_client (AffinityApi, optional): Affinity client to reuse. If not passed a client with a read
+            cache is created and closed for this batch. Defaults to None.
+        harmonic_client (HarmonicGql, optional): Harmonic client to reuse. If not passed a client is
+            connected for this batch. Defaults to None.
+        harmonic_cache (HarmonicEnrichmentCache, optional): Cache of Harmonic enrichments. Defaults to None.
+        harmonic_batch_size (int, optional): When set, companies are enriched in Harmonic up front with up to
+            this many enrichments per request instead of one request per company. Defaults to None.
+
+    Raises:
+        ValueError: If concurrency is less than 1
+
+    Yields:
+        dict: Dictionary with keys `domain` (registered domain), `input_domains` (domains passed which
+            normalise to it), `details` (as returned by `get_all_company_details`, None on failure) and
+            `error` (exception raised by the lookup, None on success)
+    """
+    if concurrency < 1:
+        raise ValueError("Concurrency must be at least 1")
+
+    input_domains_by_domain: dict[str, list[str]] = {}
+    for domain in domains:
+        input_domains_by_domain.setdefault(normalize_domain(domain), []).append(
+            domain
         )
-        harmonic_company = harmonic_company_details[
-            "enrichCompanyByIdentifiers"
-        ]["company"]
-        harmonic_company.update({"enrichment_urn": None})
-    except TransportQueryError as e:
-        for error in e.errors:
-            enrichment_urn = None
-            if (
-                error.get("extensions", {})
-                .get("response", {})
-                .get("status", 400)
-                == 404
-            ):
-                response_detail = (
-                    error.get("extensions", {})
-                    .get("response", {})
-                    .get("body", {})
-                    .get("detail", {})
+
+    async with AsyncExitStack() as stack:
+        if affinity_client is None:
+            affinity_client = await stack.enter_async_context(
+                AffinityApi(cache=TTLCache())
+            )
+        if harmonic_client is None:
+            harmonic_client = await stack.enter_async_context(HarmonicGql())
+
+        if harmonic_batch_size is not None:
+            if harmonic_cache is None:
+                harmonic_cache = HarmonicEnrichmentCache()
+            try:
+                await _enrich_companies_from_harmonic(
+                    harmonic_client,
+                    [domain for domain in input_domains_by_domain if domain],
+                    harmonic_cache,
+                    max_batch_size=harmonic_batch_size,
                 )
-                if isinstance(response_detail, dict):
-                    enrichment_urn = response_detail.get("enrichment_urn", None)
-            harmonic_company = {
-                "name": None,
-                "id": None,
-                "website": None,
-                "watchlists": [],
-                "socials": {},
-                "enrichment_urn": enrichment_urn,
+            except Exception:
+                # uncached companies are enriched and fail one at a time
+                logger.exception(
+                    "Failed to enrich companies from Harmonic in batches"
+                )
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _get_details(domain: str, input_domains: list[str]) -> dict:
+            result = {
+                "domain": domain,
+                "input_domains": input_domains,
+                "details": None,
+                "error": None,
             }
-            break
+            if not domain:
+                result["error"] = ValueError(
+                    f"No registered domain found for {input_domains}"
+                )
+                return result
+            try:
+                async with semaphore:
+                    result["details"] = await get_all_company_details(
+                        domain,
+                        affinity_config,
+                        affinity_client=affinity_client,
+                        harmonic_client=harmonic_client,
+                        harmonic_cache=harmonic_cache,
+                    )
+            except Exception as e:
+                result["error"] = e
+            return result
 
-    # combine clean domain and harmonic domain to increase likelihood of matching in Affinity
-    known_domains = [domain_clean]
-    if harmonic_company["website"] is not None:
-        known_domains.append(harmonic_company["website"]["domain"])
-    deduped_known_domains = list(set(known_domains))
+        tasks = [
+            asyncio.ensure_future(_get_details(domain, input_domains))
+            for domain, input_domains in input_domains_by_domain.items()
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+            # lookups must finish before the clients they use are closed
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _get_all_company_details(
+    domain: str,
+    affinity_config: dict[str, Any],
+    affinity_client: AffinityApi,
+    harmonic_client: HarmonicGql,
+    harmonic_cache: HarmonicEnrichmentCache,
+) -> dict:
+    domain_clean = normalize_domain(domain)
 
-    affinity_results = await affinity_client.search_company_by_name_and_domains(
-        name=harmonic_company["name"], domains=deduped_known_domains
+    # the affinity domain search does not depend on harmonic so start it straight away
+    domain_search = asyncio.ensure_future(
+        affinity_client.search_company_by_name_and_domains(
+            domains=[domain_clean]
+        )
     )
+    try:
+        harmonic_company = await _enrich_company_from_harmonic(
+            harmonic_client, domain_clean, harmonic_cache
+        )
 
-    # find id of matching company
-    affinity_entity_id = next(
-        (
-            int(company["id"])
-            for company in affinity_results
-            if set(deduped_known_domains).issubset(set(company["domains"]))
-        ),
-        None,
+        # combine clean domain and harmonic domain to increase likelihood of matching in Affinity
+        known_domains = [domain_clean]
+        if harmonic_company["website"] is not None:
+            known_domains.append(harmonic_company["website"]["domain"])
+        deduped_known_domains = list(set(known_domains))
+
+        # search by name and any extra domain harmonic knows about while the domain search finishes
+        extra_domains = [d for d in deduped_known_domains if d != domain_clean]
+        searches = [domain_search]
+        if harmonic_company["name"] or extra_domains:
+            searches.append(
+                affinity_client.search_company_by_name_and_domains(
+                    name=harmonic_company["name"], domains=extra_domains
+                )
+            )
+        search_results = await asyncio.gather(*searches)
+    finally:
+        domain_search.cancel()
+
+    affinity_results = affinity_client._remove_duplicates(
+        [company for results in search_results for company in results]
+    )
+
+    # rank search results by shared domains and name similarity and pick the best match
+    affinity_match = CandidateIndex(affinity_results).best_match(
+        deduped_known_domains, name=harmonic_company["name"]
     )
 
-    if affinity_entity_id is None:
+    if affinity_match is None:
         return {"crm": None, "sourcing_platform": harmonic_company}
+    affinity_entity_id = int(affinity_match.candidate["id"])
 
-    # get company id of match and retrieve company information by id from affinity
-    affinity_company_details = await affinity_client.get_company_details(
-        affinity_entity_id
-    )
-    all_company_field_values = await affinity_client.get_field_values(
-        param={"organization_id": affinity_entity_id}
+    # get company id of match and retrieve company information and field values by id from affinity
+    # interactions are not used so are dropped while the response is parsed
+    affinity_company_details, all_company_field_values = await asyncio.gather(
+        affinity_client.get_company_details(
+            affinity_entity_id, exclude=("interactions",)
+        ),
+        affinity_client.get_field_values(
+            param={"organization_id": affinity_entity_id}
+        ),
     )
 
     # loop through list entries, get live pipeline entries only, and pick most recent one
@@ -139,47 +349,28 @@ async def get_all_company_details(
         list_id=affinity_config["lp_list_id"],
     )
 
+    field_value_index = FieldValueIndex(all_company_field_values)
+
     if len(lp_entries):
         last_entry = max(lp_entries, key=lambda entry: entry["created_at"])
-        last_lp_list_entry_field_values = list(
-            filter(
-                lambda field_value: (
-                    field_value["list_entry_id"] == last_entry["id"]
-                )
-                and (field_value["field_id"] in live_pipeline_fields),
-                all_company_field_values,
-            )
-        )
         last_live_pipeline_list_entry = {
             "entry_id": last_entry["id"],
-            "status": affinity_client.field_value_by_field_id(
-                field_values=last_lp_list_entry_field_values,
+            "status": field_value_index.get(
                 field_id=affinity_config["lp_status_field_id"],
+                list_entry_id=last_entry["id"],
             ),
-            "priority": affinity_client.field_value_by_field_id(
-                field_values=last_lp_list_entry_field_values,
+            "priority": field_value_index.get(
                 field_id=affinity_config["lp_priority_field_id"],
+                list_entry_id=last_entry["id"],
             ),
-            "owner": affinity_client.field_value_by_field_id(
-                field_values=last_lp_list_entry_field_values,
+            "owner": field_value_index.get(
                 field_id=affinity_config["lp_owner_field_id"],
+                list_entry_id=last_entry["id"],
             ),
         }
     else:
         last_live_pipeline_list_entry = None
 
-    # get all field values for company (includes list entries)
-
-    company_field_values = list(
-        filter(
-            lambda field_value: (field_value["list_entry_id"] is None)
-            and (
-                field_value["field_id"] == affinity_config["ec_flag_field_id"]
-            ),
-            all_company_field_values,
-        )
-    )
-
     # create affinity return
     # issue with field values currently returned as lists as throws error if indexing empty list (in case
     # field not populated)
@@ -188,29 +379,234 @@ async def get_all_company_details(
         "company_name": affinity_company_details["name"],
         "domain": affinity_company_details["domain"],
         "domains": affinity_company_details["domains"],
-        "ec_flag": affinity_client.field_value_by_field_id(
-            field_values=company_field_values,
-            field_id=affinity_config["ec_flag_field_id"],
+        "ec_flag": field_value_index.get(
+            field_id=affinity_config["ec_flag_field_id"]
         ),
         "last_live_pipeline_list_entry": last_live_pipeline_list_entry,
+        "match_confidence": affinity_match.score,
     }
 
     return {"crm": affinity_return, "sourcing_platform": harmonic_company}
 
 
+async def _enrich_company_from_harmonic(
+    harmonic_client: HarmonicGql,
+    domain_clean: str,
+    harmonic_cache: HarmonicEnrichmentCache = None,
+) -> dict:
+    """Enrich company by domain in Harmonic
+
+    Args:
+        harmonic_client (HarmonicGql): Harmonic client
+        domain_clean (str): Registered domain of company
+        harmonic_cache (HarmonicEnrichmentCache, optional): Cache of previous enrichments. Defaults to None.
+
+    Returns:
+        dict: Harmonic company details. If the company is not found, details are empty apart from
+            `enrichment_urn` which is set when Harmonic has scheduled the company for enrichment. Details are
+            empty as well while the Harmonic client's circuit breaker is open
+    """
+    if harmonic_cache is not None:
+        cached_company = harmonic_cache.get(domain_clean)
+        if cached_company is not None:
+            return cached_company
+
+    try:
+        harmonic_company_details = await harmonic_client.query(
+            query=HARMONIC_ENRICH_COMPANY_QUERY,
+            variables={"identifiers": {"websiteUrl": domain_clean}},
+        )
+        harmonic_company = _cache_harmonic_result(
+            harmonic_cache,
+            domain_clean,
+            harmonic_company_details["enrichCompanyByIdentifiers"],
+        )
+    except TransportQueryError as e:
+        harmonic_company = _cache_harmonic_result(
+            harmonic_cache, domain_clean, e
+        )
+    except CircuitOpenError:
+        # harmonic is failing, carry on with crm details only rather than waiting for it
+        harmonic_company = _empty_harmonic_company()
+
+    return harmonic_company
+
+
+async def _enrich_companies_from_harmonic(
+    harmonic_client: HarmonicGql,
+    domains: list[str],
+    harmonic_cache: HarmonicEnrichmentCache,
+    max_batch_size: int = 50,
+):
+    """Enrich companies which are not cached yet in Harmonic, batching enrichments into as few requests as
+    possible, and cache the results
+
+    Companies which fail with an error other than not found are left out of the cache so they are retried
+    one at a time by `_enrich_company_from_harmonic`.
+
+    Args:
+        harmonic_client (HarmonicGql): Harmonic client
+        domains (list[str]): Registered domains of companies
+        harmonic_cache (HarmonicEnrichmentCache): Cache to fill
+        max_batch_size (int, optional): Maximum number of enrichments per request. Defaults to 50.
+    """
+    uncached_domains = [
+        domain for domain in domains if harmonic_cache.get(domain) is None
+    ]
+    if not uncached_domains:
+        return
+
+    results = await harmonic_client.enrich_companies_by_domains(
+        uncached_domains,
+        selection=HARMONIC_ENRICH_COMPANY_SELECTION,
+        max_batch_size=max_batch_size,
+    )
+    for domain, result in results.items():
+        if isinstance(result, TransportQueryError) or (
+            isinstance(result, dict) and result.get("company") is not None
+        ):
+            _cache_harmonic_result(harmonic_cache, domain, result)
+
+
+def _cache_harmonic_result(
+    harmonic_cache: HarmonicEnrichmentCache | None,
+    domain_clean: str,
+    result: dict | TransportQueryError,
+) -> dict:
+    """Turn the result of an `enrichCompanyByIdentifiers` mutation into Harmonic company details and cache it
+
+    Args:
+        harmonic_cache (HarmonicEnrichmentCache | None): Cache of enrichments
+        domain_clean (str): Registered domain of company
+        result (dict | TransportQueryError): Result of the mutation or the GraphQL error raised for it
+
+    Returns:
+        dict: Harmonic company details. If the company is not found, details are empty apart from
+            `enrichment_urn` which is set when Harmonic has scheduled the company for enrichment
+    """
+    if not isinstance(result, TransportQueryError):
+        harmonic_company = result["company"]
+        harmonic_company.update({"enrichment_urn": None})
+        if harmonic_cache is not None:
+            harmonic_cache.set(domain_clean, harmonic_company, found=True)
+        return harmonic_company
+
+    for error in result.errors:
+        enrichment_urn = None
+        not_found = (
+            error.get("extensions", {}).get("response", {}).get("status", 400)
+            == 404
+        )
+        if not_found:
+            response_detail = (
+                error.get("extensions", {})
+                .get("response", {})
+                .get("body", {})
+                .get("detail", {})
+            )
+            if isinstance(response_detail, dict):
+                enrichment_urn = response_detail.get("enrichment_urn", None)
+        harmonic_company = _empty_harmonic_company(enrichment_urn)
+        # only cache companies harmonic does not know about, other errors may be transient
+        if not_found and harmonic_cache is not None:
+            harmonic_cache.set(domain_clean, harmonic_company, found=False)
+        break
+
+    return harmonic_company
+
+
+def _empty_harmonic_company(enrichment_urn: str = None) -> dict:
+    return {
+        "name": None,
+        "id": None,
+        "website": None,
+        "watchlists": [],
+        "socials": {},
+        "enrichment_urn": enrichment_urn,
+    }
+
+
 def lookup_company_master_id_by_domain(
-    domain: str, db_client: Client
+    domain: str, db_client: Client, index: CompanyDomainIndex = None
 ) -> Company | None:
     """Lookup company master id by domain
 
     Args:
         domain (str): Domain name of company
         db_client (Client): Datastore client
+        index (CompanyDomainIndex, optional): In-memory index read before querying Datastore. Domains missing
+            from the index are still queried. Defaults to None.
 
     Returns:
         Company: Company details
     """
-    clean_domain = extract(domain).registered_domain
+    clean_domain = normalize_domain(domain)
+    if index is not None:
+        company = index.get(clean_domain)
+        if company is not None:
+            return company
+
+    company_entity = _query_company_by_domain(db_client, clean_domain)
+    if company_entity is None:
+        return None
+
+    return Company(id=company_entity.key.id, **company_entity)
+
+
+def lookup_company_master_ids_by_domains(
+    domains: Iterable[str],
+    db_client: Client,
+    concurrency: int = 16,
+    keys_only: bool = False,
+) -> dict[str, Company | int | None]:
+    """Lookup company master ids for many domains
+
+    Domains are normalised to their registered domain once and each registered domain is queried once, with
+    up to `concurrency` queries in flight.
+
+    Args:
+        domains (Iterable[str]): Domain names of companies
+        db_client (Client): Datastore client
+        concurrency (int, optional): Maximum number of queries in flight. Defaults to 16.
+        keys_only (bool, optional): Only fetch master ids with keys-only queries instead of full companies.
+            Defaults to False.
+
+    Raises:
+        ValueError: If concurrency is less than 1
+
+    Returns:
+        dict[str, Company | int | None]: Company details, or master id if `keys_only` is set, for each domain
+            passed. None if no company is found
+    """
+    if concurrency < 1:
+        raise ValueError("Concurrency must be at least 1")
+
+    clean_domains = normalize_domains(domains)
+    unique_domains = [
+        domain for domain in set(clean_domains.values()) if domain
+    ]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        company_entities = executor.map(
+            lambda clean_domain: _query_company_by_domain(
+                db_client, clean_domain, keys_only=keys_only
+            ),
+            unique_domains,
+        )
+        companies_by_domain = {
+            clean_domain: _company_from_entity(company_entity, keys_only)
+            for clean_domain, company_entity in zip(
+                unique_domains, company_entities
+            )
+        }
+    return {
+        domain: companies_by_domain.get(clean_domain)
+        for domain, clean_domain in clean_domains.items()
+    }
+
+
+def _query_company_by_domain(
+    db_client: Client, clean_domain: str, keys_only: bool = False
+) -> Entity | None:
     query = db_client.query(kind="Company")
     query.add_filter(
         filter=And(
@@ -220,11 +616,20 @@ def lookup_company_master_id_by_domain(
             ]
         )
     )
-    results = list(query.fetch())
-    if not len(results):
-        return None
+    if keys_only:
+        query.keys_only()
+    # only the first match is used so stop the query there
+    return next(iter(query.fetch(limit=1)), None)
 
-    return Company(id=results[0].key.id, **results[0])
+
+def _company_from_entity(
+    company_entity: Entity | None, keys_only: bool = False
+) -> Company | int | None:
+    if company_entity is None:
+        return None
+    if keys_only:
+        return company_entity.key.id
+    return Company(id=company_entity.key.id, **company_entity)
 
 
 def create_company_master_id(company: Company, db_client: Client) -> Company:
@@ -244,3 +649,228 @@ def create_company_master_id(company: Company, db_client: Client) -> Company:
     company_entity.update(company.model_dump(exclude={"id"}))
     db_client.put(company_entity)
     return company
+
+
+def create_company_master_ids(
+    companies: list[Company],
+    db_client: Client,
+    skip_existing: bool = False,
+    chunk_size: int = DATASTORE_MAX_BATCH_SIZE,
+    max_retries: int = 3,
+    backoff_base: float = 0.5,
+) -> list[CompanyCreateResult]:
+    """Create company master ids in bulk
+
+    Ids are allocated a chunk at a time and companies are written with one `put_multi` per chunk. A chunk which
+    fails to write is retried with exponential backoff using the same ids, so retries never create duplicates
+    and only failed chunks are written again.
+
+    Args:
+        companies (list[Company]): Companies to create, ids are set on them as they are allocated
+        db_client (Client): Datastore client
+        skip_existing (bool, optional): Look up the domains of all companies first and skip companies with a
+            domain that already has a current master id or belongs to an earlier company in `companies`.
+            Defaults to False.
+        chunk_size (int, optional): Companies allocated and written per request. Defaults to 500, the maximum
+            Datastore accepts.
+        max_retries (int, optional): Maximum retries of a chunk which fails to write. Defaults to 3.
+        backoff_base (float, optional): Seconds to wait before the first retry. Defaults to 0.5.
+
+    Raises:
+        ValueError: If chunk size is not between 1 and 500
+
+    Returns:
+        list[CompanyCreateResult]: Result for each company, in the order passed. Skipped companies have status
+            `EXISTING` and the id of the existing company, with `duplicate_of` set if it was created in this batch
+    """
+    if not 1 <= chunk_size <= DATASTORE_MAX_BATCH_SIZE:
+        raise ValueError(
+            f"Chunk size must be between 1 and {DATASTORE_MAX_BATCH_SIZE}"
+        )
+
+    results = [CompanyCreateResult(company=company) for company in companies]
+    if skip_existing:
+        _mark_existing_companies(results, db_client)
+
+    pending = [
+        result
+        for result in results
+        if result.status is CompanyCreateStatus.PENDING
+    ]
+    partial_key = db_client.key("Company")
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start : start + chunk_size]
+        try:
+            allocated_keys = db_client.allocate_ids(partial_key, len(chunk))
+        except GoogleAPIError as e:
+            for result in chunk:
+                result.status = CompanyCreateStatus.FAILED
+                result.error = str(e)
+            continue
+
+        company_entities = []
+        for result, key in zip(chunk, allocated_keys):
+            company_entity = db_client.entity(key=key)
+            result.company.id = key.id
+            company_entity.update(result.company.model_dump(exclude={"id"}))
+            company_entities.append(company_entity)
+
+        for attempt in range(max_retries + 1):
+            try:
+                db_client.put_multi(company_entities)
+                status, error = CompanyCreateStatus.CREATED, None
+                break
+            except GoogleAPIError as e:
+                status, error = CompanyCreateStatus.FAILED, str(e)
+                if attempt < max_retries:
+                    time.sleep(backoff_base * 2**attempt)
+        for result in chunk:
+            result.status = status
+            result.error = error
+            if status is CompanyCreateStatus.FAILED:
+                # the allocated id was never written
+                result.company.id = None
+
+    for result in results:
+        if result.duplicate_of is not None:
+            result.company.id = result.duplicate_of.id
+            if result.duplicate_of.id is None:
+                result.status = CompanyCreateStatus.FAILED
+                result.error = (
+                    "Company with the same domain failed to be created"
+                )
+    return results
+
+
+def _mark_existing_companies(
+    results: list[CompanyCreateResult], db_client: Client
+):
+    existing_ids = lookup_company_master_ids_by_domains(
+        [domain for result in results for domain in result.company.domains],
+        db_client,
+        keys_only=True,
+    )
+    # companies earlier in the batch claim their registered domains so the same company is not created twice
+    claimed_by: dict[str, Company] = {}
+    for result in results:
+        domains = result.company.domains
+        clean_domains = [
+            clean_domain
+            for clean_domain in map(normalize_domain, domains)
+            if clean_domain
+        ]
+        existing_id = next(
+            (
+                existing_ids[domain]
+                for domain in domains
+                if existing_ids[domain]
+            ),
+            None,
+        )
+        if existing_id is not None:
+            result.company.id = existing_id
+            result.status = CompanyCreateStatus.EXISTING
+            continue
+
+        claiming_company = next(
+            (
+                claimed_by[clean_domain]
+                for clean_domain in clean_domains
+                if clean_domain in claimed_by
+            ),
+            None,
+        )
+        if claiming_company is not None:
+            result.duplicate_of = claiming_company
+            result.status = CompanyCreateStatus.EXISTING
+            continue
+
+        for clean_domain in clean_domains:
+            claimed_by[clean_domain] = result.company
+
+
+async def lookup_company_master_id_by_domain_async(
+    domain: str, datastore: AsyncDatastore = None
+) -> Company | None:
+    """Lookup company master id by domain without blocking the event loop
+
+    Args:
+        domain (str): Domain name of company
+        datastore (AsyncDatastore, optional): Thread pool and client to run the lookup with. Defaults to
+            `AsyncDatastore.shared()`.
+
+    Returns:
+        Company: Company details
+    """
+    datastore = datastore or AsyncDatastore.shared()
+    return await datastore.run(
+        lambda db_client: lookup_company_master_id_by_domain(domain, db_client)
+    )
+
+
+async def create_company_master_id_async(
+    company: Company, datastore: AsyncDatastore = None
+) -> Company:
+    """Create company master id without blocking the event loop
+
+    If the call is cancelled once the write has started, the company may still be created.
+
+    Args:
+        company (Company): Company details
+        datastore (AsyncDatastore, optional): Thread pool and client to run the write with. Defaults to
+            `AsyncDatastore.shared()`.
+
+    Returns:
+        Company: Company details
+    """
+    datastore = datastore or AsyncDatastore.shared()
+    return await datastore.run(
+        lambda db_client: create_company_master_id(company, db_client)
+    )
+
+
+async def lookup_company_master_ids_by_domains_async(
+    domains: Iterable[str],
+    datastore: AsyncDatastore = None,
+    keys_only: bool = False,
+) -> dict[str, Company | int | None]:
+    """Lookup company master ids for many domains without blocking the event loop
+
+    Each registered domain is queried once on the datastore's thread pool, which bounds the queries in flight.
+
+    Args:
+        domains (Iterable[str]): Domain names of companies
+        datastore (AsyncDatastore, optional): Thread pool and client to run the lookups with. Defaults to
+            `AsyncDatastore.shared()`.
+        keys_only (bool, optional): Only fetch master ids with keys-only queries instead of full companies.
+            Defaults to False.
+
+    Returns:
+        dict[str, Company | int | None]: Company details, or master id if `keys_only` is set, for each domain
+            passed. None if no company is found
+    """
+    datastore = datastore or AsyncDatastore.shared()
+    clean_domains = normalize_domains(domains)
+    unique_domains = [
+        domain for domain in set(clean_domains.values()) if domain
+    ]
+    company_entities = await asyncio.gather(
+        *(
+            datastore.run(
+                lambda db_client, clean_domain=clean_domain: _query_company_by_domain(
+                    db_client, clean_domain, keys_only=keys_only
+                )
+            )
+            for clean_domain in unique_domains
+        )
+    )
+    companies_by_domain = {
+        clean_domain: _company_from_entity(company_entity, keys_only)
+        for clean_domain, company_entity in zip(
+            unique_domains, company_entities
+        )
+    }
+    return {
+        domain: companies_by_domain.get(clean_domain)
+        for domain, clean_domain in clean_domains.items()
+    }
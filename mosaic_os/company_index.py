@@ -0,0 +1,144 @@
+import threading
+import time
+from datetime import datetime
+from typing import Iterable
+
+from google.cloud.datastore import Client, Entity
+from google.cloud.datastore.query import PropertyFilter
+
+from mosaic_os.cache import TTLCache
+from mosaic_os.models import Company
+from mosaic_os.utils import datetime_now
+
+
+class CompanyDomainIndex:
+    """In-memory index from registered domain to the master id of the current `Company` with that domain
+
+    The index is built from a projection of keys and domains of current companies, so it stays small enough to
+    hold every company. Later refreshes only fetch companies created or updated since the last refresh, using
+    `created_at` and `updated_at`. Companies returned by `get` are fetched by key on first use and kept in a
+    bounded cache which refreshes keep up to date.
+
+    The projection filters on `current` and projects `domains`, so Datastore needs a composite index on
+    `current` and `domains` of the `Company` kind.
+
+    Args:
+        db_client (Client): Datastore client
+        refresh_interval (float, optional): Seconds after which `get` refreshes the index first. Defaults to 60.
+        max_companies (int, optional): Maximum number of companies kept in the cache. Defaults to 10000.
+    """
+
+    def __init__(self, db_client: Client, refresh_interval: float = 60, max_companies: int = 10_000):
+        self.db_client = db_client
+        self.refresh_interval = refresh_interval
+        self.watermark: datetime | None = None
+        self._ids_by_domain: dict[str, int] = {}
+        self._domains_by_id: dict[int, tuple[str, ...]] = {}
+        # refreshes replace changed companies, the TTL only bounds staleness of companies updated without
+        # setting `updated_at`
+        self._companies = TTLCache(ttl=60 * 60, max_size=max_companies)
+        self._refreshed_at = float("-inf")
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._ids_by_domain)
+
+    def refresh(self):
+        """Build the index or apply companies created or updated since the last refresh"""
+        with self._lock:
+            # companies changed while the index refreshes are applied again by the next refresh
+            started_at = datetime_now()
+            if self.watermark is None:
+                self._build()
+            else:
+                for company_entity in self._changed_since(self.watermark):
+                    self._apply(company_entity)
+            self.watermark = started_at
+            self._refreshed_at = time.monotonic()
+
+    def get_id(self, domain: str) -> int | None:
+        """Get the master id of the current company with a registered domain
+
+        Args:
+            domain (str): Registered domain of company
+
+        Returns:
+            int | None: Master id, or None if no current company has the domain
+        """
+        with self._lock:
+            if time.monotonic() - self._refreshed_at >= self.refresh_interval:
+                self.refresh()
+            return self._ids_by_domain.get(domain)
+
+    def get(self, domain: str) -> Company | None:
+        """Get the current company with a registered domain
+
+        Args:
+            domain (str): Registered domain of company
+
+        Returns:
+            Company | None: Copy of the company details, or None if no current company has the domain
+        """
+        company_id = self.get_id(domain)
+        if company_id is None:
+            return None
+
+        with self._lock:
+            company = self._companies.get(company_id)
+        if company is None:
+            company_entity = self.db_client.get(self.db_client.key("Company", company_id))
+            if company_entity is None:
+                return None
+            company = Company(id=company_id, **company_entity)
+            with self._lock:
+                self._companies.set(company_id, company)
+        return company.model_copy(deep=True)
+
+    def _build(self):
+        query = self.db_client.query(kind="Company")
+        query.add_filter(filter=PropertyFilter("current", "=", True))
+        query.projection = ["domains"]
+
+        domains_by_id: dict[int, list[str]] = {}
+        # a projection on a list property returns one result per domain of each company
+        for result in query.fetch():
+            domains_by_id.setdefault(result.key.id, []).extend(_as_list(result.get("domains")))
+
+        self._ids_by_domain.clear()
+        self._domains_by_id.clear()
+        self._companies.clear()
+        for company_id, domains in domains_by_id.items():
+            self._index(company_id, domains)
+
+    def _changed_since(self, watermark: datetime) -> Iterable[Entity]:
+        changed = {}
+        for property_name in ("created_at", "updated_at"):
+            query = self.db_client.query(kind="Company")
+            query.add_filter(filter=PropertyFilter(property_name, ">", watermark))
+            for company_entity in query.fetch():
+                changed[company_entity.key.id] = company_entity
+        return changed.values()
+
+    def _apply(self, company_entity: Entity):
+        company_id = company_entity.key.id
+        for domain in self._domains_by_id.pop(company_id, ()):
+            if self._ids_by_domain.get(domain) == company_id:
+                del self._ids_by_domain[domain]
+        self._companies.delete(company_id)
+
+        if company_entity.get("current", True):
+            self._index(company_id, _as_list(company_entity.get("domains")))
+            self._companies.set(company_id, Company(id=company_id, **company_entity))
+
+    def _index(self, company_id: int, domains: list[str]):
+        self._domains_by_id[company_id] = tuple(domains)
+        for domain in domains:
+            self._ids_by_domain[domain] = company_id
+
+
+def _as_list(value: str | list[str] | None) -> list[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
@@ -1,8 +1,15 @@
 # Scope for Google Calendar API
 CALENDAR_SCOPES = ["https://www.googleapis.com/auth/calendar.events.readonly"]
 
+# Delegated calendar credentials are cached for less than the one hour lifetime of their access token
+CALENDAR_CREDENTIALS_TTL = 55 * 60
+CALENDAR_CREDENTIALS_CACHE_SIZE = 256
+
 # Affinity API base URL
 AFFINITY_API_BASE_URL = "https://api.affinity.co"
 
 CONFIG_BUCKET_ENV_NAME = "CONFIG_BUCKET"
 CONFIG_OBJECT_ENV_NAME = "CONFIG_OBJECT_NAME"
+
+# Maximum number of entities Datastore accepts in a single batch request
+DATASTORE_MAX_BATCH_SIZE = 500
@@ -1,10 +1,39 @@
-import json
+import asyncio
+import inspect
+from contextlib import asynccontextmanager
+from copy import deepcopy
 from enum import Enum
+from functools import wraps
 from os import environ
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, Iterable
 
-from httpx import AsyncClient
+from httpx import AsyncClient, HTTPError, HTTPStatusError, Limits, Response
+from pydantic import BaseModel
 
+from mosaic_os.cache import TTLCache
 from mosaic_os.constants import AFFINITY_API_BASE_URL
+from mosaic_os.json_stream import JsonArrayStream, decode_json_stream
+from mosaic_os.rate_limit import RateLimitScheduler
+
+
+def _cached_read(method: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """Serve an AffinityApi read from the client's cache when one is configured
+
+    The cache key is the method name followed by its bound arguments in hashable form, so positional and
+    keyword calls, and lists and tuples of the same values, share an entry. Callers get a copy of the cached response so changing it does not change the cache.
+    """
+    signature = inspect.signature(method)
+
+    @wraps(method)
+    async def wrapper(self: "AffinityApi", *args, **kwargs):
+        if self.cache is None:
+            return await method(self, *args, **kwargs)
+        bound_arguments = signature.bind(self, *args, **kwargs)
+        bound_arguments.apply_defaults()
+        key = (method.__name__, tuple(_freeze(value) for value in bound_arguments.arguments.values())[1:])
+        return deepcopy(await self.cache.get_or_fetch(key, lambda: method(self, *args, **kwargs)))
+
+    return wrapper
 
 
 class AffinityApi:
@@ -14,24 +43,130 @@ class AffinityApi:
     Args:
         affinity_api_key (str, optional): API key for Affinity which can be set by passing through here or
         setting environment variable `AFFINITY_API_KEY`  Defaults to None.
+        max_connections (int, optional): Maximum number of open connections. Defaults to 100.
+        max_keepalive_connections (int, optional): Maximum number of idle connections kept alive. Defaults to 20.
+        keepalive_expiry (float, optional): Seconds an idle connection is kept alive for. Defaults to 5.0.
+        http2 (bool, optional): Enable HTTP/2. Requires the `h2` package (`httpx[http2]`). Defaults to False.
+        scheduler (RateLimitScheduler, optional): Rate limit scheduler all requests go through. Defaults to the
+            scheduler shared by every client using the same API key, see `RateLimitScheduler.shared`.
+        cache (TTLCache, optional): Opt-in cache for `search_company`, `get_company_details`,
+            `get_person_details` and `get_opportunity_details`. Writes through this client invalidate the
+            affected entries. Defaults to None.
 
     Raises:
         ValueError: If affinity_api_key is not set
     """
 
-    def __init__(self, affinity_api_key: str = None):
+    _shared_clients: dict[tuple, "AffinityApi"] = {}
+
+    def __init__(
+        self,
+        affinity_api_key: str = None,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 5.0,
+        http2: bool = False,
+        scheduler: RateLimitScheduler = None,
+        cache: TTLCache = None,
+    ):
         _affinity_api_key = environ.get("AFFINITY_API_KEY", affinity_api_key)
 
         if _affinity_api_key is None:
             raise ValueError("Affinity API key not found in environment variables or passed as argument")
 
         self.requests = AsyncClient(
-            auth=("", _affinity_api_key), headers={"Content-Type": "application/json"}, base_url=AFFINITY_API_BASE_URL
+            auth=("", _affinity_api_key),
+            headers={"Content-Type": "application/json"},
+            base_url=AFFINITY_API_BASE_URL,
+            limits=Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            http2=http2,
         )
+        self.scheduler = scheduler or RateLimitScheduler.shared(_affinity_api_key)
+        self.cache = cache
+
+    @classmethod
+    def shared(cls, affinity_api_key: str = None, **client_options) -> "AffinityApi":
+        """Get a process-wide client so connection pools are reused between callers
+
+        Clients are keyed by API key and client options. Shared clients should only be used from a single
+        event loop and are closed with `AffinityApi.close_shared()`.
+
+        Args:
+            affinity_api_key (str, optional): API key for Affinity. Defaults to None.
+            **client_options: Pool options passed to `AffinityApi`
+
+        Returns:
+            AffinityApi: Shared Affinity client
+        """
+        registry_key = (
+            environ.get("AFFINITY_API_KEY", affinity_api_key),
+            tuple(sorted(client_options.items())),
+        )
+        client = cls._shared_clients.get(registry_key)
+        if client is None or client.requests.is_closed:
+            client = cls(affinity_api_key, **client_options)
+            cls._shared_clients[registry_key] = client
+        return client
+
+    @classmethod
+    async def close_shared(cls):
+        """Close all shared clients"""
+        clients = list(cls._shared_clients.values())
+        cls._shared_clients.clear()
+        for client in clients:
+            await client.aclose()
+
+    async def aclose(self):
+        """Close the underlying HTTP client and its connection pool"""
+        await self.requests.aclose()
+
+    async def __aenter__(self) -> "AffinityApi":
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+
+    async def _request(self, method: str, url: str, **kwargs) -> Response:
+        """Send a request through the rate limit scheduler
+
+        Args:
+            method (str): HTTP method
+            url (str): URL relative to the Affinity API base URL
+            **kwargs: Arguments passed to `AsyncClient.request`
+
+        Returns:
+            Response: Response from Affinity
+        """
+        return await self.scheduler.request(method, lambda: self.requests.request(method, url, **kwargs))
+
+    @asynccontextmanager
+    async def _stream_request(self, method: str, url: str, **kwargs) -> AsyncIterator[Response]:
+        """Send a request through the rate limit scheduler without reading the response body
+
+        Args:
+            method (str): HTTP method
+            url (str): URL relative to the Affinity API base URL
+            **kwargs: Arguments passed to `AsyncClient.build_request`
+
+        Yields:
+            Response: Response from Affinity with a successful status code and an unread body
+        """
+        request = self.requests.build_request(method, url, **kwargs)
+        response = await self.scheduler.request(method, lambda: self.requests.send(request, stream=True))
+        try:
+            response.raise_for_status()
+            yield response
+        finally:
+            await response.aclose()
 
     # API methods
 
     # Company related API calls
+    @_cached_read
     async def search_company(self, term: str) -> dict:
         """Search company by term in Affinity
 
@@ -41,7 +176,7 @@ class AffinityApi:
         Returns:
             dict: Response with `organizations` key containing list of companies
         """
-        response = await self.requests.get(f"/organizations?term={term}")
+        response = await self._request("GET", f"/organizations?term={term}")
         response.raise_for_status()
         return response.json()
 
@@ -56,22 +191,29 @@ class AffinityApi:
             dict: Response with created company details
         """
         data = {"name": name, "domain": domain}
-        response = await self.requests.post("/organizations", json=data)
+        response = await self._request("POST", "/organizations", json=data)
         response.raise_for_status()
+        self._invalidate_cache(lambda key: key[0] == "search_company")
         return response.json()
 
-    async def get_company_details(self, entity_id: int) -> dict:
+    @_cached_read
+    async def get_company_details(self, entity_id: int, exclude: Iterable[str] = ()) -> dict:
         """Get company details by ID
 
         Args:
             entity_id (int): ID of company
+            exclude (Iterable[str], optional): Keys to drop from the response while it is parsed, e.g.
+                `("interactions",)` to skip interaction persons. Defaults to ().
 
         Returns:
             dict: Response with company details
         """
-        response = await self.requests.get(
-            f"/organizations/{entity_id}?with_opportunities=true&with_interaction_dates=true&with_interaction_persons=true"  # noqa: E501
-        )
+        url = f"/organizations/{entity_id}?with_opportunities=true&with_interaction_dates=true&with_interaction_persons=true"  # noqa: E501
+        if exclude:
+            async with self._stream_request("GET", url) as response:
+                return await decode_json_stream(response.aiter_bytes(), exclude=exclude)
+
+        response = await self._request("GET", url)
         response.raise_for_status()
         return response.json()
 
@@ -85,10 +227,11 @@ class AffinityApi:
         Returns:
             dict: Response with `persons` key containing list of persons
         """
-        response = await self.requests.get(f"/persons?term={term}")
+        response = await self._request("GET", f"/persons?term={term}")
         response.raise_for_status()
         return response.json()
 
+    @_cached_read
     async def get_person_details(self, entity_id: int, with_current_organizations: bool = False) -> dict:
         """Get person details by ID
 
@@ -101,7 +244,7 @@ class AffinityApi:
         params = {}
         if with_current_organizations:
             params.update({"with_current_organizations": "true"})
-        response = await self.requests.get(f"/persons/{entity_id}", params=params)
+        response = await self._request("GET", f"/persons/{entity_id}", params=params)
         response.raise_for_status()
         return response.json()
 
@@ -117,18 +260,26 @@ class AffinityApi:
         Returns:
             list[dict]: List of field values
         """
+        self._validate_field_values_param(param)
 
-        if len(param) != 1 or not any(
-            k in param for k in ("organization_id", "list_entry_id", "person_id", "opportunity_id")
-        ):
-            raise ValueError(
-                "Only one of the following keys should be specified: `organization_id`, `list_entry_id`, `person_id` or `opportunity_id`"  # noqa: E501
-            )
-
-        response = await self.requests.get(url="/field-values", params=param)
+        response = await self._request("GET", "/field-values", params=param)
         response.raise_for_status()
         return response.json()
 
+    async def iter_field_values(self, param: dict, page_size: int = 500) -> AsyncIterator[dict]:
+        """Iterate over field values page by page. See `get_field_values` for the accepted params
+
+        Args:
+            param (dict): Query param to filter field values by Company ID, List Entry ID, or Person ID
+            page_size (int, optional): Number of field values fetched per page. Defaults to 500.
+
+        Yields:
+            dict: Field value
+        """
+        self._validate_field_values_param(param)
+        async for field_value in self._iter_pages("/field-values", param, "field_values", page_size):
+            yield field_value
+
     async def create_field_value(
         self, field_id: int, entity_id: int, value: str | int, list_entry_id: int = None
     ) -> dict:
@@ -148,8 +299,9 @@ class AffinityApi:
         if list_entry_id is not None:
             data.update({"list_entry_id": list_entry_id})
 
-        response = await self.requests.post("/field-values", json=data)
+        response = await self._request("POST", "/field-values", json=data)
         response.raise_for_status()
+        self._invalidate_cached_entities(entity_id)
         return response.json()
 
     async def update_field_value(self, field_value_id: int, new_value: str | int) -> dict:
@@ -163,9 +315,11 @@ class AffinityApi:
             dict: Response with updated field value
         """
         data = {"value": new_value}
-        response = await self.requests.put(f"/field-values/{field_value_id}", json=data)
+        response = await self._request("PUT", f"/field-values/{field_value_id}", json=data)
         response.raise_for_status()
-        return response.json()
+        field_value = response.json()
+        self._invalidate_cached_entities(field_value.get("entity_id"))
+        return field_value
 
     async def upsert_field_value(
         self, field_id: int, entity_id: int, value: str | int, list_entry_id: int = None
@@ -188,8 +342,9 @@ class AffinityApi:
         if list_entry_id:
             data.update({"list_entry_id": list_entry_id})
 
-        response = await self.requests.put("/field-values", json=data)
+        response = await self._request("PUT", "/field-values", json=data)
         response.raise_for_status()
+        self._invalidate_cached_entities(entity_id)
         return response.json()
 
     async def get_field_value_changes(self, params: dict) -> list[dict]:
@@ -204,14 +359,26 @@ class AffinityApi:
         Returns:
             list[dict]: List of field value changes
         """
+        self._validate_field_value_changes_params(params)
 
-        if "field_id" not in params:
-            raise ValueError("Field ID must be specified")
-
-        response = await self.requests.get(url="/field-value-changes", params=params)
+        response = await self._request("GET", "/field-value-changes", params=params)
         response.raise_for_status()
         return response.json()
 
+    async def iter_field_value_changes(self, params: dict, page_size: int = 500) -> AsyncIterator[dict]:
+        """Iterate over field value changes page by page. See `get_field_value_changes` for the accepted params
+
+        Args:
+            params (dict): Query parameter which must contain `field_id`
+            page_size (int, optional): Number of field value changes fetched per page. Defaults to 500.
+
+        Yields:
+            dict: Field value change
+        """
+        self._validate_field_value_changes_params(params)
+        async for change in self._iter_pages("/field-value-changes", params, "field_value_changes", page_size):
+            yield change
+
     # List related API calls
     async def create_list_entry(self, list_id: int, entity_id: int, creator_id: int = None) -> dict:
         """Create list entry
@@ -228,8 +395,9 @@ class AffinityApi:
         if creator_id is not None:
             data.update({"creator_id": creator_id})
 
-        response = await self.requests.post(f"lists/{list_id}/list-entries", json=data)
+        response = await self._request("POST", f"lists/{list_id}/list-entries", json=data)
         response.raise_for_status()
+        self._invalidate_cached_entities(entity_id)
         return response.json()
 
     async def get_list_entries(self, list_id: int) -> list[dict]:
@@ -241,11 +409,43 @@ class AffinityApi:
         Returns:
             list[dict]: List of list entries
         """
-        response = await self.requests.get(f"/lists/{list_id}/list-entries")
+        response = await self._request("GET", f"/lists/{list_id}/list-entries")
         response.raise_for_status()
         return response.json()
 
+    async def stream_list_entries(self, list_id: int, exclude: Iterable[str] = ()) -> AsyncIterator[dict]:
+        """Stream list entries by list ID, yielding each list entry as it is parsed from the response
+
+        Args:
+            list_id (int): ID of list
+            exclude (Iterable[str], optional): Keys to drop from each list entry while it is parsed, e.g.
+                `("entity",)`. Defaults to ().
+
+        Yields:
+            dict: List entry
+        """
+        async with self._stream_request("GET", f"/lists/{list_id}/list-entries") as response:
+            async for list_entry in JsonArrayStream(response.aiter_bytes(), exclude=exclude):
+                yield list_entry
+
+    async def iter_list_entries(self, list_id: int, page_size: int = 500) -> AsyncIterator[dict]:
+        """Iterate over list entries page by page
+
+        The next page is fetched while the current page is being processed. Closing the iterator early
+        (e.g. with `contextlib.aclosing`) cancels the prefetch so no further pages are requested.
+
+        Args:
+            list_id (int): ID of list
+            page_size (int, optional): Number of list entries fetched per page. Defaults to 500.
+
+        Yields:
+            dict: List entry
+        """
+        async for list_entry in self._iter_pages(f"/lists/{list_id}/list-entries", {}, "list_entries", page_size):
+            yield list_entry
+
     # Opportunity related API calls
+    @_cached_read
     async def get_opportunity_details(self, opportunity_id: int) -> dict:
         """Get opportunity details by ID
 
@@ -255,7 +455,7 @@ class AffinityApi:
         Returns:
             dict: Response with opportunity details
         """
-        response = await self.requests.get(f"/opportunities/{opportunity_id}")
+        response = await self._request("GET", f"/opportunities/{opportunity_id}")
         response.raise_for_status()
         return response.json()
 
@@ -270,9 +470,11 @@ class AffinityApi:
         Returns:
             dict: Response with updated reminder
         """
-        response = await self.requests.put(f"/reminders/{reminder_id}", json=params)
+        response = await self._request("PUT", f"/reminders/{reminder_id}", json=params)
         response.raise_for_status()
-        return response.json()
+        reminder = response.json()
+        self._invalidate_cached_reminder_entities(reminder)
+        return reminder
 
     async def create_reminder(self, params: dict) -> dict:
         """Create reminder
@@ -283,34 +485,231 @@ class AffinityApi:
         Returns:
             dict: Response with created reminder
         """
-        response = await self.requests.post("/reminders", json=params)
+        response = await self._request("POST", "/reminders", json=params)
         response.raise_for_status()
-        return response.json()
+        reminder = response.json()
+        self._invalidate_cached_reminder_entities(reminder)
+        return reminder
 
     # Helper methods
-    async def search_company_by_name_and_domains(self, domains: list[str], name: str = None) -> list[dict]:
+    async def search_company_by_name_and_domains(
+        self, domains: list[str], name: str = None, concurrency: int = None, short_circuit: bool = True
+    ) -> list[dict]:
         """Search company by name and domains
 
         Args:
             name (str): Name of company
             domains (list[str]): List of domain names of company
+            concurrency (int, optional): Maximum number of searches to run at the same time. If not set the
+                searches run one after another. Defaults to None.
+            short_circuit (bool, optional): Only used when `concurrency` is set. Stop waiting for the remaining
+                searches once a company covering every domain in `domains` is found. Defaults to True.
+
+        Raises:
+            ValueError: If concurrency is less than 1
 
         Returns:
-            list[dict]: List of companies found. Results are deduplicated
+            list[dict]: List of companies found. Results are deduplicated and ordered by the name search
+                followed by each domain search in the order given
         """
-        # search affinity based on company name and known domains
-        if name:
-            affinity_company_name_results = await self.search_company(name)
-            affinity_results = affinity_company_name_results["organizations"]
-        else:
-            affinity_results = []
-        for domain in domains:
-            results = await self.search_company(domain)
-            for result in results["organizations"]:
-                affinity_results.append(result)
-
-        affinity_results = self._remove_duplicates(affinity_results)
-        return affinity_results
+        if concurrency is None:
+            # search affinity based on company name and known domains
+            if name:
+                affinity_company_name_results = await self.search_company(name)
+                affinity_results = list(affinity_company_name_results["organizations"])
+            else:
+                affinity_results = []
+            for domain in domains:
+                results = await self.search_company(domain)
+                for result in results["organizations"]:
+                    affinity_results.append(result)
+
+            affinity_results = self._remove_duplicates(affinity_results)
+            return affinity_results
+
+        if concurrency < 1:
+            raise ValueError("Concurrency must be at least 1")
+
+        terms = ([name] if name else []) + list(domains)
+        required_domains = set(domains)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _search(term: str) -> list[dict]:
+            async with semaphore:
+                results = await self.search_company(term)
+            return results["organizations"]
+
+        tasks = [asyncio.ensure_future(_search(term)) for term in terms]
+        task_positions = {task: position for position, task in enumerate(tasks)}
+        results_by_position = {}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    results_by_position[task_positions[task]] = task.result()
+                if short_circuit and required_domains:
+                    covered = any(
+                        required_domains.issubset(result.get("domains") or [])
+                        for task in done
+                        for result in results_by_position[task_positions[task]]
+                    )
+                    if covered:
+                        break
+        finally:
+            for task in pending:
+                task.cancel()
+
+        # merge in search order rather than arrival order so the output is deterministic
+        affinity_results = [
+            result for position in sorted(results_by_position) for result in results_by_position[position]
+        ]
+        return self._remove_duplicates(affinity_results)
+
+    async def bulk_upsert_field_values(
+        self,
+        writes: Iterable[tuple[int, int, str | int, int | None]],
+        entity_type: "AffinityEntityType" = None,
+        concurrency: int = 10,
+        skip_unchanged: bool = True,
+    ) -> list["FieldValueWriteResult"]:
+        """Upsert many field values with bounded concurrency
+
+        Requests go through the client's rate limit scheduler. Failed writes are reported per item instead of
+        stopping the remaining writes.
+
+        Args:
+            writes (Iterable[tuple[int, int, str | int, int | None]]): Tuples of
+                `(field_id, entity_id, value, list_entry_id)`. `list_entry_id` should be None for global fields
+            entity_type (AffinityEntityType, optional): Type of the entities written to, used to look up current
+                values of global fields. Defaults to `AffinityEntityType.ORGANIZATION`.
+            concurrency (int, optional): Maximum number of writes in flight. Defaults to 10.
+            skip_unchanged (bool, optional): Skip writes whose current value already matches. Current values are
+                fetched once per entity or list entry. Defaults to True.
+
+        Raises:
+            ValueError: If concurrency is less than 1
+
+        Returns:
+            list[FieldValueWriteResult]: Result of each write in the order given
+        """
+        if concurrency < 1:
+            raise ValueError("Concurrency must be at least 1")
+
+        entity_param = {
+            AffinityEntityType.PERSON: "person_id",
+            AffinityEntityType.ORGANIZATION: "organization_id",
+            AffinityEntityType.OPPORTUNITY: "opportunity_id",
+        }[entity_type or AffinityEntityType.ORGANIZATION]
+        semaphore = asyncio.Semaphore(concurrency)
+        current_values: dict[tuple[str, int], asyncio.Future] = {}
+
+        async def _get_current_values(param: tuple[str, int]) -> list[dict]:
+            async with semaphore:
+                return await self.get_field_values(param=dict([param]))
+
+        async def _write(field_id: int, entity_id: int, value: str | int, list_entry_id: int | None):
+            result = FieldValueWriteResult(
+                field_id=field_id, entity_id=entity_id, value=value, list_entry_id=list_entry_id
+            )
+            if skip_unchanged:
+                param = ("list_entry_id", list_entry_id) if list_entry_id else (entity_param, entity_id)
+                if param not in current_values:
+                    current_values[param] = asyncio.ensure_future(_get_current_values(param))
+                try:
+                    field_values = await current_values[param]
+                except HTTPError:
+                    # unable to check the current value so write it anyway
+                    field_values = []
+                if any(
+                    field_value["field_id"] == field_id
+                    and field_value.get("list_entry_id") == list_entry_id
+                    and _field_value_matches(field_value["value"], value)
+                    for field_value in field_values
+                ):
+                    result.status = FieldValueWriteStatus.UNCHANGED
+                    return result
+
+            try:
+                async with semaphore:
+                    result.response = await self.upsert_field_value(field_id, entity_id, value, list_entry_id)
+                result.status = FieldValueWriteStatus.WRITTEN
+            except HTTPError as e:
+                result.status = FieldValueWriteStatus.FAILED
+                result.error = str(e)
+                if isinstance(e, HTTPStatusError):
+                    result.status_code = e.response.status_code
+            return result
+
+        return list(await asyncio.gather(*(_write(*write) for write in writes)))
+
+    async def _iter_pages(self, url: str, params: dict, items_key: str, page_size: int) -> AsyncIterator[dict]:
+        """Iterate over the items of a paginated endpoint, prefetching the next page
+
+        Args:
+            url (str): URL of endpoint
+            params (dict): Query params sent with every page
+            items_key (str): Key of the items in a paginated response
+            page_size (int): Number of items per page
+
+        Yields:
+            dict: Item from the current page
+        """
+
+        async def _fetch_page(page_token: str | None) -> tuple[list[dict], str | None]:
+            page_params = {**params, "page_size": page_size}
+            if page_token:
+                page_params["page_token"] = page_token
+            response = await self._request("GET", url, params=page_params)
+            response.raise_for_status()
+            page = response.json()
+            # endpoints which do not paginate return a plain list
+            if isinstance(page, list):
+                return page, None
+            return page[items_key], page.get("next_page_token")
+
+        next_page = asyncio.ensure_future(_fetch_page(None))
+        try:
+            while next_page is not None:
+                items, page_token = await next_page
+                next_page = asyncio.ensure_future(_fetch_page(page_token)) if page_token else None
+                for item in items:
+                    yield item
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+    def _invalidate_cache(self, predicate: Callable[[Hashable], bool]):
+        if self.cache is not None:
+            self.cache.invalidate(predicate)
+
+    def _invalidate_cached_entities(self, *entity_ids: int):
+        # entity IDs are not unique across entity types so details of every type with a matching ID are dropped
+        entity_ids = {entity_id for entity_id in entity_ids if entity_id is not None}
+        self._invalidate_cache(
+            lambda key: key[0] in ("get_company_details", "get_person_details", "get_opportunity_details")
+            and key[1][0] in entity_ids
+        )
+
+    def _invalidate_cached_reminder_entities(self, reminder: dict):
+        entity_keys = ("person", "organization", "opportunity")
+        self._invalidate_cached_entities(
+            *(reminder[entity_key]["id"] for entity_key in entity_keys if reminder.get(entity_key))
+        )
+
+    @staticmethod
+    def _validate_field_values_param(param: dict):
+        if len(param) != 1 or not any(
+            k in param for k in ("organization_id", "list_entry_id", "person_id", "opportunity_id")
+        ):
+            raise ValueError(
+                "Only one of the following keys should be specified: `organization_id`, `list_entry_id`, `person_id` or `opportunity_id`"  # noqa: E501
+            )
+
+    @staticmethod
+    def _validate_field_value_changes_params(params: dict):
+        if "field_id" not in params:
+            raise ValueError("Field ID must be specified")
 
     @staticmethod
     def filter_entries_by_list_id(list_entries: list[dict], list_id: int) -> list[dict]:
@@ -339,17 +738,109 @@ class AffinityApi:
         return next((field_value for field_value in field_values if field_value["field_id"] == field_id), None)
 
     @staticmethod
-    def _remove_duplicates(list_to_dedupe: list[dict]) -> list[dict]:
+    def _remove_duplicates(list_to_dedupe: list[dict], merge: bool = False) -> list[dict]:
         """Remove duplicates from list of dictionaries
 
+        Dictionaries are considered duplicates when they share an Affinity `id`. Dictionaries without an `id`
+        are compared by content.
+
         Args:
             list_to_dedupe (list[dict]): List of dictionaries
+            merge (bool, optional): Fill keys which are missing or None in the first dictionary seen for an `id`
+                from its duplicates. Defaults to False.
 
         Returns:
-            list[dict]: List of dictionaries with duplicates removed
+            list[dict]: List of dictionaries with duplicates removed, in the order they were first seen
         """
-        list_to_dedupe_json_set = {json.dumps(dictionary, sort_keys=True) for dictionary in list_to_dedupe}
-        return [json.loads(t) for t in list_to_dedupe_json_set]
+        deduped = {}
+        merged_keys = set()
+        for dictionary in list_to_dedupe:
+            identity = dictionary.get("id")
+            key = ("id", identity) if identity is not None else ("content", _freeze(dictionary))
+            existing = deduped.get(key)
+            if existing is None:
+                deduped[key] = dictionary
+            elif merge:
+                missing = {k: v for k, v in dictionary.items() if existing.get(k) is None and v is not None}
+                if missing:
+                    # copy before the first merge so the caller's dictionaries are never modified
+                    if key not in merged_keys:
+                        existing = deduped[key] = dict(existing)
+                        merged_keys.add(key)
+                    existing.update(missing)
+        return list(deduped.values())
+
+
+class FieldValueIndex:
+    """Index of field values built once per response for constant time lookups
+
+    Args:
+        field_values (Iterable[dict]): Field values as returned by `AffinityApi.get_field_values`
+    """
+
+    def __init__(self, field_values: Iterable[dict]):
+        self._by_list_entry_and_field: dict[tuple[int | None, int], list[dict]] = {}
+        self._by_entity: dict[int, list[dict]] = {}
+        for field_value in field_values:
+            self._by_list_entry_and_field.setdefault(
+                (field_value.get("list_entry_id"), field_value["field_id"]), []
+            ).append(field_value)
+            self._by_entity.setdefault(field_value.get("entity_id"), []).append(field_value)
+
+    def get(self, field_id: int, list_entry_id: int = None) -> dict | None:
+        """Get the first field value of a field
+
+        Args:
+            field_id (int): ID of field
+            list_entry_id (int, optional): ID of list entry for list specific fields. Defaults to None.
+
+        Returns:
+            dict | None: First field value found or None
+        """
+        field_values = self._by_list_entry_and_field.get((list_entry_id, field_id))
+        return field_values[0] if field_values else None
+
+    def get_all(self, field_id: int, list_entry_id: int = None) -> list[dict]:
+        """Get every field value of a field, e.g. for fields allowing multiple values
+
+        Args:
+            field_id (int): ID of field
+            list_entry_id (int, optional): ID of list entry for list specific fields. Defaults to None.
+
+        Returns:
+            list[dict]: Field values found
+        """
+        return list(self._by_list_entry_and_field.get((list_entry_id, field_id), []))
+
+    def by_entity(self, entity_id: int) -> list[dict]:
+        """Get every field value of an entity
+
+        Args:
+            entity_id (int): ID of entity
+
+        Returns:
+            list[dict]: Field values found
+        """
+        return list(self._by_entity.get(entity_id, []))
+
+
+def _freeze(value: Any) -> Hashable:
+    """Convert a JSON value or call argument into a hashable equivalent so it can be used as a dictionary key"""
+    if isinstance(value, dict):
+        return frozenset((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    return value
+
+
+def _field_value_matches(current_value: Any, value: str | int) -> bool:
+    """Check if a current field value matches a value to write. Dropdown values are returned as a dict but
+    written by ID"""
+    if isinstance(current_value, dict):
+        return current_value.get("id") == value or current_value.get("text") == value
+    return current_value == value
 
 
 class AffinityReminderResetType(Enum):
@@ -366,3 +857,23 @@ class AffinityEntityType(Enum):
     PERSON = 0
     ORGANIZATION = 1
     OPPORTUNITY = 8
+
+
+class FieldValueWriteStatus(Enum):
+    """Enum for the outcome of a bulk field value write"""
+
+    PENDING = "pending"
+    WRITTEN = "written"
+    UNCHANGED = "unchanged"
+    FAILED = "failed"
+
+
+class FieldValueWriteResult(BaseModel):
+    field_id: int
+    entity_id: int
+    value: str | int
+    list_entry_id: int | None = None
+    status: FieldValueWriteStatus = FieldValueWriteStatus.PENDING
+    response: dict | None = None
+    error: str | None = None
+    status_code: int | None = None
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from google.cloud.datastore import Client
+
+T = TypeVar("T")
+
+
+class AsyncDatastore:
+    """Runs blocking Datastore calls on a bounded thread pool so they do not block the event loop
+
+    All calls share one Datastore client, which is created in a worker thread on first use because creating it
+    loads credentials. Cancelling a call which has not started yet removes it from the pool's queue. A call
+    which is already running cannot be interrupted and runs to completion in the background.
+
+    Args:
+        db_client (Client, optional): Datastore client to share. Defaults to a client created on first use.
+        max_workers (int, optional): Maximum number of Datastore calls running at once. Defaults to 16.
+        project (str, optional): Google Cloud project of a client created on first use. Defaults to the
+            environment's project.
+    """
+
+    _shared_datastores: dict[str | None, "AsyncDatastore"] = {}
+
+    def __init__(self, db_client: Client = None, max_workers: int = 16, project: str = None):
+        if max_workers < 1:
+            raise ValueError("Max workers must be at least 1")
+
+        self._db_client = db_client
+        self.project = project
+        self._client_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="datastore")
+
+    @classmethod
+    def shared(cls, project: str = None) -> "AsyncDatastore":
+        """Get a process-wide instance so callers share a client and thread pool
+
+        Args:
+            project (str, optional): Google Cloud project of the client. Defaults to the environment's project.
+
+        Returns:
+            AsyncDatastore: Shared instance
+        """
+        datastore = cls._shared_datastores.get(project)
+        if datastore is None:
+            datastore = cls(project=project)
+            cls._shared_datastores[project] = datastore
+        return datastore
+
+    @classmethod
+    def close_shared(cls):
+        """Shut down the thread pools of all shared instances"""
+        datastores = list(cls._shared_datastores.values())
+        cls._shared_datastores.clear()
+        for datastore in datastores:
+            datastore.close()
+
+    @property
+    def db_client(self) -> Client:
+        """Shared Datastore client. Creating it blocks, so only access it from worker threads"""
+        with self._client_lock:
+            if self._db_client is None:
+                self._db_client = Client(project=self.project)
+            return self._db_client
+
+    async def run(self, function: Callable[[Client], T]) -> T:
+        """Run a blocking function with the shared client on the thread pool
+
+        Args:
+            function (Callable[[Client], T]): Function making Datastore calls with the client passed to it
+
+        Returns:
+            T: Result of the function
+        """
+        return await asyncio.wrap_future(self.executor.submit(lambda: function(self.db_client)))
+
+    def close(self):
+        """Shut down the thread pool, dropping calls which have not started"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
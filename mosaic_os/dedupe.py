@@ -0,0 +1,201 @@
+import heapq
+from array import array
+from datetime import datetime
+from typing import Any, Iterable, Iterator, Mapping
+
+from google.cloud.datastore import Client, Entity
+from google.cloud.datastore.query import PropertyFilter
+from pydantic import BaseModel
+
+# Company properties which identify a company, any two current companies sharing a value are duplicates
+IDENTIFYING_PROPERTIES = ("crm_id", "sp_id", "crunchbase_id")
+
+
+class MergePlan(BaseModel):
+    """Companies to merge into one
+
+    Applying the plan sets `merged_from` of the target to the source ids and `merged_to` of each source to the
+    target id.
+    """
+
+    target_id: int
+    source_ids: list[int]
+
+
+class CompanyDuplicateFinder:
+    """Groups duplicate companies with union-find over shared domains and identifying ids
+
+    Companies are added one at a time so they can be streamed from Datastore and are numbered in the order they
+    are added. Only compact arrays are kept: the master id, creation time, parent and set size of each company,
+    and a pair of the hash of each domain or id seen with the company it was seen on. Pairs are buffered and
+    every `chunk_size` pairs the buffer is sorted by hash, companies sharing a hash are merged and one pair per
+    hash is kept in a sorted run. Runs are merged with each other the same way, so memory stays at about 32
+    bytes per company and 16 bytes per distinct domain or id, plus a list of up to `chunk_size` indices while a
+    buffer is sorted. Sets are merged by size with path halving, so finding duplicates is close to
+    `O(n log n)`.
+
+    Args:
+        identifying_properties (Iterable[str], optional): Properties other than `domains` which identify a
+            company. Defaults to `crm_id`, `sp_id` and `crunchbase_id`.
+        chunk_size (int, optional): Pairs buffered before they are sorted into a run. Defaults to 100000.
+        max_runs (int, optional): Sorted runs kept before they are merged into one. Defaults to 8.
+    """
+
+    def __init__(
+        self,
+        identifying_properties: Iterable[str] = IDENTIFYING_PROPERTIES,
+        chunk_size: int = 100_000,
+        max_runs: int = 8,
+    ):
+        self.identifying_properties = tuple(identifying_properties)
+        self.chunk_size = chunk_size
+        self.max_runs = max_runs
+        self._company_ids = array("q")
+        self._created_at = array("d")
+        self._parents = array("q")
+        self._sizes = array("q")
+        self._pending_hashes = array("q")
+        self._pending_positions = array("q")
+        self._runs: list[tuple[array, array]] = []
+
+    def __len__(self) -> int:
+        return len(self._company_ids)
+
+    def add(self, company: Entity | Mapping[str, Any]):
+        """Add a company, merging it with every company added before which shares a domain or id
+
+        Args:
+            company (Entity | Mapping[str, Any]): `Company` entity, or mapping with an `id` key
+        """
+        company_id = company.key.id if isinstance(company, Entity) else company["id"]
+        created_at = company.get("created_at")
+        position = len(self._company_ids)
+        self._company_ids.append(company_id)
+        self._created_at.append(created_at.timestamp() if isinstance(created_at, datetime) else float("inf"))
+        self._parents.append(position)
+        self._sizes.append(1)
+
+        for key in self._keys(company):
+            self._pending_hashes.append(key)
+            self._pending_positions.append(position)
+        if len(self._pending_hashes) >= self.chunk_size:
+            self._flush()
+
+    def add_all(self, companies: Iterable[Entity | Mapping[str, Any]]):
+        for company in companies:
+            self.add(company)
+
+    def merge_plans(self) -> Iterator[MergePlan]:
+        """Get a merge plan for every group of duplicates
+
+        The oldest company of a group is the target, companies without a creation time count as newest and ties
+        are broken by the order companies were added.
+
+        Yields:
+            MergePlan: Merge plan of each group of two or more companies
+        """
+        self._flush()
+        self._merge_runs()
+        groups: dict[int, list[int]] = {}
+        for position in range(len(self._parents)):
+            root = self._find(position)
+            if self._sizes[root] > 1:
+                groups.setdefault(root, []).append(position)
+
+        for positions in groups.values():
+            target = min(positions, key=lambda position: (self._created_at[position], position))
+            yield MergePlan(
+                target_id=self._company_ids[target],
+                source_ids=[self._company_ids[position] for position in positions if position != target],
+            )
+
+    def _keys(self, company: Entity | Mapping[str, Any]) -> set[int]:
+        # hashes keep the pairs small, a 64-bit collision between real values is vanishingly unlikely
+        keys = {hash(("domain", domain.lower())) for domain in company.get("domains") or () if domain}
+        for property_name in self.identifying_properties:
+            value = company.get(property_name)
+            if value:
+                keys.add(hash((property_name, str(value))))
+        return keys
+
+    def _flush(self):
+        hashes, positions = self._pending_hashes, self._pending_positions
+        if not hashes:
+            return
+        order = sorted(range(len(hashes)), key=hashes.__getitem__)
+        self._runs.append(self._collapse((hashes[i], positions[i]) for i in order))
+        self._pending_hashes = array("q")
+        self._pending_positions = array("q")
+        if len(self._runs) > self.max_runs:
+            self._merge_runs()
+
+    def _merge_runs(self):
+        if len(self._runs) > 1:
+            runs, self._runs = self._runs, []
+            self._runs.append(self._collapse(heapq.merge(*(zip(*run) for run in runs))))
+
+    def _collapse(self, pairs: Iterable[tuple[int, int]]) -> tuple[array, array]:
+        # pairs are sorted by hash, companies sharing a hash are merged and the first of them represents it
+        hashes, positions = array("q"), array("q")
+        for key, position in pairs:
+            if hashes and hashes[-1] == key:
+                self._union(positions[-1], position)
+            else:
+                hashes.append(key)
+                positions.append(position)
+        return hashes, positions
+
+    def _find(self, position: int) -> int:
+        parents = self._parents
+        while parents[position] != position:
+            parents[position] = parents[parents[position]]
+            position = parents[position]
+        return position
+
+    def _union(self, a: int, b: int):
+        root_a, root_b = self._find(a), self._find(b)
+        if root_a == root_b:
+            return
+        if self._sizes[root_a] < self._sizes[root_b]:
+            root_a, root_b = root_b, root_a
+        self._parents[root_b] = root_a
+        self._sizes[root_a] += self._sizes[root_b]
+
+
+def iter_current_companies(db_client: Client, batch_size: int = 1000) -> Iterator[Entity]:
+    """Stream current `Company` entities from Datastore a page at a time
+
+    Args:
+        db_client (Client): Datastore client
+        batch_size (int, optional): Entities fetched per request. Defaults to 1000.
+
+    Yields:
+        Entity: Current company
+    """
+    query = db_client.query(kind="Company")
+    query.add_filter(filter=PropertyFilter("current", "=", True))
+    cursor = None
+    while True:
+        companies = query.fetch(start_cursor=cursor, limit=batch_size)
+        fetched = 0
+        for company in companies:
+            fetched += 1
+            yield company
+        if fetched < batch_size or companies.next_page_token is None:
+            return
+        cursor = companies.next_page_token
+
+
+def plan_company_merges(db_client: Client, batch_size: int = 1000) -> list[MergePlan]:
+    """Find duplicate current companies in Datastore and plan how to merge them
+
+    Args:
+        db_client (Client): Datastore client
+        batch_size (int, optional): Entities fetched per request. Defaults to 1000.
+
+    Returns:
+        list[MergePlan]: Merge plan of each group of duplicates
+    """
+    finder = CompanyDuplicateFinder()
+    finder.add_all(iter_current_companies(db_client, batch_size=batch_size))
+    return list(finder.merge_plans())
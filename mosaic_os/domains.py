@@ -0,0 +1,35 @@
+from functools import lru_cache
+from typing import Iterable
+
+from tldextract import TLDExtract
+
+# Uses the public suffix list snapshot bundled with tldextract so domains are normalised without network or
+# disk access. Private suffixes such as blogspot.com are not treated as suffixes, matching `tldextract.extract`.
+_extract = TLDExtract(suffix_list_urls=(), cache_dir=None)
+
+
+@lru_cache(maxsize=100_000)
+def normalize_domain(domain: str) -> str:
+    """Get the registered domain of a domain name or URL
+
+    Results are cached, so normalising the same domain again is a dictionary lookup.
+
+    Args:
+        domain (str): Domain name or URL, e.g. `https://www.example.co.uk/about`
+
+    Returns:
+        str: Lowercase registered domain, e.g. `example.co.uk`. Empty if the domain has no public suffix
+    """
+    return _extract(domain.strip().lower()).registered_domain
+
+
+def normalize_domains(domains: Iterable[str]) -> dict[str, str]:
+    """Get the registered domains of many domain names or URLs
+
+    Args:
+        domains (Iterable[str]): Domain names or URLs
+
+    Returns:
+        dict[str, str]: Registered domain of each distinct domain passed, in the order first seen
+    """
+    return {domain: normalize_domain(domain) for domain in domains}
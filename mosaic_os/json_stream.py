@@ -0,0 +1,217 @@
+import json
+import re
+from typing import Any, AsyncIterable, AsyncIterator, Iterable
+
+_WHITESPACE = b" \t\r\n"
+# characters that can change nesting depth outside of a string
+_STRUCTURAL = re.compile(rb'["\[\]{}]')
+# characters that can end a string
+_STRING_SPECIAL = re.compile(rb'["\\]')
+# characters that end a number, true, false or null
+_SCALAR_END = re.compile(rb"[,\]}\s]")
+
+
+class _JsonScanner:
+    """Scans JSON values out of a stream of byte chunks without decoding values which are skipped
+
+    Consumed bytes are dropped from the buffer so memory is bounded by the largest value captured rather than
+    the size of the whole body.
+    """
+
+    def __init__(self, chunks: AsyncIterable[bytes]):
+        self._chunks = chunks.__aiter__()
+        self._buffer = bytearray()
+        self._position = 0
+
+    async def _fill(self) -> bool:
+        del self._buffer[: self._position]
+        self._position = 0
+        async for chunk in self._chunks:
+            if chunk:
+                self._buffer += chunk
+                return True
+        return False
+
+    async def peek(self) -> int | None:
+        """Next byte which is not whitespace, or None at the end of the stream"""
+        while True:
+            while self._position < len(self._buffer) and self._buffer[self._position] in _WHITESPACE:
+                self._position += 1
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not await self._fill():
+                return None
+
+    def advance(self):
+        """Consume the byte returned by `peek`"""
+        self._position += 1
+
+    async def expect(self, character: bytes):
+        if await self.peek() != character[0]:
+            raise ValueError(f"Expected {character.decode()} in JSON stream")
+        self._position += 1
+
+    async def value(self, capture: bool = True) -> bytes | None:
+        """Scan the next value
+
+        Args:
+            capture (bool, optional): Return the raw bytes of the value. When False the value is skipped and its
+                bytes are discarded as they are scanned. Defaults to True.
+
+        Returns:
+            bytes | None: Raw bytes of the value if captured
+        """
+        first = await self.peek()
+        if first is None:
+            raise ValueError("Unexpected end of JSON stream")
+
+        captured = bytearray()
+        # scan state is (scalar, depth, in_string, escaped)
+        state = (first not in b'{["', 0, False, False)
+        while True:
+            end = self._scan(*state)
+            if isinstance(end, int):
+                if capture:
+                    captured += self._buffer[self._position : end]
+                self._position = end
+                return bytes(captured) if capture else None
+
+            state = end
+            if capture:
+                captured += self._buffer[self._position :]
+            self._position = len(self._buffer)
+            if not await self._fill():
+                if state[0]:
+                    return bytes(captured) if capture else None
+                raise ValueError("Unexpected end of JSON stream")
+
+    def _scan(
+        self, scalar: bool, depth: int, in_string: bool, escaped: bool
+    ) -> int | tuple[bool, int, bool, bool]:
+        """Find the end of the value being scanned in the buffer
+
+        Returns:
+            int | tuple[bool, int, bool, bool]: Position after the value, or the state to resume scanning with
+                once more bytes are read
+        """
+        buffer = self._buffer
+        if scalar:
+            match = _SCALAR_END.search(buffer, self._position)
+            return match.start() if match else (scalar, depth, in_string, escaped)
+
+        position = self._position
+        while True:
+            if escaped:
+                if position >= len(buffer):
+                    return scalar, depth, in_string, escaped
+                position += 1
+                escaped = False
+            if in_string:
+                match = _STRING_SPECIAL.search(buffer, position)
+                if match is None:
+                    return scalar, depth, in_string, escaped
+                position = match.end()
+                if match.group() == b"\\":
+                    escaped = True
+                    continue
+                in_string = False
+                if depth == 0:
+                    return position
+                continue
+
+            match = _STRUCTURAL.search(buffer, position)
+            if match is None:
+                return scalar, depth, in_string, escaped
+            position = match.end()
+            character = match.group()
+            if character == b'"':
+                in_string = True
+            elif character in b"[{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return position
+
+    async def member_key(self) -> str | None:
+        """Read the key of the next object member, or None at the end of the object"""
+        character = await self.peek()
+        if character == ord(","):
+            self.advance()
+            character = await self.peek()
+        if character == ord("}"):
+            self.advance()
+            return None
+        key = json.loads(await self.value())
+        await self.expect(b":")
+        return key
+
+    async def decode(self, exclude: frozenset[str]) -> Any:
+        """Decode the next value, dropping excluded keys of an object without decoding them"""
+        if not exclude or await self.peek() != ord("{"):
+            return json.loads(await self.value())
+
+        await self.expect(b"{")
+        decoded = {}
+        while (key := await self.member_key()) is not None:
+            if key in exclude:
+                await self.value(capture=False)
+            else:
+                decoded[key] = json.loads(await self.value())
+        return decoded
+
+
+class JsonArrayStream:
+    """Yields the items of a JSON array as they are parsed from a stream of byte chunks
+
+    The array can be the whole body, or the value of `items_key` in a top-level object. Other members of a
+    top-level object are decoded into `rest`, which is complete once iteration finishes.
+
+    Args:
+        chunks (AsyncIterable[bytes]): Body of the response, e.g. `Response.aiter_bytes()`
+        items_key (str, optional): Key of the array in a top-level object. Defaults to None.
+        exclude (Iterable[str], optional): Keys dropped from each item without being decoded. Defaults to ().
+    """
+
+    def __init__(self, chunks: AsyncIterable[bytes], items_key: str = None, exclude: Iterable[str] = ()):
+        self._scanner = _JsonScanner(chunks)
+        self.items_key = items_key
+        self.exclude = frozenset(exclude)
+        self.rest: dict[str, Any] = {}
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        scanner = self._scanner
+        if self.items_key is not None:
+            await scanner.expect(b"{")
+            while (key := await scanner.member_key()) != self.items_key:
+                if key is None:
+                    return
+                self.rest[key] = json.loads(await scanner.value())
+
+        await scanner.expect(b"[")
+        while True:
+            character = await scanner.peek()
+            if character == ord(","):
+                scanner.advance()
+            elif character == ord("]"):
+                scanner.advance()
+                break
+            else:
+                yield await scanner.decode(self.exclude)
+
+        if self.items_key is not None:
+            while (key := await scanner.member_key()) is not None:
+                self.rest[key] = json.loads(await scanner.value())
+
+
+async def decode_json_stream(chunks: AsyncIterable[bytes], exclude: Iterable[str] = ()) -> Any:
+    """Decode a JSON body from a stream of byte chunks, dropping excluded top-level keys without decoding them
+
+    Args:
+        chunks (AsyncIterable[bytes]): Body of the response, e.g. `Response.aiter_bytes()`
+        exclude (Iterable[str], optional): Top-level keys to drop. Defaults to ().
+
+    Returns:
+        Any: Decoded JSON value
+    """
+    return await _JsonScanner(chunks).decode(frozenset(exclude))
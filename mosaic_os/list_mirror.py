@@ -0,0 +1,225 @@
+import asyncio
+import json
+import sqlite3
+from datetime import datetime
+from typing import Any
+
+from mosaic_os.crm import AffinityApi
+from mosaic_os.utils import datetime_now
+
+# Affinity field value change action types
+FIELD_VALUE_CREATED = 0
+FIELD_VALUE_DELETED = 1
+FIELD_VALUE_UPDATED = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS list_entries (
+    id INTEGER PRIMARY KEY,
+    entity_id INTEGER,
+    created_at TEXT,
+    list_entry TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS field_values (
+    list_entry_id INTEGER NOT NULL,
+    field_id INTEGER NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS field_values_list_entry ON field_values (list_entry_id, field_id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class AffinityListMirror:
+    """Local SQLite mirror of an Affinity list and a subset of its fields
+
+    The first `sync` takes a full snapshot of the list. Later syncs only apply field value changes made since
+    the stored watermark, so restarting a job does not refetch the whole list. Field value changes do not report
+    removed list entries, call `snapshot` periodically to drop them.
+
+    Args:
+        affinity_client (AffinityApi): Affinity client
+        list_id (int): ID of list to mirror
+        field_ids (list[int]): IDs of the list fields to mirror
+        db_path (str): Path of the SQLite database. Use `:memory:` for a mirror which is not persisted
+        concurrency (int, optional): Maximum number of field value requests in flight during a snapshot.
+            Defaults to 10.
+    """
+
+    def __init__(
+        self, affinity_client: AffinityApi, list_id: int, field_ids: list[int], db_path: str, concurrency: int = 10
+    ):
+        self.affinity_client = affinity_client
+        self.list_id = list_id
+        self.field_ids = list(field_ids)
+        self.concurrency = concurrency
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript(_SCHEMA)
+
+    @classmethod
+    def live_pipeline(
+        cls, affinity_client: AffinityApi, affinity_config: dict[str, Any], db_path: str, **kwargs
+    ) -> "AffinityListMirror":
+        """Mirror of the Live Pipeline list with its status, priority and owner fields
+
+        Args:
+            affinity_client (AffinityApi): Affinity client
+            affinity_config (dict[str, Any]): Affinity list and field IDs
+            db_path (str): Path of the SQLite database
+
+        Returns:
+            AffinityListMirror: Live Pipeline list mirror
+        """
+        return cls(
+            affinity_client,
+            list_id=affinity_config["lp_list_id"],
+            field_ids=[
+                affinity_config["lp_status_field_id"],
+                affinity_config["lp_priority_field_id"],
+                affinity_config["lp_owner_field_id"],
+            ],
+            db_path=db_path,
+            **kwargs,
+        )
+
+    @property
+    def watermark(self) -> datetime | None:
+        """Time up to which field value changes have been applied"""
+        row = self.db.execute("SELECT value FROM sync_state WHERE key = 'watermark'").fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def close(self):
+        self.db.close()
+
+    async def sync(self) -> int:
+        """Bring the mirror up to date, taking a snapshot if the mirror is empty
+
+        Returns:
+            int: Number of list entries written by a snapshot or field value changes applied
+        """
+        if self.watermark is None:
+            return await self.snapshot()
+        return await self.apply_changes()
+
+    async def snapshot(self) -> int:
+        """Replace the mirror with a full snapshot of the list
+
+        Returns:
+            int: Number of list entries in the list
+        """
+        # changes made while the snapshot is taken are applied again by the next sync
+        started_at = datetime_now()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def _get_entry_field_values(list_entry: dict) -> list[tuple[int, int, str]]:
+            async with semaphore:
+                field_values = await self.affinity_client.get_field_values(param={"list_entry_id": list_entry["id"]})
+            return [
+                (list_entry["id"], field_value["field_id"], _dump_value(field_value["value"]))
+                for field_value in field_values
+                if field_value["field_id"] in self.field_ids
+            ]
+
+        list_entries = [list_entry async for list_entry in self.affinity_client.iter_list_entries(self.list_id)]
+        field_values = await asyncio.gather(*(_get_entry_field_values(list_entry) for list_entry in list_entries))
+
+        with self.db:
+            self.db.execute("DELETE FROM list_entries")
+            self.db.execute("DELETE FROM field_values")
+            self.db.executemany(
+                "INSERT INTO list_entries (id, entity_id, created_at, list_entry) VALUES (?, ?, ?, ?)",
+                [_list_entry_row(list_entry) for list_entry in list_entries],
+            )
+            self.db.executemany(
+                "INSERT INTO field_values (list_entry_id, field_id, value) VALUES (?, ?, ?)",
+                [row for rows in field_values for row in rows],
+            )
+            self._set_watermark(started_at)
+        return len(list_entries)
+
+    async def apply_changes(self) -> int:
+        """Apply field value changes made since the watermark
+
+        Returns:
+            int: Number of field value changes applied
+        """
+        watermark = self.watermark
+        if watermark is None:
+            raise ValueError("Mirror has no watermark, take a snapshot first")
+
+        changes = []
+        for field_id in self.field_ids:
+            async for change in self.affinity_client.iter_field_value_changes(params={"field_id": field_id}):
+                list_entry = change.get("list_entry") or {}
+                if list_entry.get("list_id", self.list_id) != self.list_id:
+                    continue
+                if datetime.fromisoformat(change["changed_at"]) > watermark:
+                    changes.append(change)
+        changes.sort(key=lambda change: datetime.fromisoformat(change["changed_at"]))
+
+        with self.db:
+            for change in changes:
+                self._apply_change(change)
+            if changes:
+                self._set_watermark(datetime.fromisoformat(changes[-1]["changed_at"]))
+        return len(changes)
+
+    def entries(self) -> list[dict]:
+        """Get the mirrored list entries
+
+        Returns:
+            list[dict]: List entries with a `field_values` key mapping field ID to the list of its values
+        """
+        list_entries = {}
+        for list_entry_id, list_entry in self.db.execute("SELECT id, list_entry FROM list_entries ORDER BY id"):
+            list_entries[list_entry_id] = {**json.loads(list_entry), "field_values": {}}
+        for list_entry_id, field_id, value in self.db.execute(
+            "SELECT list_entry_id, field_id, value FROM field_values ORDER BY rowid"
+        ):
+            if list_entry_id in list_entries:
+                list_entries[list_entry_id]["field_values"].setdefault(field_id, []).append(json.loads(value))
+        return list(list_entries.values())
+
+    def _apply_change(self, change: dict):
+        list_entry_id = change.get("list_entry_id") or (change.get("list_entry") or {}).get("id")
+        if list_entry_id is None:
+            return
+        if change.get("list_entry"):
+            self.db.execute(
+                "INSERT OR IGNORE INTO list_entries (id, entity_id, created_at, list_entry) VALUES (?, ?, ?, ?)",
+                _list_entry_row(change["list_entry"]),
+            )
+
+        field_id = change["field_id"]
+        value = _dump_value(change["value"])
+        if change["action_type"] == FIELD_VALUE_UPDATED:
+            self.db.execute(
+                "DELETE FROM field_values WHERE list_entry_id = ? AND field_id = ?", (list_entry_id, field_id)
+            )
+        if change["action_type"] == FIELD_VALUE_DELETED:
+            self.db.execute(
+                "DELETE FROM field_values WHERE list_entry_id = ? AND field_id = ? AND value = ?",
+                (list_entry_id, field_id, value),
+            )
+        else:
+            # changes made while a snapshot was taken may already be in the mirror
+            self.db.execute(
+                "INSERT INTO field_values (list_entry_id, field_id, value) SELECT ?, ?, ? WHERE NOT EXISTS "
+                "(SELECT 1 FROM field_values WHERE list_entry_id = ? AND field_id = ? AND value = ?)",
+                (list_entry_id, field_id, value) * 2,
+            )
+
+    def _set_watermark(self, watermark: datetime):
+        self.db.execute(
+            "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('watermark', ?)", (watermark.isoformat(),)
+        )
+
+
+def _list_entry_row(list_entry: dict) -> tuple[int, int, str, str]:
+    return list_entry["id"], list_entry.get("entity_id"), list_entry.get("created_at"), json.dumps(list_entry)
+
+
+def _dump_value(value: Any) -> str:
+    return json.dumps(value, sort_keys=True)
@@ -0,0 +1,137 @@
+import re
+from typing import Iterable
+
+from pydantic import BaseModel
+
+# Words dropped from company names before they are compared, e.g. "Acme Inc." and "ACME Limited" both become
+# "acme"
+_LEGAL_SUFFIXES = frozenset(
+    "inc incorporated llc llp ltd limited corp corporation co company gmbh sa sas bv ag plc pty srl oy ab as".split()
+)
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+DOMAIN_WEIGHT = 0.8
+NAME_WEIGHT = 0.2
+
+
+class CandidateMatch(BaseModel):
+    candidate: dict
+    score: float
+    domain_score: float
+    name_score: float | None
+
+
+def normalize_company_name(name: str | None) -> frozenset[str]:
+    """Split a company name into lowercase words without punctuation or legal suffixes
+
+    Args:
+        name (str | None): Company name
+
+    Returns:
+        frozenset[str]: Words of the name
+    """
+    if not name:
+        return frozenset()
+    words = _NON_WORD.sub(" ", name.lower()).split()
+    significant_words = frozenset(word for word in words if word not in _LEGAL_SUFFIXES)
+    # keep names made only of suffixes, such as "Company", comparable
+    return significant_words or frozenset(words)
+
+
+class CandidateIndex:
+    """Ranks CRM search results as matches for a company known by its domains and name
+
+    Candidates are indexed by each of their domains, so only candidates sharing a domain with the company are
+    scored. The score of a candidate is
+
+        score = 0.8 * domain_score + 0.2 * name_score
+
+    where `domain_score` is the share of the company's known domains the candidate has and `name_score` is the
+    Jaccard similarity of the normalised words of both names. When the company's name is not known the score
+    is the domain score alone. The score is in [0, 1] and is used as the confidence of a match: 1 means every
+    known domain and the name agree and a candidate with half of the known domains and the same name scores 0.6.
+
+    Ties are broken by preferring candidates with fewer domains the company is not known by, then by the order
+    of the candidates, which is the order the search returned them in.
+
+    Args:
+        candidates (Iterable[dict]): Organizations with `domains`, `domain` and `name` keys
+    """
+
+    def __init__(self, candidates: Iterable[dict]):
+        self.candidates = list(candidates)
+        self._by_domain: dict[str, list[int]] = {}
+        by_domain = self._by_domain
+        for position, candidate in enumerate(self.candidates):
+            for domain in candidate.get("domains") or ():
+                by_domain.setdefault(domain.lower(), []).append(position)
+            domain = candidate.get("domain")
+            if domain:
+                positions = by_domain.setdefault(domain.lower(), [])
+                if not positions or positions[-1] != position:
+                    positions.append(position)
+
+    def rank(self, domains: Iterable[str], name: str = None) -> list[CandidateMatch]:
+        """Score candidates sharing a domain with a company
+
+        Args:
+            domains (Iterable[str]): Registered domains the company is known by
+            name (str, optional): Name of the company. Defaults to None.
+
+        Returns:
+            list[CandidateMatch]: Scored candidates, best match first
+        """
+        return [self._match(scored) for scored in sorted(self._score(domains, name))]
+
+    def best_match(self, domains: Iterable[str], name: str = None, min_score: float = 0.5) -> CandidateMatch | None:
+        """Get the best scoring candidate for a company
+
+        Args:
+            domains (Iterable[str]): Registered domains the company is known by
+            name (str, optional): Name of the company. Defaults to None.
+            min_score (float, optional): Lowest score accepted as a match. The default accepts a candidate with
+                every known domain, or half of them and a similar name. Defaults to 0.5.
+
+        Returns:
+            CandidateMatch | None: Best match, or None if no candidate scores at least `min_score`
+        """
+        best = min(self._score(domains, name), default=None)
+        if best is None or -best[0] < min_score:
+            return None
+        return self._match(best)
+
+    def _score(self, domains: Iterable[str], name: str = None) -> list[tuple[float, int, int, float, float | None]]:
+        known_domains = frozenset(domain.lower() for domain in domains if domain)
+        known_name = normalize_company_name(name)
+        # only candidates sharing a domain are scored, so normalising their domains and names is done here rather
+        # than for every candidate when the index is built
+        positions = {position for domain in known_domains for position in self._by_domain.get(domain, ())}
+
+        scored = []
+        for position in positions:
+            candidate = self.candidates[position]
+            candidate_domains = frozenset(
+                domain.lower() for domain in (*(candidate.get("domains") or ()), candidate.get("domain")) if domain
+            )
+            domain_score = len(known_domains & candidate_domains) / len(known_domains)
+            if known_name:
+                name_score = _jaccard(known_name, normalize_company_name(candidate.get("name")))
+                score = DOMAIN_WEIGHT * domain_score + NAME_WEIGHT * name_score
+            else:
+                name_score = None
+                score = domain_score
+            # negated score and unknown domain count so the natural tuple order puts the best match first
+            scored.append((-score, len(candidate_domains - known_domains), position, domain_score, name_score))
+        return scored
+
+    def _match(self, scored: tuple[float, int, int, float, float | None]) -> CandidateMatch:
+        negated_score, _, position, domain_score, name_score = scored
+        return CandidateMatch(
+            candidate=self.candidates[position], score=-negated_score, domain_score=domain_score, name_score=name_score
+        )
+
+
+def _jaccard(a: frozenset[str], b: frozenset[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
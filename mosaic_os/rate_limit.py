@@ -0,0 +1,260 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable
+
+from httpx import Headers, Response
+from pydantic import BaseModel
+
+from mosaic_os.utils import datetime_now
+
+# Status codes worth retrying. Server errors are only retried for idempotent requests
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class TokenBucket:
+    """Async token bucket used to pace requests
+
+    Args:
+        rate (float): Tokens added per second
+        capacity (float): Maximum number of tokens, i.e. the largest burst allowed
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        if rate <= 0 or capacity < 1:
+            raise ValueError("Rate must be positive and capacity must be at least 1")
+
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock: asyncio.Lock | None = None
+        self._lock_loop: asyncio.AbstractEventLoop | None = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self) -> float:
+        """Wait for a token
+
+        Returns:
+            float: Seconds spent waiting for the token
+        """
+        started_at = time.monotonic()
+        async with self._loop_lock():
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+        return time.monotonic() - started_at
+
+    def _loop_lock(self) -> asyncio.Lock:
+        # asyncio locks are bound to one event loop, shared buckets get a new lock when used from another loop
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+
+class RateLimitMetrics(BaseModel):
+    queue_depth: int
+    in_flight: int
+    requests: int
+    retries: int
+    throttled: int
+    total_wait_seconds: float
+    max_wait_seconds: float
+    minute_remaining: int | None
+    month_remaining: int | None
+
+
+class RateLimitScheduler:
+    """Schedules requests against Affinity's per-minute and per-month rate limits
+
+    Requests are paced with a token bucket, remaining quota is tracked from the rate limit response headers
+    and throttled or failed requests are retried with jittered exponential backoff which honours `Retry-After`.
+    A scheduler can be shared between `AffinityApi` clients that use the same API key, `shared` returns a
+    process-wide scheduler per API key.
+
+    Args:
+        requests_per_minute (int, optional): Requests allowed per minute. Defaults to 900.
+        burst (int, optional): Maximum number of requests sent back to back. Defaults to 30.
+        max_retries (int, optional): Maximum retries per request. Defaults to 5.
+        backoff_base (float, optional): Base backoff in seconds. Defaults to 0.5.
+        backoff_max (float, optional): Maximum backoff in seconds. Defaults to 30.
+    """
+
+    minute_remaining_header = "X-Ratelimit-Limit-User-Remaining"
+    minute_reset_header = "X-Ratelimit-Limit-User-Reset"
+    month_remaining_header = "X-Ratelimit-Limit-Org-Remaining"
+
+    _shared_schedulers: dict[str, "RateLimitScheduler"] = {}
+
+    def __init__(
+        self,
+        requests_per_minute: int = 900,
+        burst: int = 30,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30,
+    ):
+        self.bucket = TokenBucket(rate=requests_per_minute / 60, capacity=burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.minute_remaining: int | None = None
+        self.month_remaining: int | None = None
+        self._paused_until = 0.0
+        self._queue_depth = 0
+        self._in_flight = 0
+        self._requests = 0
+        self._retries = 0
+        self._throttled = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    @classmethod
+    def shared(cls, api_key: str) -> "RateLimitScheduler":
+        """Get the process-wide scheduler of an API key so every client using the key shares its rate limit
+
+        Args:
+            api_key (str): Affinity API key
+
+        Returns:
+            RateLimitScheduler: Shared scheduler with default settings
+        """
+        scheduler = cls._shared_schedulers.get(api_key)
+        if scheduler is None:
+            scheduler = cls._shared_schedulers[api_key] = cls()
+        return scheduler
+
+    @classmethod
+    def clear_shared(cls):
+        """Forget all shared schedulers"""
+        cls._shared_schedulers.clear()
+
+    @property
+    def metrics(self) -> RateLimitMetrics:
+        return RateLimitMetrics(
+            queue_depth=self._queue_depth,
+            in_flight=self._in_flight,
+            requests=self._requests,
+            retries=self._retries,
+            throttled=self._throttled,
+            total_wait_seconds=self._total_wait,
+            max_wait_seconds=self._max_wait,
+            minute_remaining=self.minute_remaining,
+            month_remaining=self.month_remaining,
+        )
+
+    async def request(self, method: str, send: Callable[[], Awaitable[Response]]) -> Response:
+        """Send a request once the rate limit allows it, retrying throttled and failed requests
+
+        Args:
+            method (str): HTTP method of the request, used to decide if server errors can be retried
+            send (Callable[[], Awaitable[Response]]): Callable sending the request
+
+        Returns:
+            Response: Last response received. Callers should still check the status code
+        """
+        attempt = 0
+        while True:
+            await self._wait_for_turn()
+            self._in_flight += 1
+            try:
+                response = await send()
+            finally:
+                self._in_flight -= 1
+            self._requests += 1
+            self.update_quota(response.headers)
+
+            if not self._should_retry(method, response) or attempt >= self.max_retries:
+                return response
+
+            if response.status_code == 429:
+                self._throttled += 1
+            self._retries += 1
+            # release the connection of a streamed response before retrying
+            await response.aclose()
+            await asyncio.sleep(self.retry_delay(response, attempt))
+            attempt += 1
+
+    def update_quota(self, headers: Headers):
+        """Update remaining quota from rate limit response headers
+
+        Args:
+            headers (Headers): Response headers
+        """
+        minute_remaining = _int_header(headers, self.minute_remaining_header)
+        if minute_remaining is not None:
+            self.minute_remaining = minute_remaining
+            reset = _int_header(headers, self.minute_reset_header)
+            if minute_remaining <= 0 and reset is not None:
+                # hold back every request until the per-minute window resets
+                self._paused_until = max(self._paused_until, time.monotonic() + reset)
+
+        month_remaining = _int_header(headers, self.month_remaining_header)
+        if month_remaining is not None:
+            self.month_remaining = month_remaining
+
+    def retry_delay(self, response: Response, attempt: int) -> float:
+        """Seconds to wait before retrying a response
+
+        Args:
+            response (Response): Response to retry
+            attempt (int): Number of retries already made
+
+        Returns:
+            float: `Retry-After` when sent by the server, otherwise full jitter exponential backoff
+        """
+        backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        retry_after = _retry_after_seconds(response.headers.get("Retry-After"))
+        if retry_after is not None:
+            return retry_after + backoff * 0.1
+        return backoff
+
+    async def _wait_for_turn(self):
+        self._queue_depth += 1
+        try:
+            started_at = time.monotonic()
+            paused_for = self._paused_until - started_at
+            if paused_for > 0:
+                await asyncio.sleep(paused_for)
+            await self.bucket.acquire()
+            waited = time.monotonic() - started_at
+        finally:
+            self._queue_depth -= 1
+        self._total_wait += waited
+        self._max_wait = max(self._max_wait, waited)
+
+    @staticmethod
+    def _should_retry(method: str, response: Response) -> bool:
+        if response.status_code == 429:
+            return True
+        return response.status_code in RETRYABLE_STATUS_CODES and method.upper() in IDEMPOTENT_METHODS
+
+
+def _int_header(headers: Headers, name: str) -> int | None:
+    try:
+        return int(headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def _retry_after_seconds(retry_after: str | None) -> float | None:
+    if retry_after is None:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(retry_after) - datetime_now()).total_seconds())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,298 @@
+import asyncio
+import time
+from collections import deque
+from enum import Enum
+from typing import Awaitable, Callable, TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+def _always_failure(error: Exception) -> bool:
+    return True
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of making a call while a circuit breaker is open
+
+    Args:
+        retry_after (float): Seconds until the breaker lets a trial call through
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Circuit breaker is open, retry in {retry_after:.1f} seconds")
+        self.retry_after = retry_after
+
+
+class QueueTimeoutError(Exception):
+    """Raised when a call waits longer than the queue timeout of a concurrency limiter for a slot"""
+
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class ConcurrencyLimiterMetrics(BaseModel):
+    limit: float
+    in_flight: int
+    queue_depth: int
+    successes: int
+    failures: int
+    decreases: int
+    queue_timeouts: int
+
+
+class CircuitBreakerMetrics(BaseModel):
+    state: CircuitState
+    consecutive_failures: int
+    times_opened: int
+    rejected: int
+
+
+class AdaptiveConcurrencyLimiter:
+    """Limits calls in flight with a limit adapted by additive increase, multiplicative decrease (AIMD)
+
+    Every fast, successful call raises the limit by `1 / limit`, so the limit grows by about one per round of
+    calls. A call which fails or takes longer than `latency_threshold` cuts the limit by `decrease_ratio`. Only
+    calls started after the last cut can cut it again, so a burst of slow responses to the same overload halves
+    the limit once instead of collapsing it to `min_limit`. Calls rejected by a circuit breaker never reached the
+    dependency and leave the limit unchanged.
+
+    Args:
+        initial_limit (int, optional): Calls allowed in flight to begin with. Defaults to 10.
+        min_limit (int, optional): Lowest limit. Defaults to 1.
+        max_limit (int, optional): Highest limit. Defaults to 100.
+        latency_threshold (float, optional): Seconds after which a successful call counts as overloaded.
+            Defaults to 2.0.
+        decrease_ratio (float, optional): Factor the limit is multiplied by on overload. Defaults to 0.5.
+        is_failure (Callable[[Exception], bool], optional): Returns True for errors caused by overload. Other
+            errors count as successful calls. Defaults to treating every error as a failure.
+        queue_timeout (float, optional): Seconds a call waits for a slot before failing with
+            `QueueTimeoutError`. Defaults to None, waiting as long as it takes.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 10,
+        min_limit: int = 1,
+        max_limit: int = 100,
+        latency_threshold: float = 2.0,
+        decrease_ratio: float = 0.5,
+        is_failure: Callable[[Exception], bool] = None,
+        queue_timeout: float = None,
+    ):
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError("Limits must satisfy 1 <= min_limit <= initial_limit <= max_limit")
+        if not 0 < decrease_ratio < 1:
+            raise ValueError("Decrease ratio must be between 0 and 1")
+
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_threshold = latency_threshold
+        self.decrease_ratio = decrease_ratio
+        self.is_failure = is_failure or _always_failure
+        self.queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._decreased_at = float("-inf")
+        self._successes = 0
+        self._failures = 0
+        self._decreases = 0
+        self._queue_timeouts = 0
+
+    @property
+    def metrics(self) -> ConcurrencyLimiterMetrics:
+        return ConcurrencyLimiterMetrics(
+            limit=self.limit,
+            in_flight=self._in_flight,
+            queue_depth=len(self._waiters),
+            successes=self._successes,
+            failures=self._failures,
+            decreases=self._decreases,
+            queue_timeouts=self._queue_timeouts,
+        )
+
+    async def call(self, send: Callable[[], Awaitable[T]]) -> T:
+        """Make a call once the limit allows it
+
+        Args:
+            send (Callable[[], Awaitable[T]]): Callable making the call
+
+        Raises:
+            QueueTimeoutError: If no slot frees up within `queue_timeout`
+
+        Returns:
+            T: Result of the call
+        """
+        await self._acquire()
+        started_at = time.monotonic()
+        overloaded = None
+        try:
+            result = await send()
+            overloaded = time.monotonic() - started_at > self.latency_threshold
+            return result
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            overloaded = self.is_failure(e)
+            if overloaded:
+                self._failures += 1
+            raise
+        finally:
+            # cancelled calls release their slot without changing the limit
+            if overloaded is not None:
+                self._adjust(started_at, overloaded)
+            self._release()
+
+    def _adjust(self, started_at: float, overloaded: bool):
+        if not overloaded:
+            self._successes += 1
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        elif started_at > self._decreased_at:
+            self._decreases += 1
+            self._decreased_at = time.monotonic()
+            self.limit = max(self.min_limit, self.limit * self.decrease_ratio)
+
+    async def _acquire(self):
+        if self._in_flight < int(self.limit) and not self._waiters:
+            self._in_flight += 1
+            return
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        timer = None if self.queue_timeout is None else loop.call_later(self.queue_timeout, self._expire, waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over just before the caller was cancelled
+                self._release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+    def _expire(self, waiter: asyncio.Future):
+        if waiter.done():
+            return
+        self._waiters.remove(waiter)
+        self._queue_timeouts += 1
+        waiter.set_exception(QueueTimeoutError(f"No slot within {self.queue_timeout} seconds"))
+
+    def _release(self):
+        self._in_flight -= 1
+        while self._waiters and self._in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._in_flight += 1
+                waiter.set_result(None)
+
+
+class CircuitBreaker:
+    """Fails calls fast while a dependency keeps failing
+
+    The breaker opens after `failure_threshold` consecutive failures and rejects calls with `CircuitOpenError`.
+    Once `recovery_timeout` has passed it is half open and lets a single trial call through, which closes the
+    breaker if it succeeds and opens it again if it fails.
+
+    Args:
+        failure_threshold (int, optional): Consecutive failures which open the breaker. Defaults to 5.
+        recovery_timeout (float, optional): Seconds the breaker stays open. Defaults to 30.
+        is_failure (Callable[[Exception], bool], optional): Returns True for errors which count as failures.
+            Other errors count as successful calls. Defaults to treating every error as a failure.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30,
+        is_failure: Callable[[Exception], bool] = None,
+    ):
+        if failure_threshold < 1:
+            raise ValueError("Failure threshold must be at least 1")
+
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.is_failure = is_failure or _always_failure
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._consecutive_failures = 0
+        self._times_opened = 0
+        self._rejected = 0
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state is CircuitState.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            return CircuitState.HALF_OPEN
+        return self._state
+
+    @property
+    def metrics(self) -> CircuitBreakerMetrics:
+        return CircuitBreakerMetrics(
+            state=self.state,
+            consecutive_failures=self._consecutive_failures,
+            times_opened=self._times_opened,
+            rejected=self._rejected,
+        )
+
+    async def call(self, send: Callable[[], Awaitable[T]]) -> T:
+        """Make a call unless the breaker is open
+
+        Args:
+            send (Callable[[], Awaitable[T]]): Callable making the call
+
+        Raises:
+            CircuitOpenError: If the breaker is open, or half open with a trial call in flight
+
+        Returns:
+            T: Result of the call
+        """
+        state = self.state
+        if state is CircuitState.OPEN or (state is CircuitState.HALF_OPEN and self._trial_in_flight):
+            self._rejected += 1
+            raise CircuitOpenError(max(0.0, self._opened_at + self.recovery_timeout - time.monotonic()))
+
+        trial = state is CircuitState.HALF_OPEN
+        self._trial_in_flight = self._trial_in_flight or trial
+        try:
+            result = await send()
+        except Exception as e:
+            if self.is_failure(e):
+                self._record_failure()
+            else:
+                self._record_success()
+            raise
+        finally:
+            if trial:
+                self._trial_in_flight = False
+        self._record_success()
+        return result
+
+    def check(self):
+        """Fail fast while the breaker is open, so callers can give up before queueing for a call
+
+        Raises:
+            CircuitOpenError: If the breaker is open
+        """
+        if self.state is CircuitState.OPEN:
+            self._rejected += 1
+            raise CircuitOpenError(max(0.0, self._opened_at + self.recovery_timeout - time.monotonic()))
+
+    def _record_success(self):
+        self._consecutive_failures = 0
+        self._state = CircuitState.CLOSED
+
+    def _record_failure(self):
+        self._consecutive_failures += 1
+        if self.state is CircuitState.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            self._state = CircuitState.OPEN
+            self._opened_at = time.monotonic()
+            self._times_opened += 1
@@ -1,8 +1,47 @@
+import asyncio
+import json
+import time
+from functools import lru_cache
 from os import environ
 from typing import Any
 
+from aiohttp import TCPConnector
 from gql import Client, gql
 from gql.transport.aiohttp import AIOHTTPTransport
+from gql.transport.exceptions import TransportQueryError
+from graphql import DocumentNode
+
+from mosaic_os.resilience import AdaptiveConcurrencyLimiter, CircuitBreaker
+
+
+class _PooledAIOHTTPTransport(AIOHTTPTransport):
+    """AIOHTTP transport with a bounded keep-alive connection pool
+
+    The connector is created when the transport connects because aiohttp connectors need a running event loop.
+    """
+
+    def __init__(self, *args, max_connections: int, keepalive_timeout: float, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+
+    async def connect(self) -> None:
+        self.client_session_args = {
+            **(self.client_session_args or {}),
+            "connector": TCPConnector(limit=self.max_connections, keepalive_timeout=self.keepalive_timeout),
+        }
+        await super().connect()
+
+
+@lru_cache(maxsize=256)
+def _parse_query(query: str) -> DocumentNode:
+    # documents are not modified when executed so parsed documents can be shared between queries
+    return gql(query)
+
+
+def _is_harmonic_failure(error: Exception) -> bool:
+    # GraphQL errors such as a company not being found are answers from a healthy API
+    return not isinstance(error, TransportQueryError)
 
 
 class HarmonicGql:
@@ -11,30 +50,268 @@ class HarmonicGql:
     Args:
         harmonic_api_key (str): API key for Harmonic which can be set by passing through here or
         setting environment variable `HARMONIC_API_KEY`. Defaults to None.
+        timeout (int, optional): Seconds to wait for a query to execute. Defaults to 10.
+        max_connections (int, optional): Maximum number of open connections. Defaults to 100.
+        keepalive_timeout (float, optional): Seconds an idle connection is kept alive for. Defaults to 15.0.
+        idle_timeout (float, optional): Seconds the session opened by `query` is kept open without queries
+            when `connect` was not called. Defaults to 60.0.
+        limiter (AdaptiveConcurrencyLimiter, optional): Limits queries in flight, adapting to Harmonic's latency
+            and errors. Defaults to a limiter starting at 10 queries which treats slow queries as taking more
+            than half the timeout and lets queries wait up to the timeout for a slot.
+        breaker (CircuitBreaker, optional): Fails queries fast with `CircuitOpenError` while Harmonic keeps
+            failing. GraphQL errors do not count as failures. Defaults to a breaker opening after 5 failures.
 
     Raises:
         ValueError: If harmonic_api_key is not set
     """
 
-    def __init__(self, harmonic_api_key: str = None, timeout: int = 10):
+    _shared_clients: dict[tuple, "HarmonicGql"] = {}
+
+    def __init__(
+        self,
+        harmonic_api_key: str = None,
+        timeout: int = 10,
+        max_connections: int = 100,
+        keepalive_timeout: float = 15.0,
+        idle_timeout: float = 60.0,
+        limiter: AdaptiveConcurrencyLimiter = None,
+        breaker: CircuitBreaker = None,
+    ):
         _harmonic_api_key = environ.get("HARMONIC_API_KEY", harmonic_api_key)
         if _harmonic_api_key is None:
             raise ValueError("Harmonic API Key not found in environment variables or passed as argument")
 
-        self.transport = AIOHTTPTransport(url="https://api.harmonic.ai/graphql", headers={"apikey": _harmonic_api_key})
+        self.transport = _PooledAIOHTTPTransport(
+            url="https://api.harmonic.ai/graphql",
+            headers={"apikey": _harmonic_api_key},
+            max_connections=max_connections,
+            keepalive_timeout=keepalive_timeout,
+        )
         self.client = Client(transport=self.transport, execute_timeout=timeout)
         self.session = None
+        self.idle_timeout = idle_timeout
+        self.limiter = limiter or AdaptiveConcurrencyLimiter(
+            max_limit=max_connections,
+            latency_threshold=timeout / 2,
+            is_failure=_is_harmonic_failure,
+            queue_timeout=timeout,
+        )
+        self.breaker = breaker or CircuitBreaker(is_failure=_is_harmonic_failure)
+        self._session_lock = asyncio.Lock()
+        self._lazy_session = False
+        self._in_flight = 0
+        self._idle_close: asyncio.TimerHandle | None = None
+        self._idle_disconnect: asyncio.Task | None = None
+
+    @classmethod
+    def shared(cls, harmonic_api_key: str = None, **client_options) -> "HarmonicGql":
+        """Get a process-wide client so connection pools are reused between callers
+
+        Clients are keyed by API key and client options. Shared clients should only be used from a single
+        event loop and are closed with `HarmonicGql.close_shared()`.
+
+        Args:
+            harmonic_api_key (str, optional): API key for Harmonic. Defaults to None.
+            **client_options: Options passed to `HarmonicGql`
+
+        Returns:
+            HarmonicGql: Shared Harmonic client
+        """
+        registry_key = (
+            environ.get("HARMONIC_API_KEY", harmonic_api_key),
+            tuple(sorted(client_options.items())),
+        )
+        client = cls._shared_clients.get(registry_key)
+        if client is None:
+            client = cls(harmonic_api_key, **client_options)
+            cls._shared_clients[registry_key] = client
+        return client
+
+    @classmethod
+    async def close_shared(cls):
+        """Disconnect all shared clients"""
+        clients = list(cls._shared_clients.values())
+        cls._shared_clients.clear()
+        for client in clients:
+            await client.disconnect()
 
     async def connect(self):
-        self.session = await self.client.connect_async(reconnecting=True)
+        if self._idle_close is not None:
+            self._idle_close.cancel()
+            self._idle_close = None
+        async with self._session_lock:
+            if self.session is None:
+                self.session = await self.client.connect_async(reconnecting=True)
+            # a session opened by `query` is kept open until `disconnect` from now on
+            self._lazy_session = False
 
     async def query(self, query: str, variables: dict = None) -> dict[str, Any]:
-        if self.session:
-            return await self.session.execute(gql(query), variable_values=variables)
-        async with self.client as session:
-            response = await session.execute(gql(query), variable_values=variables)
+        """Execute a query
+
+        Parsed queries are cached by their text. When `connect` was not called, queries share a session which is
+        opened on first use, reconnects automatically and is closed once it has been idle for `idle_timeout`.
+        Queries wait for a slot from the concurrency limiter and then go through the circuit breaker, so queries
+        queued when the breaker opens fail fast. While the breaker is open queries fail without queueing.
+
+        Args:
+            query (str): GraphQL document
+            variables (dict, optional): Variables of the document. Defaults to None.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open
+            QueueTimeoutError: If no slot from the concurrency limiter frees up in time
 
-        return response
+        Returns:
+            dict[str, Any]: Data returned for the document
+        """
+        document = _parse_query(query)
+        self.breaker.check()
+        return await self.limiter.call(lambda: self.breaker.call(lambda: self._execute(document, variables)))
+
+    async def _execute(self, document: DocumentNode, variables: dict = None) -> dict[str, Any]:
+        self._in_flight += 1
+        try:
+            session = self.session or await self._open_lazy_session()
+            return await session.execute(document, variable_values=variables)
+        finally:
+            self._in_flight -= 1
+            if self._lazy_session:
+                self._schedule_idle_close()
+
+    async def _open_lazy_session(self):
+        async with self._session_lock:
+            if self.session is None:
+                self.session = await self.client.connect_async(reconnecting=True)
+                self._lazy_session = True
+            return self.session
+
+    def _schedule_idle_close(self):
+        if self._idle_close is not None:
+            self._idle_close.cancel()
+        self._idle_close = asyncio.get_running_loop().call_later(self.idle_timeout, self._close_if_idle)
+
+    def _close_if_idle(self):
+        self._idle_close = None
+        if self._lazy_session and self._in_flight == 0:
+            self._idle_disconnect = asyncio.ensure_future(self._close_idle_session())
+
+    async def _close_idle_session(self):
+        async with self._session_lock:
+            # queries started between the timer firing and the lock being taken keep the session open
+            if not self._lazy_session or self._in_flight or self.session is None:
+                return
+            self.session = None
+            self._lazy_session = False
+            await self.client.close_async()
+
+    async def enrich_companies_by_domains(
+        self,
+        domains: list[str],
+        selection: str,
+        max_batch_size: int = 50,
+        max_payload_bytes: int = 64_000,
+        timeout_budget: float = None,
+    ) -> dict[str, dict | Exception]:
+        """Enrich many companies by domain, packing several `enrichCompanyByIdentifiers` mutations into each
+        request using aliases
+
+        The batch size is picked automatically: it never exceeds what fits in `max_payload_bytes` and adapts
+        to the latency seen per alias so a batch is expected to finish within `timeout_budget`. Batches which
+        time out are split in half and retried.
+
+        Args:
+            domains (list[str]): Domain names of companies
+            selection (str): Selection set of the `enrichCompanyByIdentifiers` mutation, including the braces
+            max_batch_size (int, optional): Maximum number of aliases per request. Defaults to 50.
+            max_payload_bytes (int, optional): Maximum size of the document and variables of a request.
+                Defaults to 64000.
+            timeout_budget (float, optional): Seconds a batch should take. Defaults to 80% of the client timeout.
+
+        Returns:
+            dict[str, dict | Exception]: Result of `enrichCompanyByIdentifiers` for each domain, or the error
+                raised for it. GraphQL errors are raised as a `TransportQueryError` holding that domain's errors,
+                any other error of a request is returned for every domain of its batch
+        """
+        timeout_budget = timeout_budget or 0.8 * self.client.execute_timeout
+        results: dict[str, dict | Exception] = {}
+        pending = list(dict.fromkeys(domains))
+        batch_size = min(max_batch_size, len(pending)) or 1
+        seconds_per_alias = None
+
+        while pending:
+            limit = min(batch_size, self._max_aliases_within_payload(pending, selection, max_payload_bytes))
+            batch, pending = pending[:limit], pending[limit:]
+            started_at = time.monotonic()
+            batch_results = await self._enrich_batch(batch, selection)
+            results.update(batch_results)
+
+            if all(isinstance(result, asyncio.TimeoutError) for result in batch_results.values()) and len(batch) > 1:
+                # retry the batch in smaller pieces and never grow back to a size which timed out
+                for domain in batch:
+                    del results[domain]
+                pending = batch + pending
+                max_batch_size = batch_size = max(1, len(batch) // 2)
+                continue
+
+            elapsed = (time.monotonic() - started_at) / len(batch)
+            seconds_per_alias = elapsed if seconds_per_alias is None else 0.5 * (seconds_per_alias + elapsed)
+            batch_size = max(1, min(max_batch_size, int(timeout_budget / max(seconds_per_alias, 1e-6))))
+        return results
+
+    async def _enrich_batch(self, domains: list[str], selection: str) -> dict[str, dict | Exception]:
+        document, variables, aliases = self._enrich_batch_document(domains, selection)
+        try:
+            data = await self.query(document, variables=variables)
+            errors = []
+        except TransportQueryError as e:
+            data = e.data or {}
+            errors = e.errors or []
+        except Exception as e:
+            # connection errors, an open breaker or anything else fail every domain of the batch
+            return {domain: e for domain in domains}
+
+        results = {}
+        for alias, domain in aliases.items():
+            alias_errors = [error for error in errors if not error.get("path") or error["path"][0] == alias]
+            if alias_errors:
+                results[domain] = TransportQueryError(str(alias_errors[0]), errors=alias_errors, data=data.get(alias))
+            else:
+                results[domain] = data.get(alias)
+        return results
+
+    @staticmethod
+    def _enrich_batch_document(domains: list[str], selection: str) -> tuple[str, dict, dict[str, str]]:
+        aliases = {f"company{i}": domain for i, domain in enumerate(domains)}
+        variable_definitions = ", ".join(f"${alias}: CompanyEnrichmentIdentifiersInput!" for alias in aliases)
+        fields = "\n".join(
+            f"    {alias}: enrichCompanyByIdentifiers(identifiers: ${alias}) {selection}" for alias in aliases
+        )
+        document = f"mutation ({variable_definitions}) {{\n{fields}\n}}"
+        variables = {alias: {"websiteUrl": domain} for alias, domain in aliases.items()}
+        return document, variables, aliases
+
+    @classmethod
+    def _max_aliases_within_payload(cls, domains: list[str], selection: str, max_payload_bytes: int) -> int:
+        # every alias adds roughly the same amount to the payload so size it from a single alias
+        document, variables, _ = cls._enrich_batch_document(domains[:1], selection)
+        bytes_per_alias = len(document) + len(json.dumps(variables))
+        return max(1, max_payload_bytes // bytes_per_alias)
 
     async def disconnect(self):
-        await self.client.close_async()
+        if self._idle_close is not None:
+            self._idle_close.cancel()
+            self._idle_close = None
+        if self.session is None:
+            return
+        # queries made while the session closes open a new session once the lock is released
+        self.session = None
+        self._lazy_session = False
+        async with self._session_lock:
+            await self.client.close_async()
+
+    async def __aenter__(self) -> "HarmonicGql":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.disconnect()
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from mosaic_os.cache import SqliteCache, TTLCache
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(ttl=60)
+    cache.set("fresh", 1)
+    cache.set("stale", 2, ttl=0)
+
+    assert cache.get("fresh") == 1
+    assert cache.get("stale") is None
+    assert len(cache) == 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_invalidate_by_predicate():
+    cache = TTLCache()
+    cache.set(("search_company", ("a",)), 1)
+    cache.set(("get_company_details", (1,)), 2)
+    cache.invalidate(lambda key: key[0] == "search_company")
+
+    assert cache.get(("search_company", ("a",))) is None
+    assert cache.get(("get_company_details", (1,))) == 2
+
+
+# Tests if concurrent requests for the same key are coalesced into a single fetch
+@pytest.mark.asyncio
+async def test_ttl_cache_get_or_fetch_single_flight():
+    cache = TTLCache()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"id": 1}
+
+    results = await asyncio.gather(*(cache.get_or_fetch("key", fetch) for _ in range(5)))
+
+    assert calls == 1
+    assert results == [{"id": 1}] * 5
+    assert await cache.get_or_fetch("key", fetch) == {"id": 1}
+    assert calls == 1
+    assert cache.misses == 1
+    assert cache.hits == 5
+
+
+# Tests if errors are raised to every caller and not cached
+@pytest.mark.asyncio
+async def test_ttl_cache_get_or_fetch_does_not_cache_errors():
+    cache = TTLCache()
+
+    async def fetch():
+        raise RuntimeError("failed")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_fetch("key", fetch)
+
+    assert cache.get("key") is None
+
+
+# Tests if a result fetched while its key was invalidated is not cached
+@pytest.mark.asyncio
+async def test_ttl_cache_invalidated_in_flight_result_not_cached():
+    cache = TTLCache()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        return "stale"
+
+    in_flight = asyncio.ensure_future(cache.get_or_fetch("key", fetch))
+    await asyncio.sleep(0)
+    cache.delete("key")
+
+    assert await in_flight == "stale"
+    assert cache.get("key") is None
+
+
+# Tests if SqliteCache entries survive reopening the database and expire
+def test_sqlite_cache_persists_entries(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = SqliteCache(path, ttl=60)
+    cache.set("fresh", {"id": 1})
+    cache.set("stale", {"id": 2}, ttl=0)
+    cache.close()
+
+    cache = SqliteCache(path)
+
+    assert cache.get("fresh") == {"id": 1}
+    assert cache.get("stale") is None
+    assert len(cache) == 1
+
+
+def test_sqlite_cache_evicts_least_recently_used(tmp_path):
+    cache = SqliteCache(str(tmp_path / "cache.db"), max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
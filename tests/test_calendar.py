@@ -0,0 +1,127 @@
+from unittest import mock
+
+import pytest
+from google.api_core.exceptions import ServiceUnavailable
+from google.cloud.datastore import Entity, Key
+
+# the module creates a Datastore client at import
+with mock.patch("google.cloud.datastore.Client"):
+    from mosaic_os import calendar
+
+
+@pytest.fixture(autouse=True)
+def clear_calendar_caches():
+    calendar.clear_calendar_service_cache()
+    yield
+    calendar.clear_calendar_service_cache()
+
+
+@pytest.fixture
+def source_credentials(mocker):
+    source = mocker.MagicMock()
+    source.with_subject.side_effect = lambda user_email: mocker.MagicMock(expired=False, subject=user_email)
+    mocker.patch.object(calendar, "_get_source_credentials", return_value=source)
+    return source
+
+
+@pytest.fixture
+def build_from_document(mocker):
+    return mocker.patch.object(calendar, "build_from_document", side_effect=lambda document, http: mocker.MagicMock())
+
+
+# Tests if delegated credentials are reused while every call builds its own service and HTTP connection
+def test_get_calendar_service_reuses_credentials(source_credentials, build_from_document):
+    first = calendar.get_calendar_service("a@test.com")
+    second = calendar.get_calendar_service("a@test.com")
+    calendar.get_calendar_service("b@test.com")
+
+    assert first is not second
+    assert source_credentials.with_subject.call_count == 2
+    first_http, second_http = (call.kwargs["http"] for call in build_from_document.call_args_list[:2])
+    assert first_http is not second_http
+    assert first_http.credentials is second_http.credentials
+
+
+# Tests if expired credentials are derived again
+def test_get_calendar_service_renews_expired_credentials(source_credentials, build_from_document):
+    calendar.get_calendar_service("a@test.com")
+    build_from_document.call_args.kwargs["http"].credentials.expired = True
+    calendar.get_calendar_service("a@test.com")
+    calendar.get_calendar_service("a@test.com")
+
+    assert source_credentials.with_subject.call_count == 2
+
+
+# Tests if clearing the cache drops delegated credentials
+def test_clear_calendar_service_cache(source_credentials, build_from_document):
+    calendar.get_calendar_service("a@test.com")
+    calendar.clear_calendar_service_cache()
+    calendar.get_calendar_service("a@test.com")
+
+    assert source_credentials.with_subject.call_count == 2
+
+
+@pytest.fixture
+def webhook_env(mocker):
+    mocker.patch.dict(calendar.environ, {"WEBHOOK_TOKEN": "token", "WEBHOOK_URL": "https://test/webhook"})
+
+
+@pytest.fixture
+def db(mocker):
+    db = mocker.patch.object(calendar, "db")
+    db.key.side_effect = lambda kind, name: Key(kind, name, project="test")
+    db.get_multi.return_value = []
+    return db
+
+
+def watch_calendar(calendar_id: str, token: str, address: str) -> tuple[str, dict]:
+    if calendar_id.startswith("broken"):
+        raise RuntimeError("Watch failed")
+    return f"webhook-{calendar_id}", {"id": f"webhook-{calendar_id}", "expiration": "1700000000000"}
+
+
+# Tests if failed watch requests are reported per calendar while the other calendars are stored
+def test_subscribe_channels_reports_errors_per_calendar(mocker, webhook_env, db):
+    watch_mock = mocker.patch.object(calendar, "_watch_calendar", side_effect=watch_calendar)
+
+    results = calendar.subscribe_channels(["a@test.com", "broken@test.com", "b@test.com", "a@test.com"])
+
+    assert list(results) == ["a@test.com", "broken@test.com", "b@test.com"]
+    assert watch_mock.call_count == 3
+    assert watch_mock.call_args.args[1:] == ("token", "https://test/webhook")
+    assert isinstance(results["broken@test.com"], RuntimeError)
+    assert results["a@test.com"]["webhook_id"] == "webhook-a@test.com"
+    assert results["a@test.com"]["_expiration"] == 1700000000000
+    assert db.put_multi.call_count == 1
+    assert [entity.key.name for entity in db.put_multi.call_args.args[0]] == ["a@test.com", "b@test.com"]
+
+
+# Tests if webhooks are read and written in chunks and a failed chunk is reported for each of its calendars
+def test_subscribe_channels_chunks_datastore_requests(mocker, webhook_env, db):
+    mocker.patch.object(calendar, "_watch_calendar", side_effect=watch_calendar)
+    mocker.patch.object(calendar, "DATASTORE_MAX_BATCH_SIZE", 2)
+    db.put_multi.side_effect = [None, ServiceUnavailable("Datastore unavailable"), None]
+    calendar_ids = [f"{i}@test.com" for i in range(5)]
+
+    results = calendar.subscribe_channels(calendar_ids)
+
+    assert [len(call.args[0]) for call in db.get_multi.call_args_list] == [2, 2, 1]
+    assert [len(call.args[0]) for call in db.put_multi.call_args_list] == [2, 2, 1]
+    failed = {calendar_id for calendar_id, result in results.items() if isinstance(result, ServiceUnavailable)}
+    assert failed == {"2@test.com", "3@test.com"}
+    assert all(isinstance(results[calendar_id], Entity) for calendar_id in ("0@test.com", "1@test.com", "4@test.com"))
+
+
+# Tests if resubscribing keeps the creation time of an existing webhook
+def test_subscribe_channels_keeps_created(mocker, webhook_env, db):
+    mocker.patch.object(calendar, "_watch_calendar", side_effect=watch_calendar)
+    existing = Entity(key=Key("CalendarWebhook", "a@test.com", project="test"))
+    existing.update({"created": "2024-01-01T00:00:00", "webhook_id": "old", "_expiration": 1})
+    db.get_multi.return_value = [existing]
+
+    results = calendar.subscribe_channels(["a@test.com", "b@test.com"])
+
+    assert results["a@test.com"] is existing
+    assert existing["created"] == "2024-01-01T00:00:00"
+    assert existing["webhook_id"] == "webhook-a@test.com"
+    assert results["b@test.com"]["created"] != "2024-01-01T00:00:00"
@@ -1,14 +1,31 @@
+import asyncio
+
 import pytest
+from aiohttp import ClientConnectionError
+from google.api_core.exceptions import ServiceUnavailable
 from google.cloud.datastore import Client, Entity, Key  # noqa: F401
 from gql.transport.exceptions import TransportQueryError
 from pytest_mock import MockerFixture
 
+from mosaic_os.cache import SqliteCache
 from mosaic_os.company import (
+    CompanyCreateStatus,
+    HarmonicEnrichmentCache,
     create_company_master_id,
+    create_company_master_id_async,
+    create_company_master_ids,
     get_all_company_details,
+    get_all_company_details_batch,
     lookup_company_master_id_by_domain,
+    lookup_company_master_id_by_domain_async,
+    lookup_company_master_ids_by_domains,
+    lookup_company_master_ids_by_domains_async,
 )
+from mosaic_os.crm import AffinityApi
+from mosaic_os.datastore import AsyncDatastore
 from mosaic_os.models import Company
+from mosaic_os.resilience import CircuitBreaker
+from mosaic_os.sourcing_platform import HarmonicGql
 
 HARMONIC_RETURN_VALUE = {
     "enrichCompanyByIdentifiers": {
@@ -217,6 +234,14 @@ async def test_get_all_company_details_sp_and_crm_match(
         company_details["crm"]["last_live_pipeline_list_entry"]["priority"],
         dict,
     )
+    assert company_details["crm"]["ec_flag"]["value"] == "ON"
+    assert (
+        company_details["crm"]["last_live_pipeline_list_entry"]["status"][
+            "value"
+        ]
+        == "Track"
+    )
+    assert company_details["crm"]["match_confidence"] == 1.0
 
 
 # This tests the case where the company is found in the CRM but not in the SP
@@ -402,6 +427,442 @@ async def test_company_found_in_crm_but_no_live_pipeline_entry_found(
     assert company_details["crm"]["last_live_pipeline_list_entry"] is None
 
 
+# This tests that the affinity domain search runs while harmonic is still enriching the company
+@pytest.mark.asyncio
+async def test_get_all_company_details_searches_domain_concurrently_with_harmonic(
+    mocker: MockerFixture, tests_setup_and_teardown
+):
+    domain_search_started = asyncio.Event()
+
+    async def harmonic_query(*args, **kwargs):
+        await asyncio.wait_for(domain_search_started.wait(), timeout=1)
+        return HARMONIC_RETURN_VALUE
+
+    async def search_company_by_name_and_domains(domains, name=None):
+        domain_search_started.set()
+        return AFFINITY_SEARCH_RETURN_VALUE
+
+    mocker.patch(
+        "mosaic_os.sourcing_platform.HarmonicGql.query",
+        side_effect=harmonic_query,
+    )
+    search_mock = mocker.patch(
+        "mosaic_os.crm.AffinityApi.search_company_by_name_and_domains",
+        side_effect=search_company_by_name_and_domains,
+    )
+    mocker.patch(
+        "mosaic_os.crm.AffinityApi.get_company_details",
+        return_value=AFFINITY_COMPANY_DETAILS_RETURN_VALUE,
+    )
+    mocker.patch(
+        "mosaic_os.crm.AffinityApi.get_field_values",
+        return_value=AFFINITY_COMPANY_FIELD_VALUES_RETURN_VALUE,
+    )
+
+    company_details = await get_all_company_details(
+        "test.com", mock_affinity_config
+    )
+
+    assert company_details["crm"]["company_id"] == 64779194
+    assert search_mock.call_args_list[0].kwargs == {"domains": ["test.com"]}
+    assert search_mock.call_args_list[1].kwargs == {
+        "name": "Test",
+        "domains": [],
+    }
+
+
+# This tests that injected clients are used and left open for the caller
+@pytest.mark.asyncio
+async def test_get_all_company_details_with_injected_clients(
+    mocker: MockerFixture,
+):
+    harmonic_client = HarmonicGql("test")
+    affinity_client = AffinityApi("test")
+    mocker.patch.object(
+        harmonic_client, "query", return_value=HARMONIC_RETURN_VALUE
+    )
+    mocker.patch.object(
+        affinity_client,
+        "search_company_by_name_and_domains",
+        return_value=AFFINITY_SEARCH_RETURN_VALUE,
+    )
+    mocker.patch.object(
+        affinity_client,
+        "get_company_details",
+        return_value=AFFINITY_COMPANY_DETAILS_RETURN_VALUE,
+    )
+    mocker.patch.object(
+        affinity_client,
+        "get_field_values",
+        return_value=AFFINITY_COMPANY_FIELD_VALUES_RETURN_VALUE,
+    )
+
+    company_details = await get_all_company_details(
+        "test.com",
+        mock_affinity_config,
+        affinity_client=affinity_client,
+        harmonic_client=harmonic_client,
+    )
+
+    assert company_details["crm"]["company_id"] == 64779194
+    assert not affinity_client.requests.is_closed
+    await affinity_client.aclose()
+
+
+# This tests that clients created for a call are connected and closed by it
+@pytest.mark.asyncio
+async def test_get_all_company_details_closes_created_clients(
+    mocker: MockerFixture, tests_setup_and_teardown
+):
+    mocker.patch(
+        "mosaic_os.sourcing_platform.HarmonicGql.query",
+        return_value=HARMONIC_RETURN_VALUE,
+    )
+    mocker.patch(
+        "mosaic_os.crm.AffinityApi.search_company_by_name_and_domains",
+        return_value=[],
+    )
+    connect_mock = mocker.patch(
+        "mosaic_os.sourcing_platform.HarmonicGql.connect",
+        new_callable=mocker.AsyncMock,
+    )
+    disconnect_mock = mocker.patch(
+        "mosaic_os.sourcing_platform.HarmonicGql.disconnect",
+        new_callable=mocker.AsyncMock,
+    )
+
+    await get_all_company_details("test.com", mock_affinity_config)
+
+    assert connect_mock.await_count == 1
+    assert disconnect_mock.await_count == 1
+
+
+# This tests that batch lookups collapse duplicate domains and report failures per domain
+@pytest.mark.asyncio
+async def test_get_all_company_details_batch(mocker: MockerFixture):
+    harmonic_client = HarmonicGql("test")
+    affinity_client = AffinityApi("test")
+
+    async def harmonic_query(query, variables):
+        if variables["identifiers"]["websiteUrl"] == "broken.io":
+            raise RuntimeError("Harmonic unavailable")
+        return HARMONIC_RETURN_VALUE
+
+    harmonic_query_mock = mocker.patch.object(
+        harmonic_client, "query", side_effect=harmonic_query
+    )
+    mocker.patch.object(
+        affinity_client,
+        "search_company_by_name_and_domains",
+        return_value=[],
+    )
+
+    results = [
+        result
+        async for result in get_all_company_details_batch(
+            [
+                "https://www.test.com/about",
+                "test.com",
+                "broken.io",
+                "localhost",
+            ],
+            mock_affinity_config,
+            concurrency=2,
+            affinity_client=affinity_client,
+            harmonic_client=harmonic_client,
+        )
+    ]
+    results_by_domain = {result["domain"]: result for result in results}
+
+    assert harmonic_query_mock.call_count == 2
+    assert len(results) == 3
+    assert results_by_domain["test.com"]["input_domains"] == [
+        "https://www.test.com/about",
+        "test.com",
+    ]
+    assert results_by_domain["test.com"]["details"]["crm"] is None
+    assert results_by_domain["test.com"]["error"] is None
+    assert isinstance(results_by_domain["broken.io"]["error"], RuntimeError)
+    assert isinstance(results_by_domain[""]["error"], ValueError)
+
+
+# This tests that closing a batch early waits for cancelled lookups to finish
+@pytest.mark.asyncio
+async def test_get_all_company_details_batch_close_early(
+    mocker: MockerFixture,
+):
+    harmonic_client = HarmonicGql("test")
+    affinity_client = AffinityApi("test")
+
+    async def harmonic_query(query, variables):
+        if variables["identifiers"]["websiteUrl"] != "fast.com":
+            await asyncio.sleep(10)
+        return HARMONIC_RETURN_VALUE
+
+    mocker.patch.object(harmonic_client, "query", side_effect=harmonic_query)
+    mocker.patch.object(
+        affinity_client,
+        "search_company_by_name_and_domains",
+        return_value=[],
+    )
+
+    results = get_all_company_details_batch(
+        ["fast.com", "slow.com", "slower.com"],
+        mock_affinity_config,
+        affinity_client=affinity_client,
+        harmonic_client=harmonic_client,
+    )
+    first = await results.__anext__()
+    await results.aclose()
+
+    assert first["domain"] == "fast.com"
+    assert asyncio.all_tasks() == {asyncio.current_task()}
+
+
+# This tests that a failed up front Harmonic enrichment is logged and
+# companies are enriched one at a time instead
+@pytest.mark.asyncio
+async def test_get_all_company_details_batch_harmonic_prefetch_error(
+    mocker: MockerFixture, caplog
+):
+    harmonic_client = HarmonicGql("test")
+    affinity_client = AffinityApi("test")
+    mocker.patch.object(
+        harmonic_client,
+        "enrich_companies_by_domains",
+        side_effect=RuntimeError("Harmonic unavailable"),
+    )
+    harmonic_query_mock = mocker.patch.object(
+        harmonic_client, "query", return_value=HARMONIC_RETURN_VALUE
+    )
+    mocker.patch.object(
+        affinity_client,
+        "search_company_by_name_and_domains",
+        return_value=[],
+    )
+
+    results = [
+        result
+        async for result in get_all_company_details_batch(
+            ["test.com"],
+            mock_affinity_config,
+            affinity_client=affinity_client,
+            harmonic_client=harmonic_client,
+            harmonic_batch_size=10,
+        )
+    ]
+
+    assert results[0]["error"] is None
+    assert harmonic_query_mock.call_count == 1
+    assert "Failed to enrich companies from Harmonic" in caplog.text
+
+
+# This tests that batch lookups can enrich companies in Harmonic with alias batches up front
+@pytest.mark.asyncio
+async def test_get_all_company_details_batch_harmonic_batching(
+    mocker: MockerFixture,
+):
+    harmonic_client = HarmonicGql("test")
+    affinity_client = AffinityApi("test")
+
+    async def harmonic_query(query, variables):
+        assert list(variables) == ["company0", "company1"]
+        raise TransportQueryError(
+            "404: Not Found",
+            errors=[
+                {
+                    "message": "404: Not Found",
+                    "path": ["company1"],
+                    "extensions": {"response": {"status": 404}},
+                }
+            ],
+            data={
+                "company0": HARMONIC_RETURN_VALUE[
+                    "enrichCompanyByIdentifiers"
+                ],
+                "company1": None,
+            },
+        )
+
+    harmonic_query_mock = mocker.patch.object(
+        harmonic_client, "query", side_effect=harmonic_query
+    )
+    mocker.patch.object(
+        affinity_client,
+        "search_company_by_name_and_domains",
+        return_value=[],
+    )
+
+    results = [
+        result
+        async for result in get_all_company_details_batch(
+            ["test.com", "unknown.com"],
+            mock_affinity_config,
+            affinity_client=affinity_client,
+            harmonic_client=harmonic_client,
+            harmonic_batch_size=10,
+        )
+    ]
+    results_by_domain = {result["domain"]: result for result in results}
+
+    assert harmonic_query_mock.call_count == 1
+    assert (
+        results_by_domain["test.com"]["details"]["sourcing_platform"]["name"]
+        == "Test"
+    )
+    assert (
+        results_by_domain["unknown.com"]["details"]["sourcing_platform"]["id"]
+        is None
+    )
+
+
+# This tests that a failed Harmonic batch falls back to one lookup per domain
+@pytest.mark.asyncio
+async def test_get_all_company_details_batch_harmonic_batch_error(
+    mocker: MockerFixture,
+):
+    harmonic_client = HarmonicGql("test")
+    affinity_client = AffinityApi("test")
+
+    async def harmonic_query(query, variables):
+        if "company0" in variables:
+            raise ClientConnectionError("Connection reset")
+        if variables["identifiers"]["websiteUrl"] == "broken.io":
+            raise RuntimeError("Harmonic unavailable")
+        return HARMONIC_RETURN_VALUE
+
+    harmonic_query_mock = mocker.patch.object(
+        harmonic_client, "query", side_effect=harmonic_query
+    )
+    mocker.patch.object(
+        affinity_client,
+        "search_company_by_name_and_domains",
+        return_value=[],
+    )
+
+    results = [
+        result
+        async for result in get_all_company_details_batch(
+            ["test.com", "broken.io"],
+            mock_affinity_config,
+            affinity_client=affinity_client,
+            harmonic_client=harmonic_client,
+            harmonic_batch_size=10,
+        )
+    ]
+    results_by_domain = {result["domain"]: result for result in results}
+
+    assert harmonic_query_mock.call_count == 3
+    assert (
+        results_by_domain["test.com"]["details"]["sourcing_platform"]["name"]
+        == "Test"
+    )
+    assert isinstance(results_by_domain["broken.io"]["error"], RuntimeError)
+
+
+# This tests that company details are returned without Harmonic while its circuit breaker is open
+@pytest.mark.asyncio
+async def test_get_all_company_details_harmonic_circuit_open(
+    mocker: MockerFixture,
+):
+    harmonic_client = HarmonicGql(
+        "test",
+        breaker=CircuitBreaker(failure_threshold=1, recovery_timeout=60),
+    )
+    affinity_client = AffinityApi("test")
+    execute_mock = mocker.patch.object(
+        harmonic_client, "_execute", side_effect=ConnectionError()
+    )
+    mocker.patch.object(
+        affinity_client,
+        "search_company_by_name_and_domains",
+        return_value=[],
+    )
+
+    with pytest.raises(ConnectionError):
+        await get_all_company_details(
+            "test.com",
+            mock_affinity_config,
+            affinity_client=affinity_client,
+            harmonic_client=harmonic_client,
+        )
+    company_details = await get_all_company_details(
+        "test.com",
+        mock_affinity_config,
+        affinity_client=affinity_client,
+        harmonic_client=harmonic_client,
+    )
+
+    assert execute_mock.call_count == 1
+    assert company_details["crm"] is None
+    assert company_details["sourcing_platform"]["id"] is None
+    assert harmonic_client.breaker.metrics.rejected == 1
+
+
+# This tests that found and not found enrichments are cached with their own TTLs
+@pytest.mark.asyncio
+async def test_get_all_company_details_harmonic_cache(
+    mocker: MockerFixture, tests_setup_and_teardown, tmp_path
+):
+    harmonic_company_not_found_error = [
+        {
+            "message": "404: Not Found",
+            "extensions": {
+                "response": {
+                    "status": 404,
+                    "body": {
+                        "detail": {
+                            "enrichment_urn": "urn:harmonic:enrichment:1"
+                        }
+                    },
+                }
+            },
+        }
+    ]
+
+    async def harmonic_query(query, variables):
+        if variables["identifiers"]["websiteUrl"] == "unknown.com":
+            raise TransportQueryError(
+                msg="404: Not Found", errors=harmonic_company_not_found_error
+            )
+        return {
+            "enrichCompanyByIdentifiers": {
+                "company": {"name": "Test", "id": 1, "website": None}
+            }
+        }
+
+    harmonic_query_mock = mocker.patch(
+        "mosaic_os.sourcing_platform.HarmonicGql.query",
+        side_effect=harmonic_query,
+    )
+    mocker.patch(
+        "mosaic_os.crm.AffinityApi.search_company_by_name_and_domains",
+        return_value=[],
+    )
+    backend = SqliteCache(str(tmp_path / "harmonic.db"))
+    harmonic_cache = HarmonicEnrichmentCache(
+        backend=backend, hit_ttl=60, miss_ttl=30
+    )
+    backend_set = mocker.spy(backend, "set")
+
+    for domain in ("test.com", "unknown.com", "test.com", "unknown.com"):
+        company_details = await get_all_company_details(
+            domain, mock_affinity_config, harmonic_cache=harmonic_cache
+        )
+
+    assert harmonic_query_mock.call_count == 2
+    assert company_details["sourcing_platform"]["id"] is None
+    assert (
+        company_details["sourcing_platform"]["enrichment_urn"]
+        == "urn:harmonic:enrichment:1"
+    )
+    assert harmonic_cache.get("test.com")["name"] == "Test"
+    assert [call.kwargs["ttl"] for call in backend_set.call_args_list] == [
+        60,
+        30,
+    ]
+
+
 def test_lookup_company_master_id_by_domain_no_match(
     mocker: MockerFixture, tests_setup_and_teardown
 ):
@@ -437,6 +898,72 @@ def test_lookup_company_master_id_by_domain_match(
     assert company.crm_id == "12"
 
 
+class FakeCompanyQuery:
+    """Datastore query returning companies stored by domain"""
+
+    def __init__(self, companies_by_domain: dict[str, Entity]):
+        self.companies_by_domain = companies_by_domain
+        self.domain = None
+        self.is_keys_only = False
+        self.limit = None
+
+    def add_filter(self, filter):
+        self.domain = filter.filters[0].value
+
+    def keys_only(self):
+        self.is_keys_only = True
+
+    def fetch(self, limit=None):
+        self.limit = limit
+        company = self.companies_by_domain.get(self.domain)
+        return iter([company] if company is not None else [])
+
+
+def test_lookup_company_master_ids_by_domains(
+    mocker: MockerFixture, tests_setup_and_teardown
+):
+    company_entity = Entity(key=Key("Company", 123, project="test-project"))
+    company_entity.update(
+        Company(
+            id=123,
+            name="Test",
+            primary_domain="test.com",
+            domains=["test.com"],
+        ).model_dump(exclude={"id"})
+    )
+    queries = []
+
+    def query(kind):
+        queries.append(FakeCompanyQuery({"test.com": company_entity}))
+        return queries[-1]
+
+    client = mocker.MagicMock()
+    client.query.side_effect = query
+
+    companies = lookup_company_master_ids_by_domains(
+        ["test.com", "https://www.test.com", "unknown.com", "localhost"],
+        client,
+        concurrency=2,
+    )
+
+    assert companies["test.com"].id == 123
+    assert companies["https://www.test.com"].id == 123
+    assert companies["unknown.com"] is None
+    assert companies["localhost"] is None
+    assert sorted(query.domain for query in queries) == [
+        "test.com",
+        "unknown.com",
+    ]
+    assert all(query.limit == 1 for query in queries)
+
+    company_ids = lookup_company_master_ids_by_domains(
+        ["test.com", "unknown.com"], client, keys_only=True
+    )
+
+    assert company_ids == {"test.com": 123, "unknown.com": None}
+    assert all(query.is_keys_only for query in queries[2:])
+
+
 def test_create_company_master_id(
     mocker: MockerFixture, tests_setup_and_teardown
 ):
@@ -462,3 +989,234 @@ def test_create_company_master_id(
     assert company.crm_id == "12"
     assert company.created_at is not None
     assert company.updated_at is None
+
+
+# This tests that async lookups run on the datastore thread pool with a shared client
+@pytest.mark.asyncio
+async def test_lookup_company_master_id_by_domain_async(
+    mocker: MockerFixture, tests_setup_and_teardown
+):
+    client = mocker.patch("tests.test_company.Client")
+    company_entity = Entity(key=Key("Company", 123, project="test-project"))
+    company_entity.update(
+        Company(
+            id=123,
+            name="Test",
+            primary_domain="test.com",
+            domains=["test.com"],
+        ).model_dump(exclude={"id"})
+    )
+    client.query.return_value.fetch.return_value = [company_entity]
+    datastore = AsyncDatastore(db_client=client, max_workers=2)
+
+    companies = await asyncio.gather(
+        lookup_company_master_id_by_domain_async("test.com", datastore),
+        lookup_company_master_id_by_domain_async("www.test.com", datastore),
+    )
+    datastore.close()
+
+    assert [company.id for company in companies] == [123, 123]
+    assert client.query.call_count == 2
+
+
+# This tests that async creation runs on the datastore thread pool
+@pytest.mark.asyncio
+async def test_create_company_master_id_async(
+    mocker: MockerFixture, tests_setup_and_teardown
+):
+    client = mocker.patch("tests.test_company.Client")
+    mocked_key = Key("Company", 123, project="test-project")
+    client.allocate_ids.return_value = [mocked_key]
+    client.entity.return_value = Entity(key=mocked_key)
+    datastore = AsyncDatastore(db_client=client)
+
+    company = await create_company_master_id_async(
+        Company(
+            id=None,
+            name="Test",
+            primary_domain="test.com",
+            domains=["test.com"],
+        ),
+        datastore,
+    )
+    datastore.close()
+
+    assert company.id == 123
+    client.put.assert_called_once()
+
+
+# This tests that async batch lookups query each registered domain once
+@pytest.mark.asyncio
+async def test_lookup_company_master_ids_by_domains_async(
+    mocker: MockerFixture,
+):
+    queries = []
+
+    def query(kind):
+        queries.append(
+            FakeCompanyQuery(
+                {
+                    "test.com": Entity(
+                        key=Key("Company", 123, project="test-project")
+                    )
+                }
+            )
+        )
+        return queries[-1]
+
+    client = mocker.MagicMock()
+    client.query.side_effect = query
+    datastore = AsyncDatastore(db_client=client, max_workers=2)
+
+    company_ids = await lookup_company_master_ids_by_domains_async(
+        ["test.com", "www.test.com", "unknown.com"], datastore, keys_only=True
+    )
+    datastore.close()
+
+    assert company_ids == {
+        "test.com": 123,
+        "www.test.com": 123,
+        "unknown.com": None,
+    }
+    assert len(queries) == 2
+
+
+# This tests that bulk creation allocates ids per chunk and only retries chunks which failed
+def test_create_company_master_ids(mocker: MockerFixture):
+    mocker.patch("mosaic_os.company.time.sleep")
+    client = mocker.MagicMock()
+    next_id = iter(range(1, 100))
+    client.allocate_ids.side_effect = lambda partial_key, num_ids: [
+        Key("Company", next(next_id), project="test-project")
+        for _ in range(num_ids)
+    ]
+    client.entity.side_effect = lambda key: Entity(key=key)
+    put_calls = []
+
+    def put_multi(entities):
+        put_calls.append([entity.key.id for entity in entities])
+        if len(put_calls) == 2:
+            raise ServiceUnavailable("unavailable")
+
+    client.put_multi.side_effect = put_multi
+    companies = [
+        Company(
+            id=None,
+            name=f"Test {i}",
+            primary_domain=f"test{i}.com",
+            domains=[f"test{i}.com"],
+        )
+        for i in range(5)
+    ]
+
+    results = create_company_master_ids(companies, client, chunk_size=2)
+
+    assert client.allocate_ids.call_count == 3
+    assert put_calls == [[1, 2], [3, 4], [3, 4], [5]]
+    assert [result.status for result in results] == [
+        CompanyCreateStatus.CREATED
+    ] * 5
+    assert [result.company.id for result in results] == [1, 2, 3, 4, 5]
+
+
+# This tests that bulk creation skips domains with a master id and duplicates within the batch
+def test_create_company_master_ids_skip_existing(mocker: MockerFixture):
+    existing = Entity(key=Key("Company", 123, project="test-project"))
+    client = mocker.MagicMock()
+    client.query.side_effect = lambda kind: FakeCompanyQuery(
+        {"test.com": existing}
+    )
+    client.allocate_ids.side_effect = lambda partial_key, num_ids: [
+        Key("Company", 456, project="test-project")
+    ]
+    client.entity.side_effect = lambda key: Entity(key=key)
+    companies = [
+        Company(
+            id=None,
+            name="Test",
+            primary_domain="test.com",
+            domains=["test.com"],
+        ),
+        Company(
+            id=None, name="New", primary_domain="new.com", domains=["new.com"]
+        ),
+        Company(
+            id=None,
+            name="New Again",
+            primary_domain="new.io",
+            domains=["new.io", "new.com"],
+        ),
+    ]
+
+    results = create_company_master_ids(companies, client, skip_existing=True)
+
+    assert [result.status for result in results] == [
+        CompanyCreateStatus.EXISTING,
+        CompanyCreateStatus.CREATED,
+        CompanyCreateStatus.EXISTING,
+    ]
+    assert [result.company.id for result in results] == [123, 456, 456]
+    assert results[2].duplicate_of is companies[1]
+    client.allocate_ids.assert_called_once()
+
+
+# This tests that companies in one import are matched by registered domain
+def test_create_company_master_ids_skip_existing_normalises_domains(
+    mocker: MockerFixture,
+):
+    client = mocker.MagicMock()
+    client.query.side_effect = lambda kind: FakeCompanyQuery({})
+    client.allocate_ids.side_effect = lambda partial_key, num_ids: [
+        Key("Company", 456, project="test-project")
+    ]
+    client.entity.side_effect = lambda key: Entity(key=key)
+    companies = [
+        Company(
+            id=None,
+            name="Acme",
+            primary_domain="www.acme.com",
+            domains=["www.acme.com"],
+        ),
+        Company(
+            id=None,
+            name="Acme",
+            primary_domain="acme.com",
+            domains=["acme.com"],
+        ),
+    ]
+
+    results = create_company_master_ids(companies, client, skip_existing=True)
+
+    assert [result.status for result in results] == [
+        CompanyCreateStatus.CREATED,
+        CompanyCreateStatus.EXISTING,
+    ]
+    assert [result.company.id for result in results] == [456, 456]
+    client.allocate_ids.assert_called_once()
+
+
+def test_create_company_master_ids_failed_chunk(mocker: MockerFixture):
+    mocker.patch("mosaic_os.company.time.sleep")
+    client = mocker.MagicMock()
+    client.allocate_ids.return_value = [
+        Key("Company", 1, project="test-project")
+    ]
+    client.put_multi.side_effect = ServiceUnavailable("unavailable")
+
+    results = create_company_master_ids(
+        [
+            Company(
+                id=None,
+                name="Test",
+                primary_domain="test.com",
+                domains=["test.com"],
+            )
+        ],
+        client,
+        max_retries=2,
+    )
+
+    assert client.put_multi.call_count == 3
+    assert results[0].status is CompanyCreateStatus.FAILED
+    assert results[0].company.id is None
+    assert "unavailable" in results[0].error
@@ -0,0 +1,119 @@
+from datetime import timedelta
+
+from google.cloud.datastore import Entity, Key
+
+from mosaic_os.company import lookup_company_master_id_by_domain
+from mosaic_os.company_index import CompanyDomainIndex
+from mosaic_os.models import Company
+from mosaic_os.utils import datetime_now
+
+
+def company_entity(company_id: int, domains: list[str], **properties) -> Entity:
+    entity = Entity(key=Key("Company", company_id, project="test-project"))
+    entity.update(
+        Company(
+            id=company_id, name=f"Company {company_id}", primary_domain=domains[0], domains=domains, **properties
+        ).model_dump(exclude={"id"})
+    )
+    return entity
+
+
+class FakeDatastore:
+    """Datastore client holding `Company` entities in memory"""
+
+    def __init__(self, entities: list[Entity]):
+        self.entities = {entity.key.id: entity for entity in entities}
+        self.queries = []
+        self.gets = 0
+
+    def key(self, kind: str, company_id: int) -> Key:
+        return Key(kind, company_id, project="test-project")
+
+    def get(self, key: Key) -> Entity | None:
+        self.gets += 1
+        return self.entities.get(key.id)
+
+    def query(self, kind: str) -> "FakeQuery":
+        self.queries.append(FakeQuery(self))
+        return self.queries[-1]
+
+
+class FakeQuery:
+    def __init__(self, datastore: FakeDatastore):
+        self.datastore = datastore
+        self.filter = None
+        self.projection = []
+
+    def add_filter(self, filter):
+        self.filter = filter
+
+    def fetch(self, limit=None):
+        for entity in self.datastore.entities.values():
+            value = entity.get(self.filter.property_name)
+            if self.filter.operator == "=" and value != self.filter.value:
+                continue
+            if self.filter.operator == ">" and (value is None or value <= self.filter.value):
+                continue
+            if self.projection:
+                # projections on list properties return one result per value
+                for domain in entity["domains"]:
+                    result = Entity(key=entity.key)
+                    result["domains"] = domain
+                    yield result
+            else:
+                yield entity
+
+
+def test_company_domain_index_build_and_refresh():
+    datastore = FakeDatastore(
+        [
+            company_entity(1, ["test.com", "test.io"]),
+            company_entity(2, ["merged.com"], current=False),
+        ]
+    )
+    index = CompanyDomainIndex(datastore, refresh_interval=3600)
+
+    assert index.get_id("test.io") == 1
+    assert index.get_id("merged.com") is None
+    assert len(index) == 2
+    assert datastore.queries[0].projection == ["domains"]
+
+    future = datetime_now() + timedelta(minutes=1)
+    datastore.entities[1] = company_entity(1, ["test.com"], updated_at=future)
+    datastore.entities[3] = company_entity(3, ["new.com", "test.io"], created_at=future)
+    index.refresh()
+
+    assert index.get_id("test.com") == 1
+    assert index.get_id("test.io") == 3
+    assert index.get_id("new.com") == 3
+
+    datastore.entities[1] = company_entity(1, ["test.com"], current=False, updated_at=future + timedelta(minutes=1))
+    index.refresh()
+
+    assert index.get_id("test.com") is None
+
+
+def test_company_domain_index_get_caches_companies():
+    datastore = FakeDatastore([company_entity(1, ["test.com"])])
+    index = CompanyDomainIndex(datastore, refresh_interval=3600)
+
+    company = index.get("test.com")
+    company.name = "Changed"
+
+    assert index.get("test.com").name == "Company 1"
+    assert index.get("unknown.com") is None
+    assert datastore.gets == 1
+
+
+def test_lookup_company_master_id_by_domain_with_index(mocker):
+    datastore = FakeDatastore([company_entity(1, ["test.com"])])
+    index = CompanyDomainIndex(datastore, refresh_interval=3600)
+    index.refresh()
+    db_client = mocker.MagicMock()
+    db_client.query.return_value.fetch.return_value = iter([])
+
+    assert lookup_company_master_id_by_domain("https://www.test.com", db_client, index=index).id == 1
+    db_client.query.assert_not_called()
+
+    assert lookup_company_master_id_by_domain("unknown.com", db_client, index=index) is None
+    db_client.query.assert_called_once()
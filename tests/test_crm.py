@@ -1,6 +1,13 @@
+import asyncio
+import json
+from contextlib import aclosing
+
 import pytest
+from httpx import AsyncClient, MockTransport, Request, Response
 
-from mosaic_os.crm import AffinityApi
+from mosaic_os.cache import TTLCache
+from mosaic_os.crm import AffinityApi, FieldValueIndex, FieldValueWriteStatus
+from mosaic_os.rate_limit import RateLimitScheduler
 
 
 # This tests if AffinitApi initialises with an environment variable successfully
@@ -89,3 +96,330 @@ def test_affinity_field_value_by_field_id():
 
     assert AffinityApi.field_value_by_field_id(field_values, 1) == {"id": 1, "field_id": 1}
     assert AffinityApi.field_value_by_field_id(field_values, 2) == {"id": 2, "field_id": 2}
+
+
+# Tests if the concurrent search respects the concurrency limit and returns results in search order
+@pytest.mark.asyncio
+async def test_affinity_search_company_by_name_and_domains_concurrently(mocker):
+    in_flight = 0
+    max_in_flight = 0
+
+    async def search_company(term):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        # later terms finish first to check results are not ordered by arrival
+        await asyncio.sleep(0.01 * (5 - len(term)))
+        in_flight -= 1
+        return {"organizations": [{"id": len(term), "domains": [term]}, {"id": 0, "domains": []}]}
+
+    affinity_client = AffinityApi("test")
+    mocker.patch.object(affinity_client, "search_company", side_effect=search_company)
+
+    results = await affinity_client.search_company_by_name_and_domains(
+        domains=["a.io", "bb.io", "ccc.io"], name="n", concurrency=2
+    )
+
+    assert max_in_flight == 2
+    assert [result["id"] for result in results] == [1, 0, 4, 5, 6]
+
+
+# Tests if the concurrent search stops once a company covering every domain is found
+@pytest.mark.asyncio
+async def test_affinity_search_company_by_name_and_domains_short_circuits(mocker):
+    searched = []
+
+    async def search_company(term):
+        searched.append(term)
+        if term == "a.io":
+            return {"organizations": [{"id": 1, "domains": ["a.io", "b.io"]}]}
+        await asyncio.sleep(1)
+        return {"organizations": [{"id": 2, "domains": [term]}]}
+
+    affinity_client = AffinityApi("test")
+    mocker.patch.object(affinity_client, "search_company", side_effect=search_company)
+
+    results = await affinity_client.search_company_by_name_and_domains(
+        domains=["a.io", "b.io"], name="Test", concurrency=3
+    )
+
+    assert searched == ["Test", "a.io", "b.io"]
+    assert results == [{"id": 1, "domains": ["a.io", "b.io"]}]
+
+
+@pytest.mark.asyncio
+async def test_affinity_search_company_by_name_and_domains_invalid_concurrency():
+    with pytest.raises(ValueError):
+        await AffinityApi("test").search_company_by_name_and_domains(domains=["a.io"], concurrency=0)
+
+
+# Tests if the HTTP client is closed when leaving the async context manager
+@pytest.mark.asyncio
+async def test_affinity_api_context_manager_closes_client():
+    async with AffinityApi("test") as affinity_client:
+        assert not affinity_client.requests.is_closed
+
+    assert affinity_client.requests.is_closed
+
+
+# Tests if shared clients are reused per API key and options and recreated once closed
+@pytest.mark.asyncio
+async def test_affinity_api_shared_client_registry():
+    client = AffinityApi.shared("shared-test")
+
+    assert AffinityApi.shared("shared-test") is client
+    assert AffinityApi.shared("shared-test", max_connections=5) is not client
+
+    await AffinityApi.close_shared()
+
+    assert client.requests.is_closed
+    assert AffinityApi.shared("shared-test") is not client
+    await AffinityApi.close_shared()
+
+
+def affinity_client_with_pages(pages: dict[str | None, dict | list]) -> tuple[AffinityApi, list[dict]]:
+    requested_params = []
+
+    def handler(request: Request) -> Response:
+        params = dict(request.url.params)
+        requested_params.append(params)
+        return Response(200, json=pages[params.get("page_token")])
+
+    affinity_client = AffinityApi("test")
+    affinity_client.requests = AsyncClient(transport=MockTransport(handler), base_url="https://test")
+    return affinity_client, requested_params
+
+
+# Tests if iter_list_entries follows page tokens until the last page
+@pytest.mark.asyncio
+async def test_affinity_iter_list_entries_follows_pages():
+    affinity_client, requested_params = affinity_client_with_pages(
+        {
+            None: {"list_entries": [{"id": 1}, {"id": 2}], "next_page_token": "b"},
+            "b": {"list_entries": [{"id": 3}], "next_page_token": "c"},
+            "c": {"list_entries": [{"id": 4}], "next_page_token": None},
+        }
+    )
+
+    list_entries = [list_entry async for list_entry in affinity_client.iter_list_entries(1, page_size=2)]
+
+    assert [list_entry["id"] for list_entry in list_entries] == [1, 2, 3, 4]
+    assert requested_params[0] == {"page_size": "2"}
+    assert requested_params[1] == {"page_size": "2", "page_token": "b"}
+
+
+# Tests if stopping early does not request pages beyond the prefetched one
+@pytest.mark.asyncio
+async def test_affinity_iter_list_entries_stops_early():
+    affinity_client, requested_params = affinity_client_with_pages(
+        {
+            None: {"list_entries": [{"id": 1}], "next_page_token": "b"},
+            "b": {"list_entries": [{"id": 2}], "next_page_token": "c"},
+            "c": {"list_entries": [{"id": 3}], "next_page_token": None},
+        }
+    )
+
+    async with aclosing(affinity_client.iter_list_entries(1)) as list_entries:
+        async for list_entry in list_entries:
+            break
+
+    assert list_entry == {"id": 1}
+    assert "c" not in [params.get("page_token") for params in requested_params]
+
+
+# Tests if endpoints returning a plain list are treated as a single page
+@pytest.mark.asyncio
+async def test_affinity_iter_field_values_unpaginated_response():
+    affinity_client, requested_params = affinity_client_with_pages({None: [{"id": 1}, {"id": 2}]})
+
+    field_values = [field_value async for field_value in affinity_client.iter_field_values({"organization_id": 1})]
+
+    assert field_values == [{"id": 1}, {"id": 2}]
+    assert requested_params == [{"organization_id": "1", "page_size": "500"}]
+
+
+@pytest.mark.asyncio
+async def test_affinity_iter_field_value_changes_raises_error_no_field_id():
+    with pytest.raises(ValueError):
+        async for _ in AffinityApi("test").iter_field_value_changes(params={}):
+            pass
+
+
+# Tests if _remove_duplicates keeps the first record seen for an id in first-seen order
+def test_affinity_remove_duplicates_by_id_keeps_order():
+    list_with_duplicates = [
+        {"id": 3, "name": "c"},
+        {"id": 1, "name": "a"},
+        {"id": 3, "name": "c", "domain": "c.com"},
+        {"id": 2, "name": "b"},
+    ]
+
+    assert AffinityApi._remove_duplicates(list_with_duplicates) == [
+        {"id": 3, "name": "c"},
+        {"id": 1, "name": "a"},
+        {"id": 2, "name": "b"},
+    ]
+
+
+# Tests if records without an id are deduplicated by content
+def test_affinity_remove_duplicates_without_id():
+    list_with_duplicates = [{"name": "a", "domains": ["a.com"]}, {"domains": ["a.com"], "name": "a"}, {"name": "b"}]
+
+    assert AffinityApi._remove_duplicates(list_with_duplicates) == [{"name": "a", "domains": ["a.com"]}, {"name": "b"}]
+
+
+# Tests if partial records for the same id are merged without modifying the input
+def test_affinity_remove_duplicates_merges_partial_records():
+    first = {"id": 1, "name": "a", "domain": None}
+    list_with_duplicates = [first, {"id": 1, "domain": "a.com", "domains": ["a.com"]}]
+
+    assert AffinityApi._remove_duplicates(list_with_duplicates, merge=True) == [
+        {"id": 1, "name": "a", "domain": "a.com", "domains": ["a.com"]}
+    ]
+    assert first == {"id": 1, "name": "a", "domain": None}
+
+
+# Tests if cached reads are served from the cache and writes invalidate the affected entity
+@pytest.mark.asyncio
+async def test_affinity_cache_reads_and_invalidates_on_write():
+    requested_paths = []
+
+    def handler(request: Request) -> Response:
+        requested_paths.append((request.method, request.url.path))
+        if request.method == "PUT":
+            return Response(200, json={"id": 10, "entity_id": 1})
+        return Response(200, json={"id": 1, "name": "Test"})
+
+    affinity_client = AffinityApi("test", cache=TTLCache())
+    affinity_client.requests = AsyncClient(transport=MockTransport(handler), base_url="https://test")
+
+    await asyncio.gather(affinity_client.get_company_details(1), affinity_client.get_company_details(entity_id=1))
+    await affinity_client.get_company_details(1)
+    await affinity_client.get_company_details(2)
+    await affinity_client.upsert_field_value(field_id=5, entity_id=1, value="ON")
+    await affinity_client.get_company_details(1)
+    await affinity_client.get_company_details(2)
+
+    assert requested_paths == [
+        ("GET", "/organizations/1"),
+        ("GET", "/organizations/2"),
+        ("PUT", "/field-values"),
+        ("GET", "/organizations/1"),
+    ]
+
+
+# Tests if repeated searches with a cache do not change the cached search results
+@pytest.mark.asyncio
+async def test_affinity_search_company_by_name_and_domains_with_cache():
+    def handler(request: Request) -> Response:
+        company_id = 1 if request.url.params["term"] == "acme" else 2
+        return Response(200, json={"organizations": [{"id": company_id, "domains": ["acme.com"]}]})
+
+    affinity_client = AffinityApi("test", cache=TTLCache())
+    affinity_client.requests = AsyncClient(transport=MockTransport(handler), base_url="https://test")
+
+    for _ in range(2):
+        results = await affinity_client.search_company_by_name_and_domains(domains=["acme.com"], name="acme")
+        assert [result["id"] for result in results] == [1, 2]
+    cached = await affinity_client.search_company("acme")
+
+    assert [result["id"] for result in cached["organizations"]] == [1]
+
+
+# Tests if bulk upserts skip unchanged values, report failures per item and look up current values once
+@pytest.mark.asyncio
+async def test_affinity_bulk_upsert_field_values():
+    requests_sent = []
+
+    def handler(request: Request) -> Response:
+        requests_sent.append((request.method, dict(request.url.params)))
+        if request.method == "GET":
+            return Response(
+                200,
+                json=[
+                    {"field_id": 1, "list_entry_id": None, "value": "ON"},
+                    {"field_id": 2, "list_entry_id": None, "value": {"id": 7, "text": "High"}},
+                ],
+            )
+        if json.loads(request.content)["entity_id"] == 3:
+            return Response(422, json={})
+        return Response(200, json={"id": 99})
+
+    affinity_client = AffinityApi("test", scheduler=RateLimitScheduler(max_retries=0))
+    affinity_client.requests = AsyncClient(transport=MockTransport(handler), base_url="https://test")
+
+    results = await affinity_client.bulk_upsert_field_values(
+        [(1, 1, "ON", None), (2, 1, 7, None), (1, 2, "OFF", None), (1, 3, "OFF", None)], concurrency=2
+    )
+
+    assert [result.status for result in results] == [
+        FieldValueWriteStatus.UNCHANGED,
+        FieldValueWriteStatus.UNCHANGED,
+        FieldValueWriteStatus.WRITTEN,
+        FieldValueWriteStatus.FAILED,
+    ]
+    assert results[2].response == {"id": 99}
+    assert results[3].status_code == 422
+    assert [params for method, params in requests_sent if method == "GET"] == [
+        {"organization_id": "1"},
+        {"organization_id": "2"},
+        {"organization_id": "3"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_affinity_bulk_upsert_field_values_invalid_concurrency():
+    with pytest.raises(ValueError):
+        await AffinityApi("test").bulk_upsert_field_values([], concurrency=0)
+
+
+# Tests if FieldValueIndex looks up field values by list entry and field, and by entity
+def test_field_value_index():
+    field_values = [
+        {"id": 1, "field_id": 1, "list_entry_id": None, "entity_id": 10, "value": "ON"},
+        {"id": 2, "field_id": 2, "list_entry_id": 5, "entity_id": 10, "value": "Track"},
+        {"id": 3, "field_id": 2, "list_entry_id": 5, "entity_id": 10, "value": "Pass"},
+        {"id": 4, "field_id": 2, "list_entry_id": 6, "entity_id": 11, "value": "Met"},
+    ]
+    field_value_index = FieldValueIndex(field_values)
+
+    assert field_value_index.get(field_id=1)["id"] == 1
+    assert field_value_index.get(field_id=1, list_entry_id=5) is None
+    assert field_value_index.get(field_id=2, list_entry_id=5)["id"] == 2
+    assert [field_value["id"] for field_value in field_value_index.get_all(field_id=2, list_entry_id=5)] == [2, 3]
+    assert [field_value["id"] for field_value in field_value_index.by_entity(11)] == [4]
+    assert field_value_index.by_entity(12) == []
+
+
+# Tests if list entries are streamed and company details are projected while parsing
+@pytest.mark.asyncio
+async def test_affinity_streamed_responses():
+    def handler(request: Request) -> Response:
+        if request.url.path == "/lists/1/list-entries":
+            return Response(200, json=[{"id": 1, "entity": {"name": "a"}}, {"id": 2, "entity": {"name": "b"}}])
+        return Response(200, json={"id": 1, "name": "Test", "interactions": {"first_email": {"person_ids": [1]}}})
+
+    affinity_client = AffinityApi("test")
+    affinity_client.requests = AsyncClient(transport=MockTransport(handler), base_url="https://test")
+
+    list_entries = [list_entry async for list_entry in affinity_client.stream_list_entries(1, exclude=["entity"])]
+
+    assert list_entries == [{"id": 1}, {"id": 2}]
+    assert await affinity_client.get_company_details(1, exclude=("interactions",)) == {"id": 1, "name": "Test"}
+
+
+# Tests if projected company details are cached with excluded keys passed as a list
+@pytest.mark.asyncio
+async def test_affinity_cached_read_with_list_argument():
+    requested_paths = []
+
+    def handler(request: Request) -> Response:
+        requested_paths.append(request.url.path)
+        return Response(200, json={"id": 1, "name": "Test", "interactions": {"first_email": {"person_ids": [1]}}})
+
+    affinity_client = AffinityApi("test", cache=TTLCache())
+    affinity_client.requests = AsyncClient(transport=MockTransport(handler), base_url="https://test")
+
+    assert await affinity_client.get_company_details(1, exclude=["interactions"]) == {"id": 1, "name": "Test"}
+    assert await affinity_client.get_company_details(1, exclude=("interactions",)) == {"id": 1, "name": "Test"}
+    assert requested_paths == ["/organizations/1"]
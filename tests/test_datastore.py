@@ -0,0 +1,46 @@
+import asyncio
+import threading
+
+import pytest
+
+from mosaic_os.datastore import AsyncDatastore
+
+
+# Tests if calls waiting for a worker are dropped when cancelled
+@pytest.mark.asyncio
+async def test_async_datastore_cancels_queued_calls(mocker):
+    datastore = AsyncDatastore(db_client=mocker.MagicMock(), max_workers=1)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def blocking(db_client):
+        started.set()
+        release.wait()
+        calls.append("blocking")
+
+    running = asyncio.ensure_future(datastore.run(blocking))
+    queued = asyncio.ensure_future(datastore.run(lambda db_client: calls.append("queued")))
+    await asyncio.to_thread(started.wait)
+
+    queued.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+    release.set()
+    await running
+    datastore.close()
+
+    assert calls == ["blocking"]
+
+
+# Tests if shared instances are reused per project
+def test_async_datastore_shared_registry():
+    datastore = AsyncDatastore.shared("test-project")
+
+    assert AsyncDatastore.shared("test-project") is datastore
+    assert AsyncDatastore.shared("other-project") is not datastore
+
+    AsyncDatastore.close_shared()
+
+    assert AsyncDatastore.shared("test-project") is not datastore
+    AsyncDatastore.close_shared()
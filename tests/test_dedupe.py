@@ -0,0 +1,71 @@
+from datetime import datetime, timezone
+
+from google.cloud.datastore import Entity, Key
+
+from mosaic_os.dedupe import CompanyDuplicateFinder, MergePlan, plan_company_merges
+
+
+def company(company_id: int, domains: list[str], created_day: int = 1, **properties) -> dict:
+    return {
+        "id": company_id,
+        "domains": domains,
+        "created_at": datetime(2024, 1, created_day, tzinfo=timezone.utc),
+        **properties,
+    }
+
+
+# Tests if companies sharing domains or ids transitively form one group with the oldest company as target
+def test_company_duplicate_finder_groups_duplicates():
+    finder = CompanyDuplicateFinder()
+    finder.add_all(
+        [
+            company(1, ["a.com"], created_day=3),
+            company(2, ["b.com"], created_day=2, crm_id="10"),
+            company(3, ["A.com", "c.com"], created_day=4, crm_id="10"),
+            company(4, ["d.com"], created_day=2, sp_id="20"),
+            company(5, ["e.com"], sp_id="20", created_day=1),
+            company(6, ["f.com"], crunchbase_id=None, crm_id=None),
+        ]
+    )
+
+    plans = sorted(finder.merge_plans(), key=lambda plan: plan.target_id)
+
+    assert len(finder) == 6
+    assert plans == [
+        MergePlan(target_id=2, source_ids=[1, 3]),
+        MergePlan(target_id=5, source_ids=[4]),
+    ]
+
+
+# Tests if duplicates spread over many sorted runs are still grouped together
+def test_company_duplicate_finder_merges_runs():
+    finder = CompanyDuplicateFinder(chunk_size=2, max_runs=2)
+    finder.add_all(company(company_id, [f"{company_id}.com", "shared.com"], created_day=5) for company_id in range(10))
+    finder.add(company(10, ["other.com"], created_day=1, crm_id="1"))
+    finder.add(company(11, ["9.com"], created_day=9, crm_id="1"))
+
+    assert list(finder.merge_plans()) == [MergePlan(target_id=10, source_ids=list(range(10)) + [11])]
+
+
+def test_plan_company_merges_streams_pages(mocker):
+    entities = []
+    for company_id, domain in ((1, "a.com"), (2, "a.com"), (3, "b.com")):
+        entity = Entity(key=Key("Company", company_id, project="test-project"))
+        entity.update(company(company_id, [domain], created_day=company_id))
+        del entity["id"]
+        entities.append(entity)
+
+    def fetch(start_cursor=None, limit=None):
+        start = start_cursor or 0
+        page = mocker.MagicMock()
+        page.__iter__.return_value = iter(entities[start : start + limit])
+        page.next_page_token = start + limit
+        return page
+
+    db_client = mocker.MagicMock()
+    db_client.query.return_value.fetch.side_effect = fetch
+
+    plans = plan_company_merges(db_client, batch_size=2)
+
+    assert plans == [MergePlan(target_id=1, source_ids=[2])]
+    assert db_client.query.return_value.fetch.call_count == 2
@@ -0,0 +1,26 @@
+import socket
+
+from mosaic_os.domains import normalize_domain, normalize_domains
+
+
+def test_normalize_domain():
+    assert normalize_domain("https://WWW.Test.co.uk/about") == "test.co.uk"
+    assert normalize_domain(" test.com ") == "test.com"
+    assert normalize_domain("localhost") == ""
+
+
+# Tests if domains are normalised from the bundled suffix list without network access
+def test_normalize_domain_offline(mocker):
+    mocker.patch.object(socket, "socket", side_effect=AssertionError("network access"))
+    normalize_domain.cache_clear()
+
+    assert normalize_domain("blog.example.io") == "example.io"
+
+
+def test_normalize_domains_caches_results():
+    normalize_domain.cache_clear()
+
+    domains = normalize_domains(["a.test.com", "b.test.com", "a.test.com", "other.org"])
+
+    assert domains == {"a.test.com": "test.com", "b.test.com": "test.com", "other.org": "other.org"}
+    assert normalize_domain.cache_info().hits == 1
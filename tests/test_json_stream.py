@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from mosaic_os.json_stream import JsonArrayStream, decode_json_stream
+
+LIST_ENTRIES = [
+    {"id": 1, "entity": {"name": 'Quote " and ] bracket', "domains": ["a.com"]}, "created_at": None},
+    {"id": 2, "entity": {"name": "Escaped \\ backslash {"}, "score": -1.5e3, "active": True},
+    "plain string",
+    42,
+]
+
+
+def chunked(data: bytes, size: int):
+    async def _chunks():
+        for start in range(0, len(data), size):
+            yield data[start : start + size]
+
+    return _chunks()
+
+
+# Tests if array items are yielded correctly whatever the chunk boundaries
+@pytest.mark.asyncio
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 1024])
+async def test_json_array_stream_top_level_array(chunk_size):
+    data = json.dumps(LIST_ENTRIES, indent=2).encode()
+
+    items = [item async for item in JsonArrayStream(chunked(data, chunk_size))]
+
+    assert items == LIST_ENTRIES
+
+
+# Tests if an array under a key is streamed and other members are kept in rest
+@pytest.mark.asyncio
+@pytest.mark.parametrize("chunk_size", [1, 5, 1024])
+async def test_json_array_stream_items_key(chunk_size):
+    data = json.dumps({"total": 4, "list_entries": LIST_ENTRIES, "next_page_token": "abc"}).encode()
+    stream = JsonArrayStream(chunked(data, chunk_size), items_key="list_entries")
+
+    items = [item async for item in stream]
+
+    assert items == LIST_ENTRIES
+    assert stream.rest == {"total": 4, "next_page_token": "abc"}
+
+
+# Tests if excluded keys are dropped from each item
+@pytest.mark.asyncio
+async def test_json_array_stream_exclude():
+    data = json.dumps(LIST_ENTRIES).encode()
+
+    items = [item async for item in JsonArrayStream(chunked(data, 3), exclude=["entity"])]
+
+    assert items == [{"id": 1, "created_at": None}, {"id": 2, "score": -1.5e3, "active": True}, "plain string", 42]
+
+
+@pytest.mark.asyncio
+async def test_decode_json_stream_exclude():
+    company = {"id": 1, "interactions": {"first_email": {"person_ids": [1, 2]}}, "domains": ["a.com"]}
+    data = json.dumps(company).encode()
+
+    assert await decode_json_stream(chunked(data, 4)) == company
+    assert await decode_json_stream(chunked(data, 4), exclude=["interactions"]) == {"id": 1, "domains": ["a.com"]}
+
+
+@pytest.mark.asyncio
+async def test_json_array_stream_truncated_body():
+    with pytest.raises(ValueError):
+        [item async for item in JsonArrayStream(chunked(b'[{"id": 1}, {"id"', 4))]
@@ -0,0 +1,132 @@
+import pytest
+from pytest_mock import MockerFixture
+
+from mosaic_os.crm import AffinityApi
+from mosaic_os.list_mirror import (
+    FIELD_VALUE_CREATED,
+    FIELD_VALUE_DELETED,
+    FIELD_VALUE_UPDATED,
+    AffinityListMirror,
+)
+
+mock_affinity_config = {
+    "lp_list_id": 13926,
+    "lp_status_field_id": 1,
+    "lp_priority_field_id": 2,
+    "lp_owner_field_id": 3,
+}
+
+LIST_ENTRIES = [
+    {"id": 389, "list_id": 13926, "entity_id": 10, "created_at": "2015-12-11T02:26:56.537-08:00"},
+    {"id": 390, "list_id": 13926, "entity_id": 11, "created_at": "2015-12-12T02:26:56.537-08:00"},
+]
+
+FIELD_VALUES = {
+    389: [
+        {"field_id": 1, "list_entry_id": 389, "value": {"id": 5, "text": "Track"}},
+        {"field_id": 99, "list_entry_id": 389, "value": "not mirrored"},
+    ],
+    390: [{"field_id": 3, "list_entry_id": 390, "value": {"id": 7, "first_name": "Jo"}}],
+}
+
+
+def async_iter(items):
+    async def _iter(*args, **kwargs):
+        for item in items:
+            yield item
+
+    return _iter
+
+
+def field_value_change(action_type, field_id, value, changed_at, list_entry):
+    return {
+        "field_id": field_id,
+        "action_type": action_type,
+        "value": value,
+        "changed_at": changed_at,
+        "list_entry_id": list_entry["id"],
+        "list_entry": list_entry,
+    }
+
+
+@pytest.fixture
+def affinity_client(mocker: MockerFixture) -> AffinityApi:
+    affinity_client = AffinityApi("test")
+    mocker.patch.object(affinity_client, "iter_list_entries", side_effect=async_iter(LIST_ENTRIES))
+    mocker.patch.object(
+        affinity_client, "get_field_values", side_effect=lambda param: FIELD_VALUES[param["list_entry_id"]]
+    )
+    return affinity_client
+
+
+# Tests if the first sync takes a snapshot of the list and its mirrored fields
+@pytest.mark.asyncio
+async def test_list_mirror_snapshot(affinity_client: AffinityApi, tmp_path):
+    mirror = AffinityListMirror.live_pipeline(affinity_client, mock_affinity_config, str(tmp_path / "lp.db"))
+
+    assert await mirror.sync() == 2
+    assert mirror.watermark is not None
+    assert mirror.entries() == [
+        {**LIST_ENTRIES[0], "field_values": {1: [{"id": 5, "text": "Track"}]}},
+        {**LIST_ENTRIES[1], "field_values": {3: [{"id": 7, "first_name": "Jo"}]}},
+    ]
+
+
+# Tests if later syncs only apply changes since the watermark and survive a restart
+@pytest.mark.asyncio
+async def test_list_mirror_applies_changes_after_restart(
+    affinity_client: AffinityApi, mocker: MockerFixture, tmp_path
+):
+    db_path = str(tmp_path / "lp.db")
+    mirror = AffinityListMirror.live_pipeline(affinity_client, mock_affinity_config, db_path)
+    await mirror.snapshot()
+    mirror.close()
+
+    new_entry = {"id": 391, "list_id": 13926, "entity_id": 12, "created_at": "2099-01-01T00:00:00+00:00"}
+    changes = {
+        1: [
+            field_value_change(
+                FIELD_VALUE_UPDATED, 1, {"id": 6, "text": "Old"}, "2000-01-01T00:00:00+00:00", LIST_ENTRIES[0]
+            ),
+            field_value_change(
+                FIELD_VALUE_UPDATED, 1, {"id": 6, "text": "Pass"}, "2099-01-01T00:00:00+00:00", LIST_ENTRIES[0]
+            ),
+            field_value_change(
+                FIELD_VALUE_CREATED, 1, {"id": 5, "text": "Track"}, "2099-01-02T00:00:00+00:00", new_entry
+            ),
+        ],
+        2: [],
+        3: [
+            field_value_change(
+                FIELD_VALUE_DELETED, 3, {"first_name": "Jo", "id": 7}, "2099-01-01T00:00:00+00:00", LIST_ENTRIES[1]
+            ),
+            field_value_change(
+                FIELD_VALUE_CREATED, 3, {"id": 8}, "2099-01-01T00:00:00+00:00", {**new_entry, "list_id": 1}
+            ),
+        ],
+    }
+    mocker.patch.object(
+        affinity_client,
+        "iter_field_value_changes",
+        side_effect=lambda params: async_iter(changes[params["field_id"]])(),
+    )
+    affinity_client.iter_list_entries.reset_mock()
+
+    mirror = AffinityListMirror.live_pipeline(affinity_client, mock_affinity_config, db_path)
+
+    assert await mirror.sync() == 3
+    assert not affinity_client.iter_list_entries.called
+    assert mirror.watermark.isoformat() == "2099-01-02T00:00:00+00:00"
+    assert mirror.entries() == [
+        {**LIST_ENTRIES[0], "field_values": {1: [{"id": 6, "text": "Pass"}]}},
+        {**LIST_ENTRIES[1], "field_values": {}},
+        {**new_entry, "field_values": {1: [{"id": 5, "text": "Track"}]}},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_list_mirror_apply_changes_without_snapshot(affinity_client: AffinityApi):
+    mirror = AffinityListMirror(affinity_client, list_id=1, field_ids=[1], db_path=":memory:")
+
+    with pytest.raises(ValueError):
+        await mirror.apply_changes()
@@ -0,0 +1,53 @@
+import pytest
+
+from mosaic_os.matching import CandidateIndex, normalize_company_name
+
+CANDIDATES = [
+    {"id": 1, "name": "Test Holdings", "domain": "test.com", "domains": ["test.com", "testholdings.com", "t.co"]},
+    {"id": 2, "name": "Test Inc.", "domain": "test.com", "domains": ["test.com", "test.io"]},
+    {"id": 3, "name": "TEST Limited", "domain": "other.com", "domains": ["other.com"]},
+    {"id": 4, "name": "Unrelated", "domain": "unrelated.com", "domains": ["unrelated.com"]},
+]
+
+
+def test_normalize_company_name():
+    assert normalize_company_name("Test, Inc.") == frozenset({"test"})
+    assert normalize_company_name("The Company") == frozenset({"the"})
+    assert normalize_company_name("Co") == frozenset({"co"})
+    assert normalize_company_name(None) == frozenset()
+
+
+# Tests if candidates with every known domain and a matching name rank first and only candidates sharing a
+# domain are ranked
+def test_candidate_index_rank():
+    index = CandidateIndex(CANDIDATES)
+
+    ranked = index.rank(["test.com", "test.io"], name="Test")
+
+    assert [match.candidate["id"] for match in ranked] == [2, 1]
+    assert ranked[0].score == 1.0
+    assert ranked[1].domain_score == 0.5
+    assert ranked[1].name_score == 0.5
+
+
+# Tests if a partial domain match is accepted with a similar name and rejected without one
+def test_candidate_index_best_match_partial_domains():
+    index = CandidateIndex(CANDIDATES[:1] + CANDIDATES[2:])
+
+    match = index.best_match(["test.com", "test.io"], name="Test Holdings Ltd")
+
+    assert match.candidate["id"] == 1
+    assert match.score == pytest.approx(0.6)
+    assert index.best_match(["test.com", "test.io"], name="Something Else") is None
+    assert index.best_match(["unknown.com"], name="Test") is None
+
+
+# Tests if ties prefer candidates with fewer unknown domains
+def test_candidate_index_best_match_without_name():
+    index = CandidateIndex(CANDIDATES)
+
+    match = index.best_match(["TEST.com"])
+
+    assert match.candidate["id"] == 2
+    assert match.name_score is None
+    assert CandidateIndex([]).best_match(["test.com"]) is None
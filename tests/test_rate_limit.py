@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+import pytest
+from httpx import AsyncClient, HTTPStatusError, MockTransport, Request, Response
+
+from mosaic_os.crm import AffinityApi
+from mosaic_os.rate_limit import RateLimitScheduler, TokenBucket
+
+
+def affinity_client_with_responses(responses: list[Response], scheduler: RateLimitScheduler = None) -> AffinityApi:
+    requests_sent = []
+
+    def handler(request: Request) -> Response:
+        requests_sent.append(request)
+        return responses.pop(0)
+
+    affinity_client = AffinityApi("test", scheduler=scheduler or RateLimitScheduler(backoff_base=0.001))
+    affinity_client.requests = AsyncClient(transport=MockTransport(handler), base_url="https://test")
+    affinity_client.requests_sent = requests_sent
+    return affinity_client
+
+
+# Tests if the token bucket paces requests once the burst is used up
+@pytest.mark.asyncio
+async def test_token_bucket_paces_requests():
+    bucket = TokenBucket(rate=50, capacity=2)
+    started_at = time.monotonic()
+
+    for _ in range(4):
+        await bucket.acquire()
+
+    assert time.monotonic() - started_at >= 0.035
+
+
+def test_token_bucket_invalid_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0, capacity=1)
+
+
+# Tests if a throttled request is retried after Retry-After and metrics are updated
+@pytest.mark.asyncio
+async def test_scheduler_retries_throttled_request():
+    affinity_client = affinity_client_with_responses(
+        [
+            Response(429, headers={"Retry-After": "0"}),
+            Response(
+                200,
+                json={"organizations": []},
+                headers={"X-Ratelimit-Limit-User-Remaining": "899", "X-Ratelimit-Limit-Org-Remaining": "9999"},
+            ),
+        ]
+    )
+
+    assert await affinity_client.search_company("test") == {"organizations": []}
+
+    metrics = affinity_client.scheduler.metrics
+    assert metrics.requests == 2
+    assert metrics.retries == 1
+    assert metrics.throttled == 1
+    assert metrics.queue_depth == 0
+    assert metrics.minute_remaining == 899
+    assert metrics.month_remaining == 9999
+
+
+# Tests if server errors on non-idempotent requests are not retried
+@pytest.mark.asyncio
+async def test_scheduler_does_not_retry_server_error_for_post():
+    affinity_client = affinity_client_with_responses([Response(500), Response(200, json={})])
+
+    with pytest.raises(HTTPStatusError):
+        await affinity_client.create_company("Test", "test.com")
+
+    assert len(affinity_client.requests_sent) == 1
+
+
+# Tests if retries stop after max_retries and the last error is raised
+@pytest.mark.asyncio
+async def test_scheduler_gives_up_after_max_retries():
+    affinity_client = affinity_client_with_responses(
+        [Response(503), Response(503), Response(503)],
+        scheduler=RateLimitScheduler(max_retries=2, backoff_base=0.001),
+    )
+
+    with pytest.raises(HTTPStatusError):
+        await affinity_client.get_opportunity_details(1)
+
+    assert len(affinity_client.requests_sent) == 3
+
+
+def test_scheduler_retry_delay_honours_retry_after():
+    scheduler = RateLimitScheduler(backoff_base=0.001)
+
+    assert 5 <= scheduler.retry_delay(Response(429, headers={"Retry-After": "5"}), attempt=0) < 5.01
+    assert scheduler.retry_delay(Response(503), attempt=0) <= 0.001
+
+
+# Tests if requests are held back once the per-minute quota is used up
+def test_scheduler_pauses_when_minute_quota_exhausted():
+    scheduler = RateLimitScheduler()
+    scheduler.update_quota(
+        Response(
+            200, headers={"X-Ratelimit-Limit-User-Remaining": "0", "X-Ratelimit-Limit-User-Reset": "30"}
+        ).headers
+    )
+
+    assert scheduler.minute_remaining == 0
+    assert scheduler._paused_until - time.monotonic() > 29
+
+
+# Tests if clients using the same API key share a scheduler unless one is injected
+def test_affinity_clients_share_scheduler_per_api_key():
+    RateLimitScheduler.clear_shared()
+    scheduler = RateLimitScheduler()
+
+    assert AffinityApi("shared-key").scheduler is AffinityApi("shared-key").scheduler
+    assert AffinityApi("shared-key").scheduler is RateLimitScheduler.shared("shared-key")
+    assert AffinityApi("other-key").scheduler is not AffinityApi("shared-key").scheduler
+    assert AffinityApi("shared-key", scheduler=scheduler).scheduler is scheduler
+    RateLimitScheduler.clear_shared()
+
+
+# Tests if a shared token bucket can be used from more than one event loop
+def test_token_bucket_used_from_several_event_loops():
+    bucket = TokenBucket(rate=1000, capacity=1)
+
+    async def acquire_concurrently():
+        await asyncio.gather(*(bucket.acquire() for _ in range(3)))
+
+    asyncio.run(acquire_concurrently())
+    asyncio.run(acquire_concurrently())
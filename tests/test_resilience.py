@@ -0,0 +1,195 @@
+import asyncio
+
+import pytest
+
+from mosaic_os.resilience import (
+    AdaptiveConcurrencyLimiter,
+    CircuitBreaker,
+    CircuitOpenError,
+    CircuitState,
+    QueueTimeoutError,
+)
+
+
+# Tests if the limiter caps calls in flight and grows its limit on fast successes
+@pytest.mark.asyncio
+async def test_limiter_caps_calls_in_flight():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=3)
+    in_flight = []
+    max_in_flight = 0
+
+    async def call():
+        nonlocal max_in_flight
+        in_flight.append(1)
+        max_in_flight = max(max_in_flight, len(in_flight))
+        await asyncio.sleep(0.001)
+        in_flight.pop()
+        return True
+
+    results = await asyncio.gather(*(limiter.call(call) for _ in range(10)))
+
+    assert all(results)
+    assert max_in_flight <= 3
+    metrics = limiter.metrics
+    assert metrics.successes == 10
+    assert metrics.in_flight == 0
+    assert metrics.queue_depth == 0
+    assert 2 < metrics.limit <= 3
+
+
+# Tests if overload halves the limit once per round of calls and other errors are not failures
+@pytest.mark.asyncio
+async def test_limiter_decreases_on_overload():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, is_failure=lambda e: isinstance(e, TimeoutError))
+
+    async def call(error: Exception):
+        await asyncio.sleep(0)
+        raise error
+
+    results = await asyncio.gather(
+        *(limiter.call(lambda: call(TimeoutError())) for _ in range(8)), return_exceptions=True
+    )
+
+    assert all(isinstance(result, TimeoutError) for result in results)
+    assert limiter.limit == 4
+    assert limiter.metrics.decreases == 1
+    assert limiter.metrics.failures == 8
+
+    with pytest.raises(KeyError):
+        await limiter.call(lambda: call(KeyError()))
+    assert limiter.limit > 4
+
+
+# Tests if a cancelled waiter gives up its place in the queue
+@pytest.mark.asyncio
+async def test_limiter_cancelled_waiter():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1)
+    release = asyncio.Event()
+
+    holder = asyncio.ensure_future(limiter.call(release.wait))
+    await asyncio.sleep(0)
+    waiter = asyncio.ensure_future(limiter.call(release.wait))
+    await asyncio.sleep(0)
+    assert limiter.metrics.queue_depth == 1
+
+    waiter.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    await holder
+
+    assert limiter.metrics.queue_depth == 0
+    assert limiter.metrics.in_flight == 0
+
+
+# Tests if queued calls give up after the queue timeout while the call holding the slot carries on
+@pytest.mark.asyncio
+async def test_limiter_queue_timeout():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, queue_timeout=0.01)
+    release = asyncio.Event()
+
+    holder = asyncio.ensure_future(limiter.call(release.wait))
+    await asyncio.sleep(0)
+    with pytest.raises(QueueTimeoutError):
+        await limiter.call(release.wait)
+    release.set()
+    await holder
+
+    metrics = limiter.metrics
+    assert metrics.queue_timeouts == 1
+    assert metrics.queue_depth == 0
+    assert metrics.in_flight == 0
+
+
+# Tests if calls rejected by an open circuit breaker leave the limit unchanged
+@pytest.mark.asyncio
+async def test_limiter_ignores_rejected_calls():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4)
+
+    async def rejected():
+        raise CircuitOpenError(1.0)
+
+    for _ in range(3):
+        with pytest.raises(CircuitOpenError):
+            await limiter.call(rejected)
+
+    assert limiter.limit == 4
+    assert limiter.metrics.failures == 0
+    assert limiter.metrics.successes == 0
+
+
+def test_limiter_invalid_limits():
+    with pytest.raises(ValueError):
+        AdaptiveConcurrencyLimiter(initial_limit=5, max_limit=2)
+
+
+# Tests if the breaker opens after consecutive failures, fails fast and closes after a successful trial call
+@pytest.mark.asyncio
+async def test_circuit_breaker_opens_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.01)
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        raise ConnectionError()
+
+    async def succeeding():
+        return "ok"
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            await breaker.call(failing)
+
+    assert breaker.state is CircuitState.OPEN
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(failing)
+    assert calls == 2
+
+    await asyncio.sleep(0.02)
+    assert breaker.state is CircuitState.HALF_OPEN
+    with pytest.raises(ConnectionError):
+        await breaker.call(failing)
+    assert breaker.state is CircuitState.OPEN
+
+    await asyncio.sleep(0.02)
+    assert await breaker.call(succeeding) == "ok"
+    assert breaker.state is CircuitState.CLOSED
+
+    metrics = breaker.metrics
+    assert metrics.times_opened == 2
+    assert metrics.rejected == 1
+    assert metrics.consecutive_failures == 0
+
+
+# Tests if errors which are not failures keep the breaker closed
+@pytest.mark.asyncio
+async def test_circuit_breaker_ignores_non_failures():
+    breaker = CircuitBreaker(failure_threshold=1, is_failure=lambda e: not isinstance(e, KeyError))
+
+    async def not_found():
+        raise KeyError()
+
+    for _ in range(3):
+        with pytest.raises(KeyError):
+            await breaker.call(not_found)
+
+    assert breaker.state is CircuitState.CLOSED
+
+
+# Tests if checking the breaker only fails while it is open
+@pytest.mark.asyncio
+async def test_circuit_breaker_check():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.01)
+    breaker.check()
+
+    async def failing():
+        raise ConnectionError()
+
+    with pytest.raises(ConnectionError):
+        await breaker.call(failing)
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    assert breaker.metrics.rejected == 1
+
+    await asyncio.sleep(0.02)
+    breaker.check()
@@ -1,5 +1,10 @@
+import asyncio
+
 import pytest
+from aiohttp import ClientConnectionError
+from gql.transport.exceptions import TransportQueryError
 
+from mosaic_os.resilience import AdaptiveConcurrencyLimiter, CircuitBreaker, CircuitOpenError
 from mosaic_os.sourcing_platform import HarmonicGql
 
 
@@ -19,3 +24,192 @@ def test_harmonic_gql_initialises_with_arg_successfully():
 def test_harmonic_gql_with_no_key_raises_error():
     with pytest.raises(ValueError):
         HarmonicGql()
+
+
+# Tests if shared clients are reused per API key and options
+@pytest.mark.asyncio
+async def test_harmonic_gql_shared_client_registry():
+    client = HarmonicGql.shared("shared-test")
+
+    assert HarmonicGql.shared("shared-test") is client
+    assert HarmonicGql.shared("shared-test", timeout=5) is not client
+
+    await HarmonicGql.close_shared()
+
+    assert HarmonicGql.shared("shared-test") is not client
+    await HarmonicGql.close_shared()
+
+
+# Tests if disconnecting a client that never connected is a no-op
+@pytest.mark.asyncio
+async def test_harmonic_gql_disconnect_without_connect():
+    client = HarmonicGql("test")
+    await client.disconnect()
+
+    assert client.session is None
+
+
+# Tests if alias batches map results and per-alias errors back to each domain
+@pytest.mark.asyncio
+async def test_harmonic_gql_enrich_companies_by_domains(mocker):
+    client = HarmonicGql("test")
+
+    async def query(query, variables):
+        assert "company0: enrichCompanyByIdentifiers(identifiers: $company0)" in query
+        not_found = {
+            "message": "404: Not Found",
+            "path": ["company1"],
+            "extensions": {"response": {"status": 404}},
+        }
+        data = {"company0": {"companyFound": True, "company": {"id": 1}}, "company1": None}
+        raise TransportQueryError("404: Not Found", errors=[not_found], data=data)
+
+    query_mock = mocker.patch.object(client, "query", side_effect=query)
+
+    results = await client.enrich_companies_by_domains(["test.com", "unknown.com", "test.com"], "{ companyFound }")
+
+    assert query_mock.call_count == 1
+    assert query_mock.call_args.kwargs["variables"] == {
+        "company0": {"websiteUrl": "test.com"},
+        "company1": {"websiteUrl": "unknown.com"},
+    }
+    assert results["test.com"] == {"companyFound": True, "company": {"id": 1}}
+    assert isinstance(results["unknown.com"], TransportQueryError)
+    assert results["unknown.com"].errors[0]["extensions"]["response"]["status"] == 404
+
+
+# Tests if batches are sized to the payload budget and split when they time out
+@pytest.mark.asyncio
+async def test_harmonic_gql_enrich_companies_by_domains_batch_size(mocker):
+    client = HarmonicGql("test")
+    batch_sizes = []
+
+    async def query(query, variables):
+        batch_sizes.append(len(variables))
+        if len(variables) > 2:
+            raise asyncio.TimeoutError()
+        return {alias: {"companyFound": True, "company": None} for alias in variables}
+
+    mocker.patch.object(client, "query", side_effect=query)
+    domains = [f"company{i}.com" for i in range(8)]
+
+    results = await client.enrich_companies_by_domains(domains, "{ companyFound }", max_batch_size=5)
+
+    assert batch_sizes == [5, 2, 2, 2, 2]
+    assert set(results) == set(domains)
+    assert all(result == {"companyFound": True, "company": None} for result in results.values())
+
+    single_alias_document, _, _ = HarmonicGql._enrich_batch_document(["a.com"], "{ companyFound }")
+    assert (
+        HarmonicGql._max_aliases_within_payload(["a.com"], "{ companyFound }", 3 * len(single_alias_document)) == 2
+    )
+
+
+# Tests if queries share a lazily opened session which is closed once idle and parsed documents are reused
+@pytest.mark.asyncio
+async def test_harmonic_gql_query_lazy_session(mocker):
+    client = HarmonicGql("test", idle_timeout=0.01)
+    session = mocker.MagicMock()
+    documents = []
+
+    async def execute(document, variable_values):
+        documents.append(document)
+        await asyncio.sleep(0)
+        return {"ok": True}
+
+    async def connect_async(reconnecting):
+        await asyncio.sleep(0)
+        return session
+
+    session.execute = mocker.AsyncMock(side_effect=execute)
+    connect_mock = mocker.patch.object(client.client, "connect_async", side_effect=connect_async)
+    close_mock = mocker.patch.object(client.client, "close_async", new_callable=mocker.AsyncMock)
+
+    results = await asyncio.gather(*(client.query("{ companyFound }") for _ in range(5)))
+
+    assert results == [{"ok": True}] * 5
+    assert connect_mock.call_count == 1
+    assert all(document is documents[0] for document in documents)
+    assert client.session is session
+
+    await asyncio.sleep(0.05)
+
+    assert close_mock.call_count == 1
+    assert client.session is None
+
+    await client.query("{ companyFound }")
+
+    assert connect_mock.call_count == 2
+    await client.disconnect()
+    assert close_mock.call_count == 2
+
+
+# Tests if errors other than GraphQL errors and timeouts are returned for every domain of the batch
+@pytest.mark.asyncio
+async def test_harmonic_gql_enrich_companies_by_domains_connection_error(mocker):
+    client = HarmonicGql("test")
+    mocker.patch.object(client, "query", side_effect=ClientConnectionError("Connection reset"))
+
+    results = await client.enrich_companies_by_domains(["a.com", "b.com"], "{ companyFound }")
+
+    assert set(results) == {"a.com", "b.com"}
+    assert all(isinstance(result, ClientConnectionError) for result in results.values())
+
+
+# Tests if an idle close does not close the session under a query started after the idle timer fired
+@pytest.mark.asyncio
+async def test_harmonic_gql_idle_close_skips_in_flight_query(mocker):
+    client = HarmonicGql("test", idle_timeout=60)
+    session = mocker.MagicMock()
+    closed = False
+
+    async def execute(document, variable_values):
+        await asyncio.sleep(0.01)
+        assert not closed, "session closed under in-flight query"
+        return {"ok": True}
+
+    async def close_async():
+        nonlocal closed
+        closed = True
+
+    session.execute = mocker.AsyncMock(side_effect=execute)
+    mocker.patch.object(client.client, "connect_async", new_callable=mocker.AsyncMock, return_value=session)
+    mocker.patch.object(client.client, "close_async", side_effect=close_async)
+    await client.query("{ companyFound }")
+
+    # the query is scheduled before the idle close runs but after the timer saw no queries in flight
+    query = asyncio.ensure_future(client.query("{ companyFound }"))
+    client._close_if_idle()
+    await client._idle_disconnect
+
+    assert await query == {"ok": True}
+    assert not closed
+    assert client.session is session
+    await client.disconnect()
+    assert closed
+
+
+# Tests if queries queued for the limiter fail fast once the circuit breaker opens
+@pytest.mark.asyncio
+async def test_harmonic_gql_queued_queries_fail_fast_when_breaker_opens(mocker):
+    client = HarmonicGql(
+        "test",
+        limiter=AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1),
+        breaker=CircuitBreaker(failure_threshold=1),
+    )
+
+    async def execute(document, variables):
+        await asyncio.sleep(0.01)
+        raise ConnectionError()
+
+    execute_mock = mocker.patch.object(client, "_execute", side_effect=execute)
+
+    results = await asyncio.gather(*(client.query("{ companyFound }") for _ in range(5)), return_exceptions=True)
+
+    assert execute_mock.call_count == 1
+    assert isinstance(results[0], ConnectionError)
+    assert all(isinstance(result, CircuitOpenError) for result in results[1:])
+    assert client.breaker.metrics.rejected == 4
+    with pytest.raises(CircuitOpenError):
+        await client.query("{ companyFound }")
+    assert client.limiter.metrics.queue_depth == 0